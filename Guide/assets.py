@@ -0,0 +1,273 @@
+"""
+Caché local de logos de canal e imágenes de programa.
+
+Las imágenes se descargan en paralelo, se guardan una sola vez por contenido
+(sha1 de los bytes, así varias URLs con la misma imagen comparten archivo) y,
+si Pillow está instalado, se reducen a miniaturas de ASSET_MAX_SIZE píxeles.
+Un manifiesto JSON recuerda por URL el archivo, el ETag y el Last-Modified:
+pasado el TTL la imagen se revalida con una petición condicional y solo se
+vuelve a descargar si cambió en el origen.
+
+La guía se escribe con un mapa URL remota -> URL local (ver url_map), de modo
+que los clientes cargan los iconos desde el propio servidor (/assets/...).
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+try:
+    from PIL import Image
+except ImportError:  # Dependencia opcional: sin Pillow se guardan los originales
+    Image = None
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+ASSET_TTL_HOURS = 168
+ASSET_MAX_SIZE = 256
+ASSET_MAX_BYTES = 5 * 1024 * 1024
+ASSET_WORKERS = 8
+# Nombres de archivo que genera la caché (el servidor solo sirve estos)
+ASSET_NAME_RE = re.compile(r"^[0-9a-f]{40}\.(png|jpg|gif|webp|svg)$")
+
+CONTENT_TYPES = {
+    "image/png": "png", "image/jpeg": "jpg", "image/jpg": "jpg", "image/gif": "gif",
+    "image/webp": "webp", "image/svg+xml": "svg"
+}
+ASSET_CONTENT_TYPES = {ext: content_type for content_type, ext in CONTENT_TYPES.items()}
+ASSET_CONTENT_TYPES["jpg"] = "image/jpeg"
+
+def image_extension(data, content_type=""):
+    """Extensión del archivo según los bytes iniciales o, si no, el Content-Type"""
+    if data.startswith(b"\x89PNG"):
+        return "png"
+    if data.startswith(b"\xff\xd8"):
+        return "jpg"
+    if data.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if b"<svg" in data[:512]:
+        return "svg"
+    return CONTENT_TYPES.get((content_type or "").split(";")[0].strip().lower())
+
+def make_thumbnail(data, ext, max_size=ASSET_MAX_SIZE):
+    """
+    Reduce la imagen a max_size píxeles por lado (requiere Pillow).
+    Devuelve (bytes, extensión); sin Pillow, o si no hace falta, la original.
+    """
+    if Image is None or ext == "svg" or not max_size:
+        return data, ext
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if max(img.size) <= max_size or getattr(img, "is_animated", False):
+                return data, ext
+            img.thumbnail((max_size, max_size))
+            out = io.BytesIO()
+            if ext == "jpg":
+                img.convert("RGB").save(out, "JPEG", quality=85, optimize=True)
+                return out.getvalue(), "jpg"
+            img.save(out, "PNG", optimize=True)
+            return out.getvalue(), "png"
+    except Exception as e:
+        logging.debug("[Assets] No se pudo redimensionar la imagen: %s", e)
+        return data, ext
+
+def normalize_base_url(base_url):
+    """
+    URL base de las imágenes en la guía: debe ser absoluta, porque el reproductor
+    descarga el .xml.gz y resuelve cada <icon src> por su cuenta.
+    """
+    if not isinstance(base_url, str) or not re.match(r"^https?://[^/\s]+", base_url):
+        raise ValueError(f"assets.base_url debe ser una URL absoluta: {base_url!r}")
+    return base_url if base_url.endswith("/") else f"{base_url}/"
+
+def read_manifest(cache_dir):
+    """Entradas del manifiesto de la caché ({} si no existe o no es válido)"""
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    return data.get("assets", {}) if data.get("version") == MANIFEST_VERSION else {}
+
+def manifest_url_map(entries, base_url):
+    """
+    Mapa URL remota -> URL local para escribir la guía.
+    Las imágenes rotas en el origen (HTTP 4xx) se mapean a "" para omitir el icono.
+    """
+    mapping = {}
+    for url, entry in entries.items():
+        if entry.get("file"):
+            mapping[url] = f"{base_url}{entry['file']}"
+        elif isinstance(entry.get("error"), int) and 400 <= entry["error"] < 500:
+            mapping[url] = ""
+    return mapping
+
+class AssetCache:
+    """Caché de imágenes direccionada por contenido con manifiesto y TTL"""
+
+    def __init__(self, cache_dir, base_url, ttl_hours=ASSET_TTL_HOURS,
+                 max_size=ASSET_MAX_SIZE, workers=ASSET_WORKERS, headers=None, timeout=15):
+        self.cache_dir = cache_dir
+        self.base_url = normalize_base_url(base_url)
+        self.ttl = ttl_hours * 3600
+        self.max_size = max_size
+        self.workers = workers
+        self.timeout = timeout
+        self.manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+        self.entries = {}    # url -> {file, etag, last_modified, checked} o {error, checked}
+        self.stats = {"downloaded": 0, "revalidated": 0, "cached": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        retries = Retry(total=2, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
+        adapter = HTTPAdapter(max_retries=retries, pool_maxsize=max(workers, 10))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.entries = read_manifest(cache_dir)
+
+    def save(self):
+        """Guarda el manifiesto de forma atómica"""
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "assets": self.entries}, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _is_fresh(self, entry, now):
+        if not entry:
+            return False
+        if entry.get("file") and not os.path.exists(os.path.join(self.cache_dir, entry["file"])):
+            return False
+        return now - entry.get("checked", 0) < self.ttl
+
+    def _store_bytes(self, data, ext):
+        """Guarda los bytes con nombre sha1; si ya existen no se reescriben"""
+        data, ext = make_thumbnail(data, ext, self.max_size)
+        name = f"{hashlib.sha1(data).hexdigest()}.{ext}"
+        path = os.path.join(self.cache_dir, name)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return name
+
+    def fetch(self, url):
+        """
+        Descarga (o revalida) una imagen y actualiza su entrada del manifiesto.
+        Devuelve la entrada resultante.
+        """
+        with self._lock:
+            entry = dict(self.entries.get(url) or {})
+        conditional = {}
+        if entry.get("file"):
+            if entry.get("etag"):
+                conditional["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                conditional["If-Modified-Since"] = entry["last_modified"]
+
+        now = time.time()
+        try:
+            response = self.session.get(url, headers=conditional, timeout=self.timeout, stream=True)
+            with response:
+                if response.status_code == 304 and entry.get("file"):
+                    entry["checked"] = now
+                    stat = "revalidated"
+                elif response.status_code >= 400:
+                    # Imagen rota en el origen: se recuerda para omitir el icono
+                    entry = {"error": response.status_code, "checked": now}
+                    stat = "failed"
+                else:
+                    data = response.raw.read(ASSET_MAX_BYTES + 1, decode_content=True)
+                    ext = image_extension(data, response.headers.get("Content-Type"))
+                    if len(data) > ASSET_MAX_BYTES or not ext:
+                        entry = {"error": "no es una imagen válida", "checked": now}
+                        stat = "failed"
+                    else:
+                        entry = {
+                            "file": self._store_bytes(data, ext),
+                            "etag": response.headers.get("ETag", ""),
+                            "last_modified": response.headers.get("Last-Modified", ""),
+                            "checked": now
+                        }
+                        stat = "downloaded"
+        except requests.RequestException as e:
+            # Error de red: se conserva la copia anterior (si la hay) y se reintenta la próxima vez
+            logging.debug("[Assets] Error descargando %s: %s", url, e)
+            with self._lock:
+                self.stats["failed"] += 1
+            return entry
+
+        with self._lock:
+            self.entries[url] = entry
+            self.stats[stat] += 1
+        return entry
+
+    def mirror(self, urls):
+        """Descarga en paralelo las imágenes que faltan o cuyo TTL expiró"""
+        now = time.time()
+        pending = []
+        for url in dict.fromkeys(u for u in urls if u and u.startswith(("http://", "https://"))):
+            if self._is_fresh(self.entries.get(url), now):
+                self.stats["cached"] += 1
+            else:
+                pending.append(url)
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                list(executor.map(self.fetch, pending))
+        self.save()
+        logging.info("[Assets] Imágenes: %d descargadas, %d sin cambios, %d en caché, %d con error",
+                     self.stats['downloaded'], self.stats['revalidated'], self.stats['cached'], self.stats['failed'])
+        return self.url_map()
+
+    def url_map(self):
+        """Mapa URL remota -> URL local para escribir la guía (ver manifest_url_map)"""
+        return manifest_url_map(self.entries, self.base_url)
+
+    def prune(self, keep_urls):
+        """
+        Olvida las URLs que ya no se usan y cuyo TTL expiró, y borra los archivos
+        que ninguna entrada referencia. Devuelve el número de archivos borrados.
+        """
+        keep_urls = set(keep_urls)
+        now = time.time()
+        for url in list(self.entries):
+            if url not in keep_urls and now - self.entries[url].get("checked", 0) >= self.ttl:
+                del self.entries[url]
+
+        used = {entry.get("file") for entry in self.entries.values()}
+        removed = 0
+        for name in os.listdir(self.cache_dir):
+            if ASSET_NAME_RE.match(name) and name not in used:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                    removed += 1
+                except OSError:
+                    pass
+        self.save()
+        return removed
+
+def asset_urls(channels, programs):
+    """URLs de logos de canal e imágenes de programa (sin repetir, en orden)"""
+    urls = dict.fromkeys(ch.get("logo") for ch in channels)
+    urls.update(dict.fromkeys(prog.get("image") for prog in programs))
+    return [url for url in urls if url]
+
+def load_url_map(cache_dir, base_url):
+    """Mapa URL remota -> URL local leyendo solo el manifiesto (sin sesión HTTP ni descargas)"""
+    return manifest_url_map(read_manifest(cache_dir), normalize_base_url(base_url))
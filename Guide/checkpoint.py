@@ -0,0 +1,127 @@
+"""
+Diario de progreso para reanudar ejecuciones interrumpidas.
+
+Cada día (canal, fecha) descargado se añade como una línea JSON al final del
+archivo, así que un corte a mitad de escritura solo puede dañar la última línea
+(que se ignora al reanudar). fsync se agrupa cada FSYNC_EVERY registros o
+FSYNC_INTERVAL segundos para que el diario sea barato de dejar activado.
+"""
+import json
+import logging
+import os
+import time
+
+from Guide.program_store import PROGRAM_FIELDS
+
+JOURNAL_VERSION = 1
+FSYNC_EVERY = 25
+FSYNC_INTERVAL = 2.0
+
+class CheckpointJournal:
+    """Diario append-only (JSONL) de días ya descargados"""
+
+    def __init__(self, path, fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def read(self, run_id):
+        """
+        Lee los días completados por una ejecución anterior con el mismo run_id.
+        Devuelve {(channel_id, 'YYYY-MM-DD'): programas}. Sin una cabecera legible
+        de esta versión y este run_id no se reutiliza nada del diario.
+        """
+        completed = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return completed
+
+        if not lines:
+            return completed
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or header.get("version") != JOURNAL_VERSION:
+            logging.warning("[Checkpoint] Cabecera ilegible o de otra versión en %s; se descarta el diario", self.path)
+            return {}
+        if header.get("run") != run_id:
+            logging.info("[Checkpoint] El diario es de otra ejecución (%s); se descarta", header.get("run"))
+            return {}
+
+        for number, line in enumerate(lines[1:], start=2):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Solo la última línea puede quedar a medias tras un corte
+                logging.warning("[Checkpoint] Línea %s incompleta ignorada", number)
+                continue
+            completed[(entry["channel"], entry["date"])] = entry["programs"]
+        return completed
+
+    def start(self, run_id, resume=False):
+        """
+        Abre el diario para escribir. Con resume=True conserva (y devuelve) los
+        días ya completados; si no, empieza un diario nuevo.
+        """
+        completed = self.read(run_id) if resume else {}
+        if completed:
+            self._drop_partial_line()
+            self._file = open(self.path, "a", encoding="utf-8")
+            logging.info("[Checkpoint] Reanudando: %s día(s) ya descargados", len(completed))
+        else:
+            self._file = open(self.path, "w", encoding="utf-8")
+            self._file.write(json.dumps({"version": JOURNAL_VERSION, "run": run_id}) + "\n")
+            self.sync()
+        return completed
+
+    def _drop_partial_line(self):
+        """Recorta una última línea a medio escribir para poder seguir añadiendo"""
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def record(self, channel_id, fecha, programs):
+        """
+        Registra los programas de un día recién descargado. Los días vacíos no se
+        registran: pueden deberse a un error de descarga y se reintentan al reanudar.
+        """
+        if self._file is None or not programs:
+            return
+        entry = {
+            "channel": channel_id,
+            "date": fecha.isoformat(),
+            "programs": [{field: prog.get(field, "") for field in PROGRAM_FIELDS} for prog in programs]
+        }
+        self._file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._file.flush()
+        self._pending += 1
+        if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        """Fuerza los registros pendientes a disco"""
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self, completed=False):
+        """Cierra el diario; si la ejecución terminó bien ya no hace falta y se elimina"""
+        if self._file is None:
+            return
+        self.sync()
+        self._file.close()
+        self._file = None
+        if completed:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
@@ -0,0 +1,273 @@
+"""
+Modelo de configuración compilado.
+
+config.json se lee, valida y resuelve una sola vez por versión del archivo
+(caché en memoria por mtime y tamaño): cada canal queda como un ChannelConfig
+inmutable con su zona horaria, días, fuente y prioridad ya resueltos, y todos
+los errores se detectan antes de cualquier descarga.
+"""
+import json
+import logging
+import os
+import re
+from collections.abc import Mapping
+from types import MappingProxyType
+
+CONFIG_FILE = "config.json"
+DEFAULT_TIMEZONE_OFFSET = 6
+DEFAULT_PRIORITY = 1.0
+
+# Ajustes con tipo fijo: nombre -> (tipos aceptados, mínimo, máximo)
+NUMERIC_SETTINGS = {
+    "timezone_offset_hours": ((int, float), -14, 14),
+    "days_to_scrape": ((int,), 1, 14),
+    "cache_duration_hours": ((int, float), 0, None),
+    "retry_attempts": ((int,), 0, None),
+    "timeout": ((int, float), 0.1, None),
+    "async_max_connections": ((int,), 1, None),
+    "time_budget_minutes": ((int, float), 0.1, None),
+    "memory_budget_mb": ((int, float), 64, None),
+    "cache_max_entries": ((int,), 1, None)
+}
+BOOLEAN_SETTINGS = ("seed_from_previous", "force_full_week", "streaming_parse", "checkpoint", "channel_health")
+OBJECT_SETTINGS = ("logging", "server", "headers", "assets")
+ENGINES = ("sync", "async")
+LOG_FORMATS = ("text", "json")
+URL_RE = re.compile(r"^https?://[^/\s]+")
+
+class ConfigError(Exception):
+    """config.json no es válido; 'errors' contiene todos los problemas encontrados"""
+
+    def __init__(self, errors, path=CONFIG_FILE):
+        self.errors = list(errors)
+        self.path = path
+        super().__init__(f"{path}: " + "; ".join(self.errors))
+
+def _check_number(value, types, minimum, maximum):
+    if isinstance(value, bool) or not isinstance(value, types):
+        return False
+    return (minimum is None or value >= minimum) and (maximum is None or value <= maximum)
+
+def channel_timezone(channel, settings):
+    """
+    Desfase horario (horas al oeste de UTC) de un canal: el ya resuelto de un
+    ChannelConfig, su 'timezone_override' o el global de settings.
+    """
+    offset = channel.get("timezone_offset_hours")
+    if offset is None:
+        offset = channel.get("timezone_override")
+    if offset is None:
+        offset = settings.get("timezone_offset_hours", DEFAULT_TIMEZONE_OFFSET)
+    return offset
+
+class ChannelConfig(Mapping):
+    """
+    Canal validado e inmutable. Se comporta como el dict original de config.json
+    (los scrapers y el almacén lo usan con get/[]), con los ajustes resueltos
+    añadidos: timezone_offset_hours, priority y, si se indicó, days_to_scrape.
+    """
+
+    __slots__ = ("_data",)
+
+    def __init__(self, raw, settings):
+        data = dict(raw)
+        data["timezone_offset_hours"] = channel_timezone(raw, settings)
+        data["priority"] = float(raw.get("priority", DEFAULT_PRIORITY))
+        object.__setattr__(self, "_data", data)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ChannelConfig es inmutable")
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return f"ChannelConfig({self._data!r})"
+
+    def as_dict(self):
+        """Copia mutable del canal"""
+        return dict(self._data)
+
+    @property
+    def id(self):
+        return self._data["id"]
+
+    @property
+    def nombre(self):
+        return self._data["nombre"]
+
+    @property
+    def scraper(self):
+        return self._data.get("scraper")
+
+    @property
+    def timezone_offset_hours(self):
+        return self._data["timezone_offset_hours"]
+
+    @property
+    def days_to_scrape(self):
+        return self._data.get("days_to_scrape")
+
+    @property
+    def priority(self):
+        return self._data["priority"]
+
+    @property
+    def derived_from(self):
+        return self._data.get("derived_from")
+
+def _validate_channel(channel, known_scrapers):
+    """Devuelve el motivo por el que un canal no es válido o None"""
+    if not isinstance(channel, dict):
+        return "no es un objeto"
+    if not channel.get("id") or not channel.get("nombre"):
+        return "faltan 'id' o 'nombre'"
+
+    timezone_override = channel.get("timezone_override")
+    if timezone_override is not None and not _check_number(timezone_override, (int, float), -14, 14):
+        return f"timezone_override inválido: {timezone_override!r}"
+    if "priority" in channel and not _check_number(channel["priority"], (int, float), 0, None):
+        return f"priority inválida: {channel['priority']!r}"
+    if "days_to_scrape" in channel and not _check_number(channel["days_to_scrape"], (int,), 1, 14):
+        return f"days_to_scrape inválido: {channel['days_to_scrape']!r}"
+
+    if channel.get("derived_from"):
+        if not _check_number(channel.get("offset_hours", 0), (int, float), -24, 24):
+            return f"offset_hours inválido: {channel.get('offset_hours')!r}"
+        return None
+
+    scraper = channel.get("scraper")
+    if not scraper:
+        return "falta 'scraper'"
+    if known_scrapers is not None and scraper not in known_scrapers:
+        return f"scraper desconocido '{scraper}'"
+    if not isinstance(channel.get("url"), str) or not URL_RE.match(channel["url"]):
+        return f"url inválida: {channel.get('url')!r}"
+    if "listing_url" in channel and not (isinstance(channel["listing_url"], str)
+                                         and URL_RE.match(channel["listing_url"])):
+        return f"listing_url inválida: {channel['listing_url']!r}"
+    return None
+
+def _validate_settings(settings):
+    errors = []
+    for name, (types, minimum, maximum) in NUMERIC_SETTINGS.items():
+        value = settings.get(name)
+        if value is not None and not _check_number(value, types, minimum, maximum):
+            errors.append(f"settings.{name} inválido: {value!r}")
+    for name in BOOLEAN_SETTINGS:
+        if name in settings and not isinstance(settings[name], bool):
+            errors.append(f"settings.{name} debe ser true/false")
+    for name in OBJECT_SETTINGS:
+        if name in settings and not isinstance(settings[name], dict):
+            errors.append(f"settings.{name} debe ser un objeto")
+    log_settings = settings.get("logging")
+    if isinstance(log_settings, dict):
+        if log_settings.get("format", "text") not in LOG_FORMATS:
+            errors.append(f"settings.logging.format debe ser uno de {', '.join(LOG_FORMATS)}")
+        if not isinstance(log_settings.get("sampling", {}), dict):
+            errors.append("settings.logging.sampling debe ser un objeto")
+    if settings.get("engine", "sync") not in ENGINES:
+        errors.append(f"settings.engine debe ser uno de {', '.join(ENGINES)}")
+    if not isinstance(settings.get("import_guides", []), list):
+        errors.append("settings.import_guides debe ser una lista")
+    asset_settings = settings.get("assets")
+    if isinstance(asset_settings, dict) and asset_settings.get("enabled", False):
+        base_url = asset_settings.get("base_url")
+        if not isinstance(base_url, str) or not URL_RE.match(base_url):
+            errors.append("settings.assets.base_url debe ser una URL absoluta (http://host:puerto/assets/) "
+                          "accesible desde los reproductores")
+    return errors
+
+class RuntimeConfig:
+    """Configuración validada: settings de solo lectura y canales compilados"""
+
+    def __init__(self, settings, channels, invalid_channels=(), scraper_settings=None, path=CONFIG_FILE):
+        self.settings = MappingProxyType(settings)
+        self.channels = tuple(channels)
+        self.invalid_channels = tuple(invalid_channels)  # (posición, canal, motivo)
+        self.scraper_settings = MappingProxyType(scraper_settings or {})
+        self.path = path
+        self._by_id = {channel.id: channel for channel in self.channels}
+
+    def channel(self, channel_id):
+        """Canal compilado por id (o None)"""
+        return self._by_id.get(channel_id)
+
+def compile_config(raw, path=CONFIG_FILE, known_scrapers=None):
+    """
+    Valida un config.json ya parseado y lo compila en un RuntimeConfig.
+    Lanza ConfigError si la estructura o algún ajuste global no es válido; los
+    canales inválidos no detienen la ejecución y quedan en invalid_channels.
+    """
+    if not isinstance(raw, dict):
+        raise ConfigError(["la raíz debe ser un objeto"], path)
+    errors = [f"Campo requerido '{field}' faltante" for field in ("settings", "channels") if field not in raw]
+    if errors:
+        raise ConfigError(errors, path)
+    if not isinstance(raw["settings"], dict):
+        raise ConfigError(["'settings' debe ser un objeto"], path)
+    if not isinstance(raw["channels"], list):
+        raise ConfigError(["'channels' debe ser una lista"], path)
+
+    settings = dict(raw["settings"])
+    errors = _validate_settings(settings)
+    if errors:
+        raise ConfigError(errors, path)
+    if settings.get("timezone_offset_hours") is None:
+        settings["timezone_offset_hours"] = DEFAULT_TIMEZONE_OFFSET
+        logging.warning("Usando timezone_offset_hours por defecto: %s", DEFAULT_TIMEZONE_OFFSET)
+
+    channels, invalid, seen = [], [], set()
+    for i, channel in enumerate(raw["channels"], 1):
+        reason = _validate_channel(channel, known_scrapers)
+        if reason is None and channel["id"] in seen:
+            reason = f"id duplicado '{channel['id']}'"
+        if reason:
+            invalid.append((i, channel, reason))
+            continue
+        seen.add(channel["id"])
+        channels.append(ChannelConfig(channel, settings))
+
+    # Un canal derivado necesita su canal base en la misma configuración
+    compiled = []
+    for channel in channels:
+        if channel.derived_from and channel.derived_from not in seen:
+            invalid.append((0, channel.as_dict(), f"canal base '{channel.derived_from}' no configurado"))
+        else:
+            compiled.append(channel)
+
+    return RuntimeConfig(settings, compiled, invalid, raw.get("scraper_settings"), path)
+
+_cache = {}   # ruta absoluta -> ((mtime_ns, tamaño, known_scrapers), RuntimeConfig)
+
+def load_runtime_config(path=CONFIG_FILE, known_scrapers=None):
+    """
+    Carga config.json compilado, reutilizando la compilación anterior mientras
+    el archivo no cambie. Lanza ConfigError si no existe o no es válido.
+    """
+    key_path = os.path.abspath(path)
+    try:
+        st = os.stat(key_path)
+    except FileNotFoundError:
+        raise ConfigError(["El archivo no se encontró"], path) from None
+
+    version = (st.st_mtime_ns, st.st_size, tuple(known_scrapers) if known_scrapers else None)
+    cached = _cache.get(key_path)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    try:
+        with open(key_path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except json.JSONDecodeError as e:
+        raise ConfigError([f"formato JSON inválido: {e}"], path) from e
+
+    config = compile_config(raw, path, known_scrapers)
+    _cache[key_path] = (version, config)
+    return config
@@ -0,0 +1,138 @@
+import gzip
+import logging
+import os
+
+from Guide.xmltv import escapar_xml
+
+# Campos que, con el mismo inicio, hacen que un programa se considere modificado
+COMPARED_FIELDS = ("stop", "title", "description", "image")
+
+def _channel_ids(source):
+    """Canales de un ProgramStore o de una Snapshot"""
+    if hasattr(source, "channel_ids"):
+        return source.channel_ids()
+    return list(source.channels)
+
+def _programs(source, channel_id):
+    """Programas ordenados por inicio de un ProgramStore o de una Snapshot"""
+    if hasattr(source, "get_programs"):
+        return source.get_programs(channel_id)
+    return source.programs(channel_id)
+
+def diff_programs(old_programs, new_programs):
+    """
+    Compara dos listas de programas ordenadas por inicio mediante un merge lineal.
+    Devuelve (añadidos, eliminados, modificados); los modificados son pares (viejo, nuevo).
+    """
+    added, removed, changed = [], [], []
+    i = j = 0
+    while i < len(old_programs) and j < len(new_programs):
+        old, new = old_programs[i], new_programs[j]
+        if old["start"] == new["start"]:
+            if any((old.get(f) or "") != (new.get(f) or "") for f in COMPARED_FIELDS):
+                changed.append((old, new))
+            i += 1
+            j += 1
+        elif old["start"] < new["start"]:
+            removed.append(old)
+            i += 1
+        else:
+            added.append(new)
+            j += 1
+    removed.extend(old_programs[i:])
+    added.extend(new_programs[j:])
+    return added, removed, changed
+
+class GuideDiff:
+    """Resultado de comparar dos guías canal por canal"""
+
+    def __init__(self):
+        self.channels = {}          # channel_id -> (añadidos, eliminados, modificados)
+        self.added_channels = []
+        self.removed_channels = []
+
+    def count(self, kind):
+        idx = {"added": 0, "removed": 1, "changed": 2}[kind]
+        return sum(len(changes[idx]) for changes in self.channels.values())
+
+    def summary(self):
+        return {
+            "added": self.count("added"),
+            "removed": self.count("removed"),
+            "changed": self.count("changed"),
+            "channels_added": len(self.added_channels),
+            "channels_removed": len(self.removed_channels),
+            "channels_changed": sum(1 for c in self.channels.values() if any(c))
+        }
+
+    def is_empty(self):
+        return not any(self.summary().values())
+
+def _window_start(new, channel_ids):
+    """Inicio de la ventana de la guía nueva: el primer programa de cualquier canal"""
+    starts = [programs[0]["start"] for programs in (_programs(new, cid) for cid in channel_ids) if programs]
+    return min(starts) if starts else None
+
+def diff_guides(old, new):
+    """
+    Compara dos guías (ProgramStore o Snapshot) y devuelve un GuideDiff.
+    Los programas viejos que terminaron antes de la ventana de la guía nueva ya
+    pasaron (seed_store los descarta) y no se reportan como eliminados.
+    """
+    result = GuideDiff()
+    old_ids = set(_channel_ids(old))
+    new_ids = _channel_ids(new)
+    window_start = _window_start(new, new_ids)
+
+    def in_window(programs):
+        if window_start is None:
+            return programs
+        return [prog for prog in programs if prog["stop"] > window_start]
+
+    for channel_id in new_ids:
+        old_programs = in_window(_programs(old, channel_id)) if channel_id in old_ids else []
+        if channel_id not in old_ids:
+            result.added_channels.append(channel_id)
+        result.channels[channel_id] = diff_programs(old_programs, _programs(new, channel_id))
+
+    new_set = set(new_ids)
+    for channel_id in _channel_ids(old):
+        if channel_id not in new_set:
+            result.removed_channels.append(channel_id)
+            result.channels[channel_id] = ([], in_window(_programs(old, channel_id)), [])
+
+    return result
+
+def _programme_xml(prog, channel_id, action):
+    xml = (
+        f'  <programme start="{prog["start"]}" stop="{prog["stop"]}" '
+        f'channel="{escapar_xml(channel_id)}" action="{action}">\n'
+    )
+    if action != "remove":
+        xml += f'    <title lang="es">{escapar_xml(prog.get("title"))}</title>\n'
+        if prog.get("description"):
+            xml += f'    <desc lang="es">{escapar_xml(prog["description"])}</desc>\n'
+        if prog.get("image"):
+            xml += f'    <icon src="{escapar_xml(prog["image"])}"/>\n'
+    return xml + '  </programme>\n'
+
+def write_delta(path, diff, base_version=""):
+    """
+    Escribe un archivo delta (XMLTV con atributo action="add|change|remove")
+    que solo contiene los programas que cambiaron respecto a la guía anterior.
+    """
+    tmp_path = f"{path}.tmp"
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(tmp_path, "wt", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write(f'<tv generator-info-name="JhonVT-EPG-Generator" delta-base="{escapar_xml(base_version)}">\n')
+        for channel_id, (added, removed, changed) in diff.channels.items():
+            for prog in removed:
+                f.write(_programme_xml(prog, channel_id, "remove"))
+            for _, prog in changed:
+                f.write(_programme_xml(prog, channel_id, "change"))
+            for prog in added:
+                f.write(_programme_xml(prog, channel_id, "add"))
+        f.write('</tv>')
+    os.replace(tmp_path, path)
+    logging.info("Delta guardado: %s", path)
@@ -0,0 +1,108 @@
+"""
+Salud de los canales entre ejecuciones.
+
+Por canal se guarda en health_file (JSON) el historial de ejecuciones: éxitos,
+fallos, fallos consecutivos, última descarga buena, último error y latencia
+media por página. Una ejecución cuenta como fallo para un canal cuando ningún
+día devolvió programas (404, estructura cambiada, timeouts...).
+
+Tras FAILURES_BEFORE_BACKOFF fallos consecutivos el canal deja de descargarse
+durante un tiempo que se duplica con cada nuevo fallo (BACKOFF_BASE_HOURS,
+hasta BACKOFF_MAX_HOURS). Cuando vence la espera el canal se sondea con un
+solo día; solo si el sondeo trae programas se descargan los demás días.
+"""
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+HEALTH_FILE = "epg_health.json"
+HEALTH_VERSION = 1
+FAILURES_BEFORE_BACKOFF = 2     # un fallo aislado puede ser un corte puntual
+BACKOFF_BASE_HOURS = 6
+BACKOFF_MAX_HOURS = 168
+LATENCY_ALPHA = 0.3             # peso de la última ejecución en la latencia media
+
+# Estados de un canal para la planificación
+HEALTHY, PROBE, SKIP = "ok", "probe", "skip"
+
+def backoff_hours(consecutive_failures):
+    """Espera antes de volver a intentar un canal con ese número de fallos seguidos"""
+    if consecutive_failures < FAILURES_BEFORE_BACKOFF:
+        return 0
+    return min(BACKOFF_BASE_HOURS * 2 ** (consecutive_failures - FAILURES_BEFORE_BACKOFF), BACKOFF_MAX_HOURS)
+
+class ChannelHealth:
+    """Registro persistente de la salud de cada canal"""
+
+    def __init__(self, path=HEALTH_FILE):
+        self.path = path
+        self.channels = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == HEALTH_VERSION:
+                    self.channels = data.get("channels", {})
+            except (OSError, ValueError) as e:
+                logging.warning("[Salud] No se pudo leer %s, se empieza de cero: %s", path, e)
+
+    def status(self, channel_id, now=None):
+        """HEALTHY, PROBE (vencida la espera: sondear un día) o SKIP (en espera)"""
+        entry = self.channels.get(channel_id)
+        if not entry or entry.get("consecutive_failures", 0) < FAILURES_BEFORE_BACKOFF:
+            return HEALTHY
+        retry_at = entry.get("retry_at")
+        if retry_at and (now or datetime.now()) < datetime.fromisoformat(retry_at):
+            return SKIP
+        return PROBE
+
+    def record(self, channel_id, ok, pages=0, seconds=0.0, error=None, now=None):
+        """
+        Registra el resultado de una ejecución para un canal.
+        ok: algún día devolvió programas; pages/seconds: páginas descargadas y su tiempo.
+        """
+        now = now or datetime.now()
+        entry = self.channels.setdefault(channel_id, {
+            "successes": 0, "failures": 0, "consecutive_failures": 0,
+            "last_success": None, "last_failure": None, "last_error": None,
+            "latency_ms": None, "retry_at": None
+        })
+        if pages:
+            latency = seconds / pages * 1000
+            previous = entry["latency_ms"]
+            entry["latency_ms"] = round(latency if previous is None else
+                                        previous + LATENCY_ALPHA * (latency - previous), 1)
+        if ok:
+            entry["successes"] += 1
+            entry["consecutive_failures"] = 0
+            entry["last_success"] = now.isoformat(timespec="seconds")
+            entry["retry_at"] = None
+            return entry
+
+        entry["failures"] += 1
+        entry["consecutive_failures"] += 1
+        entry["last_failure"] = now.isoformat(timespec="seconds")
+        entry["last_error"] = error
+        wait = backoff_hours(entry["consecutive_failures"])
+        entry["retry_at"] = (now + timedelta(hours=wait)).isoformat(timespec="seconds") if wait else None
+        return entry
+
+    def success_rate(self, channel_id):
+        entry = self.channels.get(channel_id)
+        if not entry:
+            return None
+        total = entry["successes"] + entry["failures"]
+        return entry["successes"] / total if total else None
+
+    def prune(self, channel_ids):
+        """Olvida los canales que ya no están configurados"""
+        keep = set(channel_ids)
+        for channel_id in [cid for cid in self.channels if cid not in keep]:
+            del self.channels[channel_id]
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": HEALTH_VERSION, "channels": self.channels}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
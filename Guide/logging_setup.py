@@ -0,0 +1,159 @@
+"""
+Logging asíncrono configurado desde settings.logging de config.json.
+
+Los módulos siguen usando el logger raíz (logging.info(...)), pero el único
+handler del raíz es un QueueHandler: el hilo que registra solo encola el
+record y un QueueListener en segundo plano lo formatea y escribe en el archivo
+rotativo y en consola. El formateo (interpolación de argumentos %s incluida)
+ocurre en ese hilo, así que un mensaje con argumentos perezosos no cuesta
+nada al scraper más allá de crear el record.
+
+Ajustes (todos opcionales):
+    level         nivel mínimo ("INFO")
+    file          archivo de log ("epg_generator.log")
+    max_size_mb   tamaño antes de rotar (5)
+    backup_count  archivos rotados que se conservan (3)
+    format        "text" o "json" (una línea JSON por record en el archivo)
+    console       escribir también en stdout (true)
+    queue         usar la cola asíncrona (true)
+    sampling      {"etapa": fracción}: de los mensajes DEBUG/INFO de una etapa
+                  (prefijo "[GatoTV]", "[MiTV]"...) solo se conserva esa fracción;
+                  los WARNING y superiores nunca se descartan
+"""
+import atexit
+import json
+import logging
+import math
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DEFAULT_STAGE = "main"
+# Atributos estándar de LogRecord (el resto son campos 'extra' del registro)
+RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+_handlers = []
+
+def record_stage(record):
+    """Etapa de un record: la etiqueta '[GatoTV]' al inicio del mensaje"""
+    msg = record.msg
+    if isinstance(msg, str) and msg.startswith("["):
+        end = msg.find("]", 1, 40)
+        if end > 1:
+            return msg[1:end]
+    return DEFAULT_STAGE
+
+class StageSampler(logging.Filter):
+    """
+    Conserva solo una fracción de los mensajes DEBUG/INFO de cada etapa
+    (determinista: con 0.1 pasa el primero y luego 1 de cada 10). WARNING y superiores siempre pasan.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = {stage: float(rate) for stage, rate in (rates or {}).items()}
+        self.counters = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rates.get(record_stage(record))
+        if rate is None or rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        stage = record_stage(record)
+        seen = self.counters.get(stage, 0)
+        self.counters[stage] = seen + 1
+        # Pasa el record cuando la fracción acumulada cruza un entero (el primero siempre pasa)
+        return math.ceil((seen + 1) * rate) > math.ceil(seen * rate)
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler que no formatea en el hilo que registra (lo hace el listener)"""
+
+    def prepare(self, record):
+        return record
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por record: ts, level, stage, msg y los campos 'extra'"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "stage": record_stage(record),
+            "msg": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value if isinstance(value, (str, int, float, bool, type(None))) else repr(value)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+def stop_logging():
+    """
+    Vacía la cola, detiene el hilo de escritura y retira los handlers del
+    logger raíz (se llama también al salir)
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    root_logger = logging.getLogger()
+    for handler in _handlers:
+        root_logger.removeHandler(handler)
+        handler.close()
+    _handlers.clear()
+
+def setup_logging(log_settings=None):
+    """
+    Configura el logger raíz según settings.logging. Se puede llamar varias
+    veces: reemplaza la configuración anterior. Devuelve el logger raíz.
+    """
+    global _listener
+    log_settings = log_settings or {}
+    root_logger = logging.getLogger()
+
+    stop_logging()
+
+    if log_settings.get("format", "text") == "json":
+        file_formatter = JsonFormatter()
+    else:
+        file_formatter = logging.Formatter(TEXT_FORMAT)
+
+    outputs = []
+    file_handler = RotatingFileHandler(
+        log_settings.get("file", "epg_generator.log"),
+        maxBytes=int(log_settings.get("max_size_mb", 5) * 1024 * 1024),
+        backupCount=log_settings.get("backup_count", 3),
+        encoding='utf-8'
+    )
+    file_handler.setFormatter(file_formatter)
+    outputs.append(file_handler)
+
+    if log_settings.get("console", True):
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        outputs.append(console_handler)
+
+    if log_settings.get("queue", True):
+        log_queue = queue.SimpleQueue()
+        front = DeferredQueueHandler(log_queue)
+        _listener = QueueListener(log_queue, *outputs, respect_handler_level=True)
+        _listener.start()
+        _handlers.extend(outputs)
+        outputs = [front]
+    for handler in outputs:
+        # Un muestreador por handler: compartido, cada record avanzaría su contador una vez por salida
+        handler.addFilter(StageSampler(log_settings.get("sampling")))
+        root_logger.addHandler(handler)
+    _handlers.extend(outputs)
+
+    root_logger.setLevel(log_settings.get("level", "INFO").upper())
+    return root_logger
+
+atexit.register(stop_logging)
@@ -0,0 +1,269 @@
+"""
+Presupuesto de memoria para ejecuciones con muchos canales.
+
+Con settings.memory_budget_mb definido:
+    - MemoryWatchdog mide el RSS del proceso en segundo plano y avisa cuando
+      se acerca al presupuesto (HIGH_WATER).
+    - Los canales que ya terminaron de descargarse se vuelcan a un archivo
+      temporal (ProgramSpill) y se leen de nuevo, de uno en uno, al escribir
+      la guía, la instantánea o el delta.
+    - PressureGate reduce la concurrencia del motor async mientras hay presión.
+LRUCache acota los cachés de los scrapers independientemente del presupuesto.
+"""
+import asyncio
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+HIGH_WATER = 0.8            # fracción del presupuesto a partir de la cual hay presión
+WATCHDOG_INTERVAL = 0.5     # segundos entre mediciones
+DEFAULT_CACHE_ENTRIES = 64
+SPILL_FIELDS = ("start", "stop", "title", "description", "image")
+POOLED_FIELDS = SPILL_FIELDS[2:]    # textos internados en el StringPool del almacén
+
+def rss_bytes():
+    """Memoria residente actual del proceso en bytes (None si no se puede medir)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Sin /proc (macOS): pico de RSS, la mejor aproximación disponible
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+class LRUCache:
+    """Diccionario acotado: al superar maxsize se descarta la entrada menos usada"""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_ENTRIES):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getitem__(self, key):
+        value = self._data[key]
+        self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get(self, key, default=None):
+        return self[key] if key in self._data else default
+
+    def clear(self):
+        self._data.clear()
+
+class MemoryWatchdog:
+    """Mide el RSS periódicamente; over_budget indica que hay que liberar memoria"""
+
+    def __init__(self, budget_bytes, interval=WATCHDOG_INTERVAL, high_water=HIGH_WATER):
+        self.budget_bytes = budget_bytes
+        self.threshold = budget_bytes * high_water
+        self.interval = interval
+        self.rss = rss_bytes() or 0
+        self.peak = self.rss
+        self.over_budget = self.rss >= self.threshold
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        """Toma una medición (también la hace el hilo de fondo)"""
+        rss = rss_bytes()
+        if rss is None:
+            return self.rss
+        self.rss = rss
+        self.peak = max(self.peak, rss)
+        was_over = self.over_budget
+        self.over_budget = rss >= self.threshold
+        if self.over_budget and not was_over:
+            logging.warning("[Memoria] RSS %.0f MB cerca del presupuesto (%.0f MB)",
+                            rss / 1024 / 1024, self.budget_bytes / 1024 / 1024)
+        return rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        if rss_bytes() is None:
+            logging.warning("[Memoria] No se puede medir el RSS en este sistema; sin vigilancia")
+            return self
+        self._thread = threading.Thread(target=self._run, name="memory-watchdog", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+class PressureGate:
+    """
+    Limita las descargas simultáneas del motor async: max_active normalmente,
+    low_active mientras el watchdog indica presión de memoria.
+    """
+
+    def __init__(self, watchdog, max_active, low_active=1):
+        self.watchdog = watchdog
+        self.max_active = max_active
+        self.low_active = max(1, min(low_active, max_active))
+        self.active = 0
+        self._condition = None
+
+    def limit(self):
+        if self.watchdog is not None and self.watchdog.over_budget:
+            return self.low_active
+        return self.max_active
+
+    async def __aenter__(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            # Siempre hay alguna descarga activa mientras se espera: su salida despierta a las demás
+            await self._condition.wait_for(lambda: self.active < self.limit())
+            self.active += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        async with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+        return False
+
+class ProgramSpill(MutableMapping):
+    """
+    Programas por canal (sustituye a ProgramStore.programs) con canales volcables
+    a un archivo temporal. Un canal volcado se lee del archivo al consultarlo y
+    vuelve a memoria solo si se reemplaza su lista.
+    """
+
+    def __init__(self, programs, spill_dir=None, pool=None):
+        self._memory = dict(programs)
+        self._index = {}            # channel_id -> (offset, tamaño, programas)
+        self._order = list(self._memory)
+        self.pool = pool
+        # texto -> usos en los canales en memoria: al volcar se sueltan del pool los que llegan a cero
+        self._text_refs = {}
+        for channel_programs in self._memory.values():
+            self._count_texts(channel_programs, 1)
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix="epg_spill_", suffix=".bin", dir=spill_dir)
+        self._file = os.fdopen(fd, "w+b")
+        self.spilled_programs = 0
+
+    def __getitem__(self, channel_id):
+        if channel_id in self._memory:
+            return self._memory[channel_id]
+        if channel_id not in self._index:
+            raise KeyError(channel_id)
+        offset, size, _ = self._index[channel_id]
+        self._file.seek(offset)
+        rows = pickle.loads(self._file.read(size))
+        # Solo se comparten los textos que siguen en el pool: leer un canal volcado no lo vuelve a llenar
+        intern = self.pool.shared if self.pool is not None else (lambda text: text)
+        return [
+            {"start": start, "stop": stop, "title": intern(title), "description": intern(description),
+             "image": intern(image), "channel_id": channel_id}
+            for start, stop, title, description, image in rows
+        ]
+
+    def __setitem__(self, channel_id, programs):
+        if channel_id not in self._memory and channel_id not in self._index:
+            self._order.append(channel_id)
+        self._index.pop(channel_id, None)
+        self._count_texts(self._memory.get(channel_id, ()), -1)
+        self._count_texts(programs, 1)
+        self._memory[channel_id] = programs
+
+    def __delitem__(self, channel_id):
+        if channel_id not in self._memory and channel_id not in self._index:
+            raise KeyError(channel_id)
+        self._count_texts(self._memory.pop(channel_id, ()), -1)
+        self._index.pop(channel_id, None)
+        self._order.remove(channel_id)
+
+    def __iter__(self):
+        return iter(list(self._order))
+
+    def __len__(self):
+        return len(self._order)
+
+    def __contains__(self, channel_id):
+        return channel_id in self._memory or channel_id in self._index
+
+    def count(self, channel_id):
+        """Programas de un canal sin leerlos del disco"""
+        if channel_id in self._memory:
+            return len(self._memory[channel_id])
+        entry = self._index.get(channel_id)
+        return entry[2] if entry else 0
+
+    def is_spilled(self, channel_id):
+        return channel_id in self._index
+
+    def _count_texts(self, programs, delta):
+        """Suma delta a los usos de los textos de unos programas; devuelve los que dejan de usarse"""
+        refs = self._text_refs
+        unused = []
+        for prog in programs:
+            for field in POOLED_FIELDS:
+                text = prog[field]
+                if not text:
+                    continue
+                count = refs.get(text, 0) + delta
+                if count > 0:
+                    refs[text] = count
+                else:
+                    refs.pop(text, None)
+                    unused.append(text)
+        return unused
+
+    def spill(self, channel_ids):
+        """Vuelca a disco los canales indicados que sigan en memoria; devuelve cuántos programas"""
+        spilled = 0
+        released = []
+        self._file.seek(0, os.SEEK_END)
+        for channel_id in channel_ids:
+            programs = self._memory.get(channel_id)
+            if not programs:
+                continue
+            rows = [tuple(prog[field] for field in SPILL_FIELDS) for prog in programs]
+            released.extend(self._count_texts(programs, -1))
+            data = pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL)
+            offset = self._file.tell()
+            self._file.write(data)
+            self._index[channel_id] = (offset, len(data), len(rows))
+            del self._memory[channel_id]
+            spilled += len(rows)
+        self._file.flush()
+        self.spilled_programs += spilled
+        if released and self.pool is not None:
+            # El pool guarda referencias fuertes: sin esto los textos volcados seguirían en memoria
+            self.pool.release(released)
+        return spilled
+
+    def close(self):
+        """Cierra y elimina el archivo de volcado (los canales volcados dejan de estar disponibles)"""
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
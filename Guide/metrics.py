@@ -0,0 +1,157 @@
+"""
+Métricas de descarga por ejecución e historial para estimar costes.
+
+Cada scraper acumula en un FetchStats las peticiones, bytes y segundos de sus
+descargas. Al terminar la ejecución se añade una línea al historial
+(metrics_file, JSONL) y el planificador (--plan) usa las últimas ejecuciones
+para estimar peticiones, bytes y tiempo de una ejecución antes de lanzarla.
+"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+METRICS_FILE = "epg_metrics.jsonl"
+HISTORY_RUNS = 10
+HISTORY_MAX_LINES = 500
+# Valores por defecto sin historial (página de día típica de GatoTV)
+DEFAULT_BYTES_PER_REQUEST = 150_000
+DEFAULT_SECONDS_PER_REQUEST = 1.0
+
+class FetchStats:
+    """Contadores de descarga de un scraper (seguros entre hilos)"""
+
+    __slots__ = ("requests", "errors", "bytes", "seconds", "cache_hits", "_lock")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.cache_hits = 0
+        self._lock = threading.Lock()
+
+    def record(self, nbytes, seconds, ok=True):
+        """Registra una petición HTTP terminada"""
+        with self._lock:
+            self.requests += 1
+            self.bytes += nbytes
+            self.seconds += seconds
+            if not ok:
+                self.errors += 1
+
+    def record_cache_hit(self):
+        with self._lock:
+            self.cache_hits += 1
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "seconds": round(self.seconds, 3),
+            "cache_hits": self.cache_hits
+        }
+
+def append_run(path, scrapers, engine, wall_seconds, jobs):
+    """
+    Añade al historial las métricas de una ejecución.
+    scrapers: {clave: scraper con atributo 'stats'}
+    """
+    record = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "engine": engine,
+        "jobs": jobs,
+        "wall_seconds": round(wall_seconds, 3),
+        "scrapers": {key: scraper.stats.as_dict() for key, scraper in scrapers.items()}
+    }
+    lines = []
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()[-(HISTORY_MAX_LINES - 1):]
+    lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    os.replace(tmp_path, path)
+    return record
+
+def load_history(path, runs=HISTORY_RUNS):
+    """Últimas 'runs' ejecuciones del historial (las líneas dañadas se ignoran)"""
+    if not os.path.exists(path):
+        return []
+    history = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                history.append(json.loads(line))
+            except ValueError:
+                continue
+    return history[-runs:]
+
+def cost_model(history):
+    """
+    Coste medio por petición de cada scraper según el historial:
+    {clave: {"bytes": ..., "seconds": ..., "error_rate": ..., "samples": peticiones}}
+    """
+    totals = {}
+    for run in history:
+        for key, stats in run.get("scrapers", {}).items():
+            entry = totals.setdefault(key, {"requests": 0, "errors": 0, "bytes": 0, "seconds": 0.0})
+            for field in entry:
+                entry[field] += stats.get(field, 0)
+
+    model = {}
+    for key, entry in totals.items():
+        if not entry["requests"]:
+            continue
+        model[key] = {
+            "bytes": entry["bytes"] / entry["requests"],
+            "seconds": entry["seconds"] / entry["requests"],
+            "error_rate": entry["errors"] / entry["requests"],
+            "samples": entry["requests"]
+        }
+    return model
+
+def estimate_cost(requests_by_scraper, model, engine="sync", max_connections=1):
+    """
+    Estima bytes y tiempo de pared de un conjunto de peticiones.
+    requests_by_scraper: {clave: número de peticiones}
+    En el motor async el tiempo se reparte entre max_connections conexiones.
+    """
+    total_bytes = 0
+    total_seconds = 0.0
+    per_scraper = {}
+    for key, count in requests_by_scraper.items():
+        cost = model.get(key)
+        bytes_per_request = cost["bytes"] if cost else DEFAULT_BYTES_PER_REQUEST
+        seconds_per_request = cost["seconds"] if cost else DEFAULT_SECONDS_PER_REQUEST
+        per_scraper[key] = {
+            "requests": count,
+            "bytes": int(count * bytes_per_request),
+            "seconds": count * seconds_per_request,
+            "from_history": cost is not None
+        }
+        total_bytes += per_scraper[key]["bytes"]
+        total_seconds += per_scraper[key]["seconds"]
+
+    total_requests = sum(requests_by_scraper.values())
+    wall_seconds = total_seconds
+    if engine == "async" and total_requests:
+        wall_seconds = total_seconds / min(max_connections, total_requests)
+    return {
+        "requests": total_requests,
+        "bytes": total_bytes,
+        "wall_seconds": wall_seconds,
+        "scrapers": per_scraper
+    }
+
+def log_run_summary(scrapers):
+    """Registra en el log las métricas de descarga de cada scraper"""
+    for key, scraper in scrapers.items():
+        stats = scraper.stats
+        if stats.requests or stats.cache_hits:
+            logging.info("[Métricas] %s: %s peticiones (%s con error), "
+                         "%.0f KB, %.1f s, %s en caché",
+                         key, stats.requests, stats.errors, stats.bytes / 1024, stats.seconds, stats.cache_hits)
@@ -0,0 +1,142 @@
+"""
+Planificación de una ejecución sin tocar la red.
+
+plan_jobs expande la configuración en trabajos (canal, día) igual que la
+ejecución real, separando lo que no necesita descarga: días ya presentes en la
+guía previa, días recuperados del diario de progreso y canales derivados.
+La ejecución real y el modo --plan usan el mismo plan, así que lo que se
+reporta es exactamente lo que se descargaría.
+"""
+import json
+import logging
+from collections import Counter
+
+from Guide.health import PROBE, SKIP
+from Guide.metrics import estimate_cost
+from Guide.scheduler import FetchJob
+
+class FetchPlan:
+    """Trabajos pendientes y días que se resuelven sin descargar"""
+
+    def __init__(self):
+        self.jobs = []
+        self.seed_hits = []     # (canal, fecha) ya presentes en la guía previa
+        self.restored = []      # (canal, fecha, programas) recuperados del diario
+        self.derived = []       # canales generados a partir de su canal base
+        self.errors = []        # (canal, excepción)
+        self.skipped = []       # canales en espera por fallos repetidos (ver Guide/health.py)
+        self.probes = {}        # channel_id -> trabajos aplazados hasta que el sondeo de un día funcione
+
+def plan_jobs(channels, scrapers, store, seeded=False, completed_days=None, health=None):
+    """
+    Expande los canales en trabajos de descarga por día.
+    seeded: el almacén se sembró con una guía previa (sus días pueden omitirse).
+    completed_days: {(channel_id, 'YYYY-MM-DD'): programas} del diario (--resume).
+    health: ChannelHealth; los canales en espera se omiten y los que salen de
+    ella descargan primero un solo día (el resto queda en plan.probes).
+    """
+    plan = FetchPlan()
+    completed_days = completed_days or {}
+    for channel in channels:
+        if channel.get("derived_from"):
+            plan.derived.append(channel)
+            continue
+
+        channel_id, channel_name = channel["id"], channel["nombre"]
+        state = health.status(channel_id) if health else None
+        if state == SKIP:
+            plan.skipped.append(channel)
+            continue
+        scraper = scrapers[channel["scraper"]]
+        try:
+            dates = scraper.get_dates_to_scrape(channel)
+            covered = store.covered_dates(channel_id) if seeded else set()
+            pending = dates
+            if covered:
+                # Hoy y días anteriores siempre se refrescan; el resto solo si falta
+                today_local = scraper.get_local_today(channel)
+                pending = [d for d in dates if d <= today_local or d.strftime("%Y%m%d") not in covered]
+                plan.seed_hits.extend((channel, d) for d in dates if d not in pending)
+                if len(pending) < len(dates):
+                    logging.info("'%s': %s día(s) ya presentes en la guía previa", channel_name, len(dates) - len(pending))
+
+            # Días ya descargados por la ejecución interrumpida
+            restored = [d for d in pending if (channel_id, d.isoformat()) in completed_days]
+            for fecha in restored:
+                plan.restored.append((channel, fecha, completed_days[(channel_id, fecha.isoformat())]))
+            if restored:
+                logging.info("'%s': %s día(s) recuperados del diario", channel_name, len(restored))
+
+            channel_jobs = [FetchJob(channel, scraper, d) for d in pending if d not in restored]
+            if state == PROBE and len(channel_jobs) > 1:
+                plan.probes[channel_id] = channel_jobs[1:]
+                channel_jobs = channel_jobs[:1]
+            plan.jobs.extend(channel_jobs)
+        except Exception as e:
+            plan.errors.append((channel, e))
+    return plan
+
+def plan_report(plan, jobs, model, engine="sync", max_connections=1, budget_minutes=None):
+    """
+    Resumen del plan con la estimación de coste según el historial de métricas.
+    jobs: los trabajos del plan ya ordenados por prioridad (schedule_jobs).
+    """
+    requests_by_scraper = Counter(job.channel["scraper"] for job in jobs)
+    estimate = estimate_cost(requests_by_scraper, model, engine, max_connections)
+
+    entries = []
+    elapsed = 0.0
+    concurrency = max(min(max_connections, len(jobs)), 1) if engine == "async" else 1
+    for job in jobs:
+        cost = estimate["scrapers"][job.channel["scraper"]]
+        elapsed += cost["seconds"] / cost["requests"] / concurrency
+        entries.append({
+            "channel": job.channel["id"],
+            "date": job.fecha.isoformat(),
+            "url": job.scraper.get_day_url(job.channel, job.fecha),
+            "priority": round(job.priority, 3),
+            "eta_seconds": round(elapsed, 1),
+            "within_budget": budget_minutes is None or elapsed <= budget_minutes * 60
+        })
+
+    return {
+        "engine": engine,
+        "jobs": entries,
+        "store_hits": [{"channel": ch["id"], "date": d.isoformat()} for ch, d in plan.seed_hits],
+        "journal_hits": [{"channel": ch["id"], "date": d.isoformat()} for ch, d, _ in plan.restored],
+        "derived": [{"channel": ch["id"], "from": ch["derived_from"]} for ch in plan.derived],
+        "errors": [{"channel": ch["id"], "error": str(e)} for ch, e in plan.errors],
+        "skipped": [ch["id"] for ch in plan.skipped],
+        "probes": {channel_id: len(deferred) for channel_id, deferred in plan.probes.items()},
+        "estimate": estimate
+    }
+
+def print_plan(report, as_json=False):
+    """Muestra el plan en consola (tabla legible o JSON)"""
+    if as_json:
+        print(json.dumps(report, indent=1, ensure_ascii=False))
+        return
+
+    for entry in report["jobs"]:
+        budget_mark = "" if entry["within_budget"] else "  (fuera de presupuesto)"
+        print(f"{entry['priority']:7.3f}  {entry['date']}  {entry['channel']:<28} {entry['url']}{budget_mark}")
+
+    estimate = report["estimate"]
+    print()
+    print(f"Peticiones: {estimate['requests']} (motor {report['engine']})")
+    for key, cost in estimate["scrapers"].items():
+        source = "historial" if cost["from_history"] else "sin historial, valores por defecto"
+        print(f"  * {key}: {cost['requests']} peticiones, {cost['bytes'] / 1024 / 1024:.1f} MB, "
+              f"{cost['seconds']:.0f} s ({source})")
+    print(f"Descarga estimada: {estimate['bytes'] / 1024 / 1024:.1f} MB")
+    print(f"Tiempo estimado: {estimate['wall_seconds'] / 60:.1f} min")
+    print(f"Días sin descarga: {len(report['store_hits'])} en la guía previa, "
+          f"{len(report['journal_hits'])} en el diario, {len(report['derived'])} canales derivados")
+    if report["skipped"] or report["probes"]:
+        print(f"Canales con fallos repetidos: {len(report['skipped'])} en espera, "
+              f"{len(report['probes'])} en sondeo de un día")
+    outside = sum(1 for entry in report["jobs"] if not entry["within_budget"])
+    if outside:
+        print(f"Fuera del presupuesto de tiempo: {outside} página(s)")
+    for error in report["errors"]:
+        print(f"Error planificando '{error['channel']}': {error['error']}")
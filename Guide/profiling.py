@@ -0,0 +1,247 @@
+"""
+Perfilado opcional de una ejecución (python main.py --profile).
+
+Dos modos:
+    sample    muestreo de la pila del hilo principal (y de los hilos de parseo
+              del motor async) cada SAMPLE_INTERVAL segundos; sobrecarga
+              mínima, apto para ejecuciones reales
+    cprofile  cProfile determinista; más preciso por función pero más lento
+
+En ambos modos los métodos calientes de los scrapers y del escritor XMLTV se
+cronometran (llamadas y tiempo acumulado), y al terminar se escriben junto al
+log:
+    epg_profile_<marca>.folded  pilas plegadas ("a;b;c N"), listas para
+                                flamegraph.pl, speedscope o inferno
+    epg_profile_<marca>.prof    estadísticas de cProfile (solo modo cprofile,
+                                ver con 'python -m pstats' o snakeviz)
+    epg_profile_<marca>.txt     resumen legible
+"""
+import cProfile
+import functools
+import inspect
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from datetime import datetime
+
+SAMPLE_INTERVAL = 0.005
+PROFILE_MODES = ("sample", "cprofile")
+TOP_FUNCTIONS = 40
+PARSE_THREAD_PREFIX = "parse"
+# Métodos que se cronometran si la clase los define
+PROFILED_METHODS = (
+    "fetch_programs", "afetch_programs", "fetch_day", "afetch_day",
+    "parse_day", "parse_day_stream", "parse_rows",
+    "parse_title", "parse_description", "parse_image", "parse_program_details",
+    "parse_time", "parse_time_with_validation", "handle_day_transitions", "handle_day_transition",
+    "write_channel", "write_programs", "write_footer"
+)
+
+def module_label(filename):
+    """Nombre corto del módulo de un archivo ('logging' en vez de '__init__')"""
+    module = os.path.splitext(os.path.basename(filename))[0]
+    if module == "__init__":
+        module = os.path.basename(os.path.dirname(filename)) or module
+    return module
+
+def frame_label(code):
+    """Etiqueta de un marco de pila: módulo:función"""
+    return f"{module_label(code.co_filename)}:{code.co_name}"
+
+class StackSampler:
+    """Muestrea periódicamente la pila de un hilo y cuenta las pilas plegadas"""
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = frame_label(code)
+        return label
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            # Hilo perfilado y hilos de parseo de los scrapers (Scrapers/async_http.py)
+            thread_ids = [self.thread_id] + [thread.ident for thread in threading.enumerate()
+                                             if thread.name.startswith(PARSE_THREAD_PREFIX)]
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                labels = []
+                while frame is not None:
+                    # Los envoltorios de cronometraje no aportan nada a la pila
+                    if frame.f_code.co_filename != __file__:
+                        labels.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                key = ";".join(reversed(labels))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+                self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def write_folded(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+def folded_from_stats(stats):
+    """
+    Pilas plegadas aproximadas a partir de cProfile: cada arista llamador->función
+    con su tiempo propio en microsegundos (cProfile no guarda pilas completas).
+    """
+    folded = {}
+    for (filename, _, name), (_, _, tottime, _, callers) in stats.stats.items():
+        label = f"{module_label(filename)}:{name}"
+        if not callers:
+            folded[label] = folded.get(label, 0) + int(tottime * 1e6)
+            continue
+        total_calls = sum(caller[0] for caller in callers.values()) or 1
+        for (caller_file, _, caller_name), caller_stats in callers.items():
+            caller_label = f"{module_label(caller_file)}:{caller_name}"
+            share = int(tottime * 1e6 * caller_stats[0] / total_calls)
+            if share:
+                key = f"{caller_label};{label}"
+                folded[key] = folded.get(key, 0) + share
+    return folded
+
+class RunProfiler:
+    """Perfila una ejecución completa y cronometra los métodos calientes"""
+
+    def __init__(self, output_dir=".", mode="sample", interval=SAMPLE_INTERVAL):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Modo de perfilado desconocido: {mode}")
+        self.output_dir = output_dir
+        self.mode = mode
+        self.interval = interval
+        self.timings = {}       # "Clase.método" -> [llamadas, segundos]
+        self._patched = []      # (clase, nombre, original)
+        self._lock = threading.Lock()
+        self._profile = None
+        self._sampler = None
+        self._started = None
+        self.paths = {}
+
+    def _record(self, name, elapsed):
+        with self._lock:
+            entry = self.timings.get(name)
+            if entry is None:
+                entry = self.timings[name] = [0, 0.0]
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def _wrap(self, name, func):
+        record = self._record
+        perf_counter = time.perf_counter
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    record(name, perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, perf_counter() - started)
+        return wrapper
+
+    def instrument(self, cls, methods=PROFILED_METHODS):
+        """Cronometra los métodos indicados de una clase hasta que termine el perfilado"""
+        for method in methods:
+            original = cls.__dict__.get(method)
+            if original is None or not callable(original):
+                continue
+            self._patched.append((cls, method, original))
+            setattr(cls, method, self._wrap(f"{cls.__name__}.{method}", original))
+
+    def start(self):
+        self._started = time.perf_counter()
+        if self.mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = StackSampler(interval=self.interval)
+            self._sampler.start()
+        logging.info("[Profile] Perfilado activo (modo %s)", self.mode)
+
+    def stop(self):
+        """Detiene el perfilado, restaura los métodos y escribe los archivos"""
+        wall = time.perf_counter() - self._started
+        if self._profile:
+            self._profile.disable()
+        if self._sampler:
+            self._sampler.stop()
+        for cls, method, original in reversed(self._patched):
+            setattr(cls, method, original)
+        self._patched = []
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"epg_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        self.paths = {"folded": f"{base}.folded", "summary": f"{base}.txt"}
+
+        lines = [f"Perfil de ejecución ({self.mode}) - {wall:.2f} s", ""]
+        lines.append("Métodos calientes (llamadas, total, media):")
+        for name, (calls, seconds) in sorted(self.timings.items(), key=lambda item: -item[1][1]):
+            lines.append(f"  {name:<45} {calls:>8} {seconds:>10.3f} s {seconds / calls * 1000:>9.3f} ms")
+        lines.append("")
+
+        if self._profile:
+            self.paths["prof"] = f"{base}.prof"
+            self._profile.dump_stats(self.paths["prof"])
+            stats = pstats.Stats(self._profile)
+            with open(self.paths["folded"], "w", encoding="utf-8") as f:
+                for stack, count in sorted(folded_from_stats(stats).items()):
+                    f.write(f"{stack} {count}\n")
+            out = io.StringIO()
+            pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            lines.append(out.getvalue())
+        else:
+            self._sampler.write_folded(self.paths["folded"])
+            lines.append(f"Muestras: {self._sampler.samples} (cada {self.interval * 1000:.0f} ms)")
+            self_counts = {}
+            for stack, count in self._sampler.stacks.items():
+                leaf = stack.rsplit(";", 1)[-1]
+                self_counts[leaf] = self_counts.get(leaf, 0) + count
+            lines.append("Funciones con más muestras propias:")
+            for leaf, count in sorted(self_counts.items(), key=lambda item: -item[1])[:TOP_FUNCTIONS]:
+                lines.append(f"  {count:>7}  {leaf}")
+
+        with open(self.paths["summary"], "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        logging.info("[Profile] Perfil guardado: %s", ', '.join(self.paths.values()))
+        return self.paths
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
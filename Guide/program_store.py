@@ -0,0 +1,159 @@
+from Guide.memory import ProgramSpill
+from Guide.snapshot import Snapshot, write_snapshot
+from Guide.string_pool import StringPool
+from Guide.xmltv import shift_xmltv
+
+# Campos de un programa que se conservan en el almacén (sin objetos datetime)
+PROGRAM_FIELDS = ("start", "stop", "title", "description", "image")
+# Campos de texto que se repiten entre días y canales y se guardan internados
+POOLED_FIELDS = ("title", "description", "image")
+
+class ProgramStore:
+    """Almacén en memoria de canales y programas, indexado por canal"""
+
+    def __init__(self, pool=None):
+        self.channels = {}   # channel_id -> configuración del canal (orden de inserción)
+        self.programs = {}   # channel_id -> lista de programas ordenada por inicio
+        self.pool = pool if pool is not None else StringPool()
+
+    def __len__(self):
+        if isinstance(self.programs, ProgramSpill):
+            return sum(self.programs.count(channel_id) for channel_id in self.programs)
+        return sum(len(progs) for progs in self.programs.values())
+
+    def enable_spill(self, spill_dir=None):
+        """Permite volcar a disco canales completos con spill() (ver Guide/memory.py)"""
+        if not isinstance(self.programs, ProgramSpill):
+            self.programs = ProgramSpill(self.programs, spill_dir, self.pool)
+        return self.programs
+
+    def spill(self, channel_ids):
+        """Vuelca a disco los programas de los canales indicados; devuelve cuántos programas"""
+        if not isinstance(self.programs, ProgramSpill):
+            return 0
+        return self.programs.spill(channel_ids)
+
+    def close_spill(self):
+        """
+        Elimina el archivo de volcado al terminar la ejecución; los canales que
+        seguían en memoria se conservan y los volcados quedan vacíos.
+        """
+        if isinstance(self.programs, ProgramSpill):
+            spill = self.programs
+            self.programs = {
+                channel_id: [] if spill.is_spilled(channel_id) else spill[channel_id]
+                for channel_id in spill
+            }
+            spill.close()
+
+    def add_channel(self, channel):
+        """Registra (o actualiza) un canal en el almacén"""
+        channel_id = channel["id"]
+        self.channels[channel_id] = {
+            "id": channel_id,
+            "nombre": channel.get("nombre", channel_id),
+            "logo": channel.get("logo", "")
+        }
+        self.programs.setdefault(channel_id, [])
+
+    def add_programs(self, channel_id, programs):
+        """Añade programas a un canal, reemplazando los que tengan el mismo inicio"""
+        if channel_id not in self.channels:
+            self.add_channel({"id": channel_id})
+
+        intern = self.pool.intern
+        by_start = {prog["start"]: prog for prog in self.programs[channel_id]}
+        for prog in programs:
+            if not prog.get("start"):
+                continue
+            entry = {field: prog.get(field, "") for field in PROGRAM_FIELDS}
+            for field in POOLED_FIELDS:
+                entry[field] = intern(entry[field])
+            entry["channel_id"] = channel_id
+            by_start[entry["start"]] = entry
+
+        self.programs[channel_id] = [by_start[start] for start in sorted(by_start)]
+
+    def replace_span(self, channel_id, programs):
+        """
+        Añade programas recién descargados descartando los existentes que se solapan
+        con el intervalo que cubren (los datos nuevos mandan sobre los importados).
+        """
+        valid = [prog for prog in programs if prog.get("start") and prog.get("stop")]
+        if valid and channel_id in self.programs:
+            first = min(prog["start"] for prog in valid)
+            last = max(prog["stop"] for prog in valid)
+            self.programs[channel_id] = [
+                prog for prog in self.programs[channel_id]
+                if prog["stop"] <= first or prog["start"] >= last
+            ]
+        self.add_programs(channel_id, valid)
+
+    def derive_channel(self, channel_id, base_id, offset_hours):
+        """
+        Genera los programas de un canal con desfase horario (timeshift) a partir
+        de los de otro canal: mismos textos (compartidos), horas desplazadas
+        offset_hours (positivo = más tarde). Reemplaza los programas previos del canal.
+        Devuelve el número de programas generados.
+        """
+        if channel_id not in self.channels:
+            self.add_channel({"id": channel_id})
+        offset = int(round(offset_hours * 3600))
+        derived = []
+        for prog in self.programs.get(base_id, []):
+            try:
+                start, stop = shift_xmltv(prog["start"], offset), shift_xmltv(prog["stop"], offset)
+            except ValueError:
+                continue
+            derived.append(dict(prog, start=start, stop=stop, channel_id=channel_id))
+        self.programs[channel_id] = derived
+        return len(derived)
+
+    def covered_dates(self, channel_id):
+        """Fechas 'YYYYMMDD' en las que el canal ya tiene programas"""
+        return {prog["start"][:8] for prog in self.programs.get(channel_id, [])}
+
+    def prune(self, before):
+        """Elimina los programas que terminan antes de 'before' ('YYYYMMDDHHMMSS')"""
+        removed = 0
+        for channel_id, programs in self.programs.items():
+            kept = [prog for prog in programs if prog["stop"][:14] > before]
+            removed += len(programs) - len(kept)
+            self.programs[channel_id] = kept
+        return removed
+
+    def get_programs(self, channel_id):
+        """Devuelve los programas de un canal ordenados por inicio"""
+        return self.programs.get(channel_id, [])
+
+    def iter_programs(self, channel_ids=None):
+        """Itera los programas en el orden de los canales"""
+        for channel_id in channel_ids if channel_ids is not None else self.channels:
+            yield from self.programs.get(channel_id, [])
+
+    def slice(self, channel_ids=None, date=None):
+        """
+        Extrae un subconjunto (canales, programas) del almacén.
+        date: fecha 'YYYY-MM-DD' o 'YYYYMMDD'; filtra programas que inician ese día.
+        """
+        if channel_ids is None:
+            channel_ids = list(self.channels)
+        else:
+            channel_ids = [cid for cid in channel_ids if cid in self.channels]
+
+        date_prefix = date.replace("-", "") if date else None
+        programs = [
+            prog for prog in self.iter_programs(channel_ids)
+            if date_prefix is None or prog["start"].startswith(date_prefix)
+        ]
+        return [self.channels[cid] for cid in channel_ids], programs
+
+    def save(self, path):
+        """Guarda el almacén en disco como instantánea binaria (ver Guide/snapshot.py)"""
+        write_snapshot(path, self)
+
+    @classmethod
+    def load(cls, path):
+        """Carga un almacén guardado con save()"""
+        with Snapshot(path) as snapshot:
+            return snapshot.to_store()
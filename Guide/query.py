@@ -0,0 +1,129 @@
+import logging
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+
+from Guide.xmltv import xmltv_to_epoch
+
+class ChannelIndex:
+    """
+    Índice de intervalos de un canal: inicios ordenados más el máximo acumulado de
+    los finales, lo que permite acotar por búsqueda binaria incluso con solapes.
+    """
+
+    __slots__ = ("programs", "starts", "stops", "max_stops")
+
+    def __init__(self, programs):
+        rows = []
+        for prog in programs:
+            try:
+                rows.append((xmltv_to_epoch(prog["start"]), xmltv_to_epoch(prog["stop"]), prog))
+            except (KeyError, ValueError):
+                continue
+        rows.sort(key=lambda row: row[0])
+
+        self.programs = [row[2] for row in rows]
+        self.starts = [row[0] for row in rows]
+        self.stops = [row[1] for row in rows]
+        self.max_stops = []
+        running = None
+        for stop in self.stops:
+            running = stop if running is None or stop > running else running
+            self.max_stops.append(running)
+
+    def window(self, start, end):
+        """Programas que se solapan con [start, end)"""
+        hi = bisect_left(self.starts, end)
+        lo = bisect_right(self.max_stops, start, 0, hi)
+        return [self.programs[i] for i in range(lo, hi) if self.stops[i] > start]
+
+    def now(self, at):
+        """Programa en emisión en el instante 'at' (el último que empezó)"""
+        hi = bisect_right(self.starts, at)
+        lo = bisect_right(self.max_stops, at, 0, hi)
+        for i in range(hi - 1, lo - 1, -1):
+            if self.stops[i] > at:
+                return self.programs[i]
+        return None
+
+    def upcoming(self, at, count=1):
+        """Los siguientes 'count' programas que empiezan después de 'at'"""
+        idx = bisect_right(self.starts, at)
+        return self.programs[idx:idx + count]
+
+class ProgramIndex:
+    """API de consulta en proceso (ahora/siguiente y ventanas) sobre el almacén de programas"""
+
+    def __init__(self, store):
+        self.channels = dict(store.channels)
+        self.index = {
+            channel_id: ChannelIndex(store.get_programs(channel_id))
+            for channel_id in store.channels
+        }
+
+    def _channel_ids(self, channel_ids):
+        if channel_ids is None:
+            return list(self.index)
+        return [cid for cid in channel_ids if cid in self.index]
+
+    def now(self, at, channel_ids=None):
+        """{channel_id: programa en emisión o None}"""
+        return {cid: self.index[cid].now(at) for cid in self._channel_ids(channel_ids)}
+
+    def now_next(self, at, channel_ids=None):
+        """{channel_id: (programa actual, programa siguiente)}"""
+        result = {}
+        for cid in self._channel_ids(channel_ids):
+            upcoming = self.index[cid].upcoming(at)
+            result[cid] = (self.index[cid].now(at), upcoming[0] if upcoming else None)
+        return result
+
+    def window(self, start, end, channel_ids=None):
+        """{channel_id: [programas que se solapan con [start, end)]} (formato parrilla)"""
+        return {cid: self.index[cid].window(start, end) for cid in self._channel_ids(channel_ids)}
+
+def local_now_epoch(timezone_offset_hours):
+    """
+    Instante actual en la misma convención que usan los scrapers
+    (hora local del canal escrita sin desplazamiento).
+    """
+    local_now = datetime.now(timezone.utc) - timedelta(hours=timezone_offset_hours)
+    return int(local_now.replace(tzinfo=timezone.utc).timestamp())
+
+def format_program(prog):
+    """Formatea un programa como 'HH:MM-HH:MM Título'"""
+    if not prog:
+        return "--"
+    return f"{prog['start'][8:10]}:{prog['start'][10:12]}-{prog['stop'][8:10]}:{prog['stop'][10:12]} {prog['title']}"
+
+def print_now_next(index, at, channel_ids=None):
+    """Imprime la tabla ahora/siguiente"""
+    for cid, (current, following) in index.now_next(at, channel_ids).items():
+        name = index.channels[cid].get("nombre", cid)
+        print(f"{name:<30} AHORA: {format_program(current):<45} DESPUÉS: {format_program(following)}")
+
+def print_grid(index, at, hours, channel_ids=None):
+    """Imprime la parrilla de las próximas 'hours' horas"""
+    for cid, programs in index.window(at, at + int(hours * 3600), channel_ids).items():
+        name = index.channels[cid].get("nombre", cid)
+        print(f"\n{name}")
+        if not programs:
+            print("  (sin programación)")
+        for prog in programs:
+            print(f"  {format_program(prog)}")
+
+def parse_at(value):
+    """Instante de --at ('YYYYMMDD', 'YYYYMMDDHHMM'...) a epoch; lanza ValueError si no es válido"""
+    if not value.isdigit() or not 8 <= len(value) <= 14:
+        raise ValueError(f"Instante inválido '{value}': se esperaba YYYYMMDDHHMM")
+    return xmltv_to_epoch(value.ljust(14, "0"))
+
+def run_query(store, mode, timezone_offset_hours, at=None, hours=3, channel_ids=None):
+    """Punto de entrada de la CLI de consultas"""
+    index = ProgramIndex(store)
+    at = parse_at(at) if at else local_now_epoch(timezone_offset_hours)
+    logging.debug("[Query] Consulta '%s' en %s sobre %s canales", mode, at, len(index.index))
+
+    if mode == "grid":
+        print_grid(index, at, hours, channel_ids)
+    else:
+        print_now_next(index, at, channel_ids)
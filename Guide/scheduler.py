@@ -0,0 +1,81 @@
+"""
+Planificación de descargas por prioridad.
+
+Cada trabajo es un par (canal, día). La prioridad combina:
+
+    peso del canal   "priority" en config.json (1 por defecto)
+    cercanía         1 / (1 + días desde hoy): hoy pesa más que dentro de 6 días
+    antigüedad       los días sin datos en el almacén pesan el doble que los ya cubiertos
+
+Así, si la ejecución se corta (o agota su presupuesto de tiempo), lo que ya se
+descargó es lo más valioso: hoy, de los canales favoritos, y lo que faltaba.
+"""
+from datetime import timedelta
+
+from Guide.xmltv import xmltv_to_epoch
+
+DEFAULT_WEIGHT = 1.0
+STALE_DISCOUNT = 0.5   # Cuánto baja la prioridad un día ya cubierto por completo
+
+class FetchJob:
+    """Descarga pendiente de un canal para un día"""
+
+    __slots__ = ("channel", "scraper", "fecha", "priority", "elapsed")
+
+    def __init__(self, channel, scraper, fecha, priority=0.0):
+        self.channel = channel
+        self.scraper = scraper
+        self.fecha = fecha
+        self.priority = priority
+        self.elapsed = 0.0      # segundos de descarga (para la salud del canal)
+
+    def __repr__(self):
+        return f"FetchJob({self.channel.get('id')}, {self.fecha}, {self.priority:.3f})"
+
+def day_coverage(programs, fecha):
+    """Fracción (0-1) del día 'fecha' cubierta por los programas de un canal"""
+    day_start = xmltv_to_epoch(fecha.strftime("%Y%m%d000000"))
+    day_end = day_start + 86400
+    prefix_start = fecha.strftime("%Y%m%d")
+    prefix_end = (fecha + timedelta(days=1)).strftime("%Y%m%d")
+
+    covered = 0
+    for prog in programs:
+        # Comparación barata por prefijo antes de convertir a epoch
+        if prog["start"][:8] > prefix_end or prog["stop"][:8] < prefix_start:
+            continue
+        try:
+            start, stop = xmltv_to_epoch(prog["start"]), xmltv_to_epoch(prog["stop"])
+        except ValueError:
+            continue
+        covered += max(0, min(stop, day_end) - max(start, day_start))
+    return min(covered / 86400, 1.0)
+
+def job_priority(weight, days_ahead, coverage):
+    """Puntuación de un trabajo (mayor = antes)"""
+    proximity = 1.0 / (1 + max(days_ahead, 0))
+    staleness = 1.0 - STALE_DISCOUNT * coverage
+    return weight * proximity * staleness
+
+def channel_weight(channel):
+    """Peso asignado por el usuario al canal ("priority" en config.json)"""
+    try:
+        return max(float(channel.get("priority", DEFAULT_WEIGHT)), 0.0)
+    except (TypeError, ValueError):
+        return DEFAULT_WEIGHT
+
+def schedule_jobs(jobs, store=None):
+    """
+    Calcula la prioridad de cada trabajo y los devuelve ordenados de mayor a menor.
+    El orden es estable: a igual prioridad se respeta el orden de config.json.
+    """
+    today_by_channel = {}
+    for job in jobs:
+        channel_id = job.channel["id"]
+        today = today_by_channel.get(channel_id)
+        if today is None:
+            today = today_by_channel[channel_id] = job.scraper.get_local_today(job.channel)
+        programs = store.get_programs(channel_id) if store is not None else []
+        coverage = day_coverage(programs, job.fecha) if programs else 0.0
+        job.priority = job_priority(channel_weight(job.channel), (job.fecha - today).days, coverage)
+    return sorted(jobs, key=lambda job: -job.priority)
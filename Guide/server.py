@@ -0,0 +1,324 @@
+import gzip
+import logging
+import os
+import re
+import shutil
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+from Guide.assets import ASSET_CONTENT_TYPES, ASSET_NAME_RE, load_url_map
+from Guide.program_store import ProgramStore
+from Guide.xmltv import write_xmltv
+
+DATE_RE = re.compile(r"^\d{4}-?\d{2}-?\d{2}$")
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def file_etag(path):
+    """Calcula un ETag débil a partir del tamaño y la fecha de modificación"""
+    st = os.stat(path)
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+def accepts_gzip(header):
+    """Indica si el cliente acepta gzip según Accept-Encoding (respeta q=0)"""
+    if not header:
+        return False
+    for part in header.split(","):
+        fields = [f.strip() for f in part.split(";")]
+        coding = fields[0].lower()
+        if coding not in ("gzip", "*"):
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        return q > 0
+    return False
+
+def parse_range(header, size):
+    """
+    Interpreta una cabecera Range de un solo rango.
+    Devuelve (inicio, fin_inclusivo), None si debe ignorarse o 'invalid' si no es satisfacible.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None  # Multirango o formato desconocido: se sirve completo
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            return "invalid"
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return "invalid"
+    return start, min(end, size - 1)
+
+class GuideServer(ThreadingHTTPServer):
+    """
+    Servidor HTTP que publica la guía generada y recortes del almacén de programas.
+
+    Cada archivo de la caché se genera una sola vez aunque lo pidan varios
+    clientes a la vez (un cerrojo por archivo); los demás archivos y las
+    respuestas ya en caché no esperan a esa generación.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, guide_path, store_path=None, cache_dir="epg_server_cache",
+                 asset_dir=None, asset_base_url=None):
+        super().__init__(address, GuideRequestHandler)
+        self.guide_path = guide_path
+        self.store_path = store_path
+        self.cache_dir = cache_dir
+        self.asset_dir = asset_dir
+        self.asset_base_url = asset_base_url
+        self._lock = threading.Lock()          # protege _building
+        self._building = {}                    # ruta en caché -> cerrojo de quien la está generando
+        self._store_lock = threading.Lock()
+        self._store = None
+        self._store_etag = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def asset_path(self, name):
+        """Ruta de una imagen de la caché local o None si el nombre no es válido"""
+        if not self.asset_dir or not ASSET_NAME_RE.match(name):
+            return None
+        return os.path.join(self.asset_dir, name)
+
+    def get_store(self):
+        """Devuelve el almacén de programas, recargándolo si cambió en disco"""
+        if not self.store_path or not os.path.exists(self.store_path):
+            return None, None
+        etag = file_etag(self.store_path)
+        with self._store_lock:
+            if etag != self._store_etag:
+                self._store = ProgramStore.load(self.store_path)
+                self._store_etag = etag
+                self._purge(("channel-", "date-"), etag)
+                logging.info("[Server] Almacén recargado: %s", self.store_path)
+            return self._store, self._store_etag
+
+    def _materialize(self, path, build):
+        """
+        Genera 'path' con build() si no existe, una sola vez aunque lo pidan
+        varios hilos. build() devuelve False si no hay nada que generar.
+        Devuelve si el archivo existe.
+        """
+        if os.path.exists(path):
+            return True
+        with self._lock:
+            lock = self._building.setdefault(path, threading.Lock())
+        try:
+            with lock:
+                # Quien esperaba encuentra el archivo ya generado
+                return os.path.exists(path) or build() is not False
+        finally:
+            with self._lock:
+                if self._building.get(path) is lock:
+                    del self._building[path]
+
+    def _purge(self, prefixes, current_etag):
+        """Elimina de la caché los archivos de versiones anteriores"""
+        tag = current_etag.strip('"')
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(prefixes) and tag not in name:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+    def plain_guide(self):
+        """Devuelve la ruta a la guía descomprimida, materializada una vez por versión"""
+        etag = file_etag(self.guide_path)
+        tag = etag.strip('"')
+        cached = os.path.join(self.cache_dir, f"guide-{tag}.xml")
+
+        def build():
+            self._purge(("guide-",), etag)
+            tmp_path = f"{cached}.tmp"
+            with gzip.open(self.guide_path, "rb") as src, open(tmp_path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_path, cached)
+
+        self._materialize(cached, build)
+        return cached
+
+    def slice_files(self, kind, value):
+        """
+        Materializa en caché un recorte del almacén (por canal o por fecha).
+        Devuelve (ruta_xml, ruta_gz) o None si el recorte no existe.
+        """
+        store, store_etag = self.get_store()
+        if store is None:
+            return None
+
+        safe_value = re.sub(r"[^A-Za-z0-9_.-]", "_", value)
+        tag = store_etag.strip('"')
+        base = os.path.join(self.cache_dir, f"{kind}-{safe_value}-{tag}")
+        xml_path, gz_path = f"{base}.xml", f"{base}.xml.gz"
+
+        if kind == "channel" and value not in store.channels:
+            return None
+
+        def build():
+            if kind == "channel":
+                channels, programs = store.slice(channel_ids=[value])
+            else:
+                channels, programs = store.slice(date=value)
+                if not programs:
+                    return False
+
+            icon_map = load_url_map(self.asset_dir, self.asset_base_url) if self.asset_dir and self.asset_base_url else None
+            with open(f"{xml_path}.tmp", "wb") as f:
+                write_xmltv(f, channels, programs, pool=store.pool, icon_map=icon_map)
+            with open(f"{xml_path}.tmp", "rb") as src, gzip.open(f"{gz_path}.tmp", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(f"{xml_path}.tmp", xml_path)
+            os.replace(f"{gz_path}.tmp", gz_path)
+
+        # El .gz se escribe el último: si existe, el recorte está completo
+        if not self._materialize(gz_path, build):
+            return None
+        return xml_path, gz_path
+
+class GuideRequestHandler(BaseHTTPRequestHandler):
+    """Atiende peticiones GET/HEAD con ETag, negociación gzip y rangos de bytes"""
+
+    server_version = "JhonVT-EPG"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.handle_request(send_body=True)
+
+    def do_HEAD(self):
+        self.handle_request(send_body=False)
+
+    def log_message(self, format, *args):
+        logging.debug("[Server] %s - %s", self.address_string(), format % args)
+
+    def handle_request(self, send_body):
+        path = unquote(urlparse(self.path).path)
+        guide_name = os.path.basename(self.server.guide_path)
+        want_gzip = accepts_gzip(self.headers.get("Accept-Encoding"))
+
+        try:
+            if path == f"/{guide_name}":
+                # Archivo .gz tal cual, sin negociación
+                return self.send_file(self.server.guide_path, "application/gzip", None, send_body)
+
+            if path in ("/", "/guide.xml", "/epg.xml"):
+                if want_gzip:
+                    return self.send_file(self.server.guide_path, "application/xml", "gzip", send_body)
+                return self.send_file(self.server.plain_guide(), "application/xml", None, send_body)
+
+            if path.startswith("/assets/"):
+                asset_path = self.server.asset_path(path[len("/assets/"):])
+                if not asset_path:
+                    return self.send_error(404, "Recurso no encontrado")
+                # Los nombres dependen del contenido: la respuesta nunca cambia
+                content_type = ASSET_CONTENT_TYPES[asset_path.rsplit(".", 1)[1]]
+                return self.send_file(asset_path, content_type, None, send_body,
+                                      cache_control="public, max-age=31536000, immutable")
+
+            match = re.match(r"^/(channel|date)/(.+?)\.xml$", path)
+            if match:
+                kind, value = match.groups()
+                if kind == "date" and not DATE_RE.match(value):
+                    return self.send_error(400, "Fecha inválida")
+                files = self.server.slice_files(kind, value)
+                if not files:
+                    return self.send_error(404, "Recorte no encontrado")
+                xml_path, gz_path = files
+                if want_gzip:
+                    return self.send_file(gz_path, "application/xml", "gzip", send_body)
+                return self.send_file(xml_path, "application/xml", None, send_body)
+
+            self.send_error(404, "Recurso no encontrado")
+
+        except FileNotFoundError:
+            self.send_error(404, "Guía no generada todavía")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            logging.error("[Server] Error atendiendo %s: %s", self.path, e)
+            self.send_error(500, "Error interno")
+
+    def send_file(self, file_path, content_type, content_encoding, send_body, cache_control="no-cache"):
+        """Envía un archivo del disco respetando If-None-Match y Range (sendfile)"""
+        with open(file_path, "rb") as f:
+            st = os.fstat(f.fileno())
+            size = st.st_size
+            suffix = "-gz" if content_encoding else ""
+            etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}{suffix}"'
+
+            common_headers = {
+                "ETag": etag,
+                "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+                "Accept-Ranges": "bytes",
+                "Vary": "Accept-Encoding",
+                "Cache-Control": cache_control
+            }
+
+            if_none_match = self.headers.get("If-None-Match")
+            if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+                self.send_response(304)
+                for name, value in common_headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                return
+
+            byte_range = parse_range(self.headers.get("Range"), size)
+            if_range = self.headers.get("If-Range")
+            if if_range and if_range.strip() != etag:
+                byte_range = None
+
+            if byte_range == "invalid":
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            if byte_range:
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                start, end = 0, size - 1
+                self.send_response(200)
+
+            length = end - start + 1 if size else 0
+            self.send_header("Content-Type", content_type)
+            if content_encoding:
+                self.send_header("Content-Encoding", content_encoding)
+            self.send_header("Content-Length", str(length))
+            for name, value in common_headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+
+            if send_body and length:
+                self.wfile.flush()
+                self.connection.sendfile(f, offset=start, count=length)
+
+def serve_guide(guide_path, store_path=None, host="0.0.0.0", port=8080, cache_dir="epg_server_cache",
+                asset_dir=None, asset_base_url=None):
+    """Arranca el servidor HTTP de la guía (bloqueante)"""
+    server = GuideServer((host, port), guide_path, store_path, cache_dir, asset_dir, asset_base_url)
+    logging.info("[Server] Sirviendo %s en http://%s:%s/", guide_path, host, server.server_address[1])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("[Server] Detenido por el usuario")
+    finally:
+        server.server_close()
@@ -0,0 +1,86 @@
+"""
+Reparto de canales entre varias máquinas (python main.py --shard i/N).
+
+Cada canal va al shard que indica el hash estable de su id, así que N
+procesos con la misma configuración se reparten los canales sin coordinarse
+y sin solaparse. Los canales derivados van al shard de su canal base (se
+generan a partir de sus programas). Cada shard guarda su almacén parcial
+junto al almacén principal y 'python main.py --merge N' los combina en la
+guía completa.
+"""
+import glob
+import hashlib
+import logging
+import os
+import re
+
+from Guide.snapshot import SnapshotError
+
+SHARD_RE = re.compile(r"^\s*(\d+)\s*/\s*(\d+)\s*$")
+
+def parse_shard(spec):
+    """'2/4' -> (2, 4); lanza ValueError si no es válido (1 <= i <= N)"""
+    match = SHARD_RE.match(spec or "")
+    if not match:
+        raise ValueError(f"Shard inválido '{spec}': se esperaba i/N, por ejemplo 1/4")
+    index, count = int(match.group(1)), int(match.group(2))
+    if not 1 <= index <= count:
+        raise ValueError(f"Shard inválido '{spec}': i debe estar entre 1 y N")
+    return index, count
+
+def shard_of(channel, count):
+    """Shard (1..count) de un canal: hash estable de su id o del de su canal base"""
+    key = channel.get("derived_from") or channel["id"]
+    digest = hashlib.sha1(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+def select_shard(channels, shard):
+    """Canales que corresponden al shard (i, N), en el orden de la configuración"""
+    index, count = shard
+    return [channel for channel in channels if shard_of(channel, count) == index]
+
+def shard_path(path, shard):
+    """Ruta del archivo de un shard: epg_store.bin -> epg_store.shard-2-of-4.bin"""
+    base, ext = os.path.splitext(path)
+    return f"{base}.shard-{shard[0]}-of-{shard[1]}{ext}"
+
+def shard_files(path):
+    """Archivos de todos los shards que existan para una ruta (p. ej. los historiales de métricas)"""
+    base, ext = os.path.splitext(path)
+    return sorted(glob.glob(f"{glob.escape(base)}.shard-*-of-*{ext}"))
+
+def shard_settings(settings, shard):
+    """Ajustes de un shard: log, diario de progreso, salud y métricas propios para no pisarse entre procesos"""
+    settings = dict(settings)
+    log_settings = dict(settings.get("logging", {}))
+    log_settings["file"] = shard_path(log_settings.get("file", "epg_generator.log"), shard)
+    settings["logging"] = log_settings
+    settings["checkpoint_file"] = shard_path(settings.get("checkpoint_file", "epg_checkpoint.jsonl"), shard)
+    settings["health_file"] = shard_path(settings.get("health_file", "epg_health.json"), shard)
+    settings["metrics_file"] = shard_path(settings.get("metrics_file", "epg_metrics.jsonl"), shard)
+    return settings
+
+def merge_shard_stores(store, store_file, count, load):
+    """
+    Combina en 'store' los almacenes parciales de los N shards. Los programas de
+    cada canal de un shard reemplazan a los que hubiera (guía previa).
+    load: función ruta -> ProgramStore (ProgramStore.load).
+    Devuelve (rutas combinadas, shards que faltan).
+    """
+    merged, missing = [], []
+    for index in range(1, count + 1):
+        path = shard_path(store_file, (index, count))
+        try:
+            partial = load(path)
+        except (OSError, SnapshotError) as e:
+            logging.warning("[Shards] Falta el shard %s/%s (%s): %s", index, count, path, e)
+            missing.append(index)
+            continue
+        for channel_id, channel in partial.channels.items():
+            if channel_id not in store.channels:
+                store.add_channel(channel)
+            store.programs[channel_id] = []
+            store.add_programs(channel_id, partial.get_programs(channel_id))
+        logging.info("[Shards] Shard %s/%s: %s canales, %s programas", index, count, len(partial.channels), len(partial))
+        merged.append(path)
+    return merged, missing
@@ -0,0 +1,304 @@
+"""
+Formato binario de instantánea de la guía
+-----------------------------------------
+
+Todas las cifras son enteros little-endian de 32 bits:
+
+    cabecera      magic(8) versión n_strings n_channels n_programs
+                  off_string_index off_string_data off_channels off_programs
+    string_index  (n_strings + 1) desplazamientos uint32 dentro de string_data
+    string_data   cadenas UTF-8 concatenadas (la cadena 0 es "")
+    channels      n_channels × (id, nombre, logo, primer_programa, n_programas)
+    programs      n_programs × (inicio, fin, título, descripción, imagen)
+
+Los textos se guardan una sola vez (internados) y se referencian por índice.
+Los programas están agrupados por canal y ordenados por inicio (epoch int32),
+así que el archivo se puede mapear en memoria y consultar con búsqueda binaria
+sin deserializarlo completo. Las horas son las del almacén: hora local del
+canal sin desplazamiento (las guías importadas se normalizan al importarlas);
+una marca que aún traiga ' +HHMM' se guarda por su hora de reloj.
+"""
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+from Guide.xmltv import xmltv_to_epoch, epoch_to_xmltv
+
+MAGIC = b"EPGSNAP\x00"
+VERSION = 1
+HEADER = struct.Struct("<8s8I")
+CHANNEL_FIELDS = 5
+PROGRAM_FIELDS = 5
+
+class SnapshotError(ValueError):
+    """La instantánea no existe o tiene un formato inválido"""
+
+def _as_int32_array(values):
+    data = array("i", values)
+    if sys.byteorder != "little":
+        data.byteswap()
+    return data
+
+def write_snapshot(path, store):
+    """Escribe el almacén de programas como instantánea binaria (escritura atómica)"""
+    strings = [""]
+    string_ids = {"": 0}
+
+    def intern(text):
+        text = text or ""
+        idx = string_ids.get(text)
+        if idx is None:
+            idx = string_ids[text] = len(strings)
+            strings.append(text)
+        return idx
+
+    channel_rows = []
+    program_rows = []
+    with_offset = 0
+    for channel_id, channel in store.channels.items():
+        programs = store.get_programs(channel_id)
+        first = len(program_rows) // PROGRAM_FIELDS
+        count = 0
+        for prog in programs:
+            try:
+                # Solo la hora de reloj: el epoch no debe desplazarse por un ' +HHMM'
+                start = xmltv_to_epoch(prog["start"][:14])
+                stop = xmltv_to_epoch(prog["stop"][:14])
+            except (KeyError, ValueError):
+                continue
+            if len(prog["start"]) > 14 or len(prog["stop"]) > 14:
+                with_offset += 1
+            program_rows.extend((start, stop, intern(prog.get("title")),
+                                 intern(prog.get("description")), intern(prog.get("image"))))
+            count += 1
+        channel_rows.extend((intern(channel_id), intern(channel.get("nombre")),
+                             intern(channel.get("logo")), first, count))
+
+    encoded = [s.encode("utf-8") for s in strings]
+    string_index = [0]
+    for data in encoded:
+        string_index.append(string_index[-1] + len(data))
+    string_data = b"".join(encoded)
+    string_data += b"\x00" * (-len(string_data) % 4)  # Alinear a 4 bytes
+
+    off_string_index = HEADER.size
+    off_string_data = off_string_index + 4 * len(string_index)
+    off_channels = off_string_data + len(string_data)
+    off_programs = off_channels + 4 * len(channel_rows)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(strings), len(channel_rows) // CHANNEL_FIELDS,
+                            len(program_rows) // PROGRAM_FIELDS, off_string_index,
+                            off_string_data, off_channels, off_programs))
+        f.write(_as_int32_array(string_index).tobytes())
+        f.write(string_data)
+        f.write(_as_int32_array(channel_rows).tobytes())
+        f.write(_as_int32_array(program_rows).tobytes())
+    os.replace(tmp_path, path)
+
+    if with_offset:
+        logging.warning("Instantánea: %d programas traían desplazamiento horario; se guardó su hora de reloj",
+                        with_offset)
+    logging.info("Instantánea guardada: %s (%d programas, %d textos únicos, %d bytes)",
+                 path, len(program_rows) // PROGRAM_FIELDS, len(strings), off_programs + 4 * len(program_rows))
+
+class _Column:
+    """Vista de solo lectura de una columna de la tabla de programas (para bisect)"""
+
+    __slots__ = ("table", "first", "count", "field")
+
+    def __init__(self, table, first, count, field):
+        self.table, self.first, self.count, self.field = table, first, count, field
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return self.table[(self.first + i) * PROGRAM_FIELDS + self.field]
+
+class Snapshot:
+    """Instantánea mapeada en memoria; los textos se decodifican solo al consultarlos"""
+
+    def __init__(self, path):
+        if sys.byteorder != "little":
+            raise SnapshotError("Las instantáneas solo se pueden mapear en sistemas little-endian")
+        self.path = path
+        try:
+            self._file = open(path, "rb")
+        except FileNotFoundError:
+            raise SnapshotError(f"Instantánea no encontrada: {path}")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise SnapshotError(f"Instantánea vacía: {path}")
+
+        if len(self._mmap) < HEADER.size:
+            self.close()
+            raise SnapshotError(f"Instantánea truncada: {path}")
+        (magic, version, n_strings, n_channels, n_programs, off_string_index,
+         off_string_data, off_channels, off_programs) = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise SnapshotError(f"Formato de instantánea desconocido: {path}")
+
+        # Las secciones deben ser contiguas, alineadas y caber en el archivo
+        sections_ok = (
+            off_string_index == HEADER.size
+            and off_string_data == off_string_index + 4 * (n_strings + 1)
+            and off_string_data <= off_channels and off_channels % 4 == 0
+            and off_programs == off_channels + 4 * CHANNEL_FIELDS * n_channels
+            and off_programs + 4 * PROGRAM_FIELDS * n_programs <= len(self._mmap)
+        )
+        if not sections_ok:
+            self.close()
+            raise SnapshotError(f"Instantánea corrupta (cabecera inconsistente): {path}")
+
+        self._string_cache = {}
+        self.pool = None            # StringPool opcional donde internar los textos decodificados
+        self._channel_pos = {}
+        try:
+            buf = self._buf = memoryview(self._mmap)
+            self._string_index = buf[off_string_index:off_string_data].cast("I")
+            self._string_data_off = off_string_data
+            if self._string_index[-1] > off_channels - off_string_data:
+                raise ValueError("tabla de textos fuera de rango")
+            self._channels = buf[off_channels:off_programs].cast("i")
+            self._programs = buf[off_programs:off_programs + 4 * PROGRAM_FIELDS * n_programs].cast("i")
+            for pos in range(n_channels):
+                self._channel_pos[self.string(self._channels[pos * CHANNEL_FIELDS])] = pos
+        except (ValueError, TypeError, IndexError) as e:
+            self.close()
+            raise SnapshotError(f"Instantánea corrupta: {path}: {e}") from e
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Libera el mapeo de memoria"""
+        for attr in ("_string_index", "_channels", "_programs", "_buf"):
+            view = self.__dict__.pop(attr, None)
+            if view is not None:
+                view.release()
+        if getattr(self, "_mmap", None) is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def string(self, idx):
+        """Decodifica (con caché) la cadena internada idx"""
+        text = self._string_cache.get(idx)
+        if text is None:
+            try:
+                if idx < 0:
+                    raise IndexError(idx)
+                start = self._string_data_off + self._string_index[idx]
+                end = self._string_data_off + self._string_index[idx + 1]
+                text = str(self._buf[start:end], "utf-8")
+            except (IndexError, ValueError) as e:
+                raise SnapshotError(f"Instantánea corrupta: {self.path}: texto {idx} inválido ({e})") from e
+            if self.pool is not None:
+                text = self.pool.intern(text)
+            self._string_cache[idx] = text
+        return text
+
+    def channel_ids(self):
+        return list(self._channel_pos)
+
+    def channel(self, channel_id):
+        """Datos del canal como diccionario"""
+        base = self._channel_pos[channel_id] * CHANNEL_FIELDS
+        return {
+            "id": channel_id,
+            "nombre": self.string(self._channels[base + 1]),
+            "logo": self.string(self._channels[base + 2])
+        }
+
+    def _span(self, channel_id):
+        pos = self._channel_pos.get(channel_id)
+        if pos is None:
+            return 0, 0
+        base = pos * CHANNEL_FIELDS
+        first, count = self._channels[base + 3], self._channels[base + 4]
+        if first < 0 or count < 0 or first + count > len(self._programs) // PROGRAM_FIELDS:
+            raise SnapshotError(f"Instantánea corrupta: {self.path}: programas de '{channel_id}' fuera de rango")
+        return first, count
+
+    def _program(self, row, channel_id):
+        base = row * PROGRAM_FIELDS
+        p = self._programs
+        try:
+            start, stop = epoch_to_xmltv(p[base]), epoch_to_xmltv(p[base + 1])
+        except (IndexError, ValueError, OverflowError, OSError) as e:
+            raise SnapshotError(f"Instantánea corrupta: {self.path}: programa {row} inválido ({e})") from e
+        return {
+            "channel_id": channel_id,
+            "start": start,
+            "stop": stop,
+            "title": self.string(p[base + 2]),
+            "description": self.string(p[base + 3]),
+            "image": self.string(p[base + 4])
+        }
+
+    def programs(self, channel_id):
+        """Programas de un canal ordenados por inicio"""
+        first, count = self._span(channel_id)
+        return [self._program(row, channel_id) for row in range(first, first + count)]
+
+    def program_count(self, channel_id=None):
+        if channel_id is None:
+            return len(self._programs) // PROGRAM_FIELDS
+        return self._span(channel_id)[1]
+
+    def window(self, channel_id, start, end):
+        """Programas de un canal que empiezan en [start, end) (epoch), sin recorrer la tabla"""
+        first, count = self._span(channel_id)
+        starts = _Column(self._programs, first, count, 0)
+        lo, hi = bisect_left(starts, start), bisect_left(starts, end)
+        return [self._program(first + i, channel_id) for i in range(lo, hi)]
+
+    def at(self, channel_id, moment):
+        """Programa en emisión en el instante 'moment' (epoch) o None"""
+        first, count = self._span(channel_id)
+        idx = bisect_right(_Column(self._programs, first, count, 0), moment) - 1
+        if idx >= 0 and self._programs[(first + idx) * PROGRAM_FIELDS + 1] > moment:
+            return self._program(first + idx, channel_id)
+        return None
+
+    def to_store(self):
+        """Deserializa la instantánea completa en un ProgramStore"""
+        from Guide.program_store import ProgramStore
+
+        store = ProgramStore()
+        # La tabla de cadenas ya está deduplicada: cada índice se decodifica una vez
+        # y todos los programas comparten la instancia internada en el pool del almacén
+        self.pool = store.pool
+        self._string_cache = {idx: store.pool.intern(text) for idx, text in self._string_cache.items()}
+        for channel_id in self._channel_pos:
+            store.add_channel(self.channel(channel_id))
+            store.programs[channel_id] = self.programs(channel_id)
+        return store
+
+def describe_snapshot(path, channel_id=None):
+    """Imprime un resumen de la instantánea (reemplaza los volcados *_raw.json)"""
+    with Snapshot(path) as snap:
+        print(f"{path}: {len(snap.channel_ids())} canales, {snap.program_count()} programas")
+        for cid in [channel_id] if channel_id else snap.channel_ids():
+            print(f"  {cid}: {snap.program_count(cid)} programas")
+            if channel_id:
+                for prog in snap.programs(cid):
+                    print(f"    {prog['start']} - {prog['stop']}  {prog['title']}")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python -m Guide.snapshot <instantánea> [channel_id]")
+        sys.exit(1)
+    describe_snapshot(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,78 @@
+import sys
+import threading
+
+class StringPool:
+    """
+    Pool de internado de textos (títulos, descripciones, imágenes).
+
+    Cada texto distinto se guarda una sola vez: intern() devuelve siempre la misma
+    instancia para textos iguales, de modo que las copias creadas por cada fila
+    scrapeada se liberan enseguida. Lleva la cuenta de los bytes ahorrados.
+    Es seguro entre hilos: con el motor async lo usan a la vez los hilos de
+    parseo de cada scraper y el event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._strings = {}
+        self._repeats = {}      # texto -> veces que se reutilizó (solo los repetidos)
+        self.lookups = 0
+        self.bytes_unique = 0
+        self.bytes_saved = 0
+
+    def __len__(self):
+        return len(self._strings)
+
+    def intern(self, text):
+        """Devuelve la instancia compartida del texto (los vacíos no se internan)"""
+        if not text:
+            return text
+        with self._lock:
+            self.lookups += 1
+            shared = self._strings.get(text)
+            if shared is None:
+                self._strings[text] = text
+                self.bytes_unique += sys.getsizeof(text)
+                return text
+            if shared is text:
+                # Ya internado (p. ej. el scraper lo internó y ahora lo guarda el almacén): no es una repetición
+                return shared
+            self.bytes_saved += sys.getsizeof(text)
+            self._repeats[shared] = self._repeats.get(shared, 0) + 1
+            return shared
+
+    def shared(self, text):
+        """Instancia compartida del texto si ya está en el pool, sin añadirlo"""
+        if not text:
+            return text
+        return self._strings.get(text, text)
+
+    def release(self, texts):
+        """
+        Saca del pool los textos indicados (p. ej. los de canales volcados a disco
+        que ningún canal en memoria usa), para que se liberen.
+        Devuelve cuántos textos salieron del pool.
+        """
+        released = 0
+        with self._lock:
+            for text in texts:
+                if not text or text not in self._strings:
+                    continue
+                del self._strings[text]
+                self._repeats.pop(text, None)
+                released += 1
+        return released
+
+    def is_repeated(self, text):
+        """Indica si el texto aparece más de una vez en la guía"""
+        return text in self._repeats
+
+    def report(self):
+        """Resumen de memoria para las estadísticas de la ejecución"""
+        return {
+            "unique": len(self._strings),
+            "repeated": len(self._repeats),
+            "lookups": self.lookups,
+            "bytes_unique": self.bytes_unique,
+            "bytes_saved": self.bytes_saved
+        }
@@ -0,0 +1,253 @@
+import calendar
+import io
+import logging
+import time
+from functools import lru_cache
+
+def escapar_xml(texto):
+    """Escapa caracteres especiales para que el XML sea válido."""
+    if not texto:
+        return ""
+    return (
+        texto.replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+        .replace('"', "&quot;")
+        .replace("'", "&apos;")
+    )
+
+def validate_program_data(programa):
+    """Valida que un programa tenga los campos requeridos y formatos correctos"""
+    required_fields = ['title', 'start', 'stop', 'channel_id']
+    
+    # Validar campos requeridos
+    for field in required_fields:
+        if not programa.get(field):
+            return False, f"Campo requerido '{field}' faltante o vacío"
+    
+    # Validar longitud máxima de título y descripción
+    if len(programa['title']) > 200:
+        programa['title'] = programa['title'][:197] + "..."
+    
+    if programa.get('description') and len(programa['description']) > 500:
+        programa['description'] = programa['description'][:497] + "..."
+    
+    # Validar formato de fechas (con enteros, sin strptime)
+    for field in ('start', 'stop'):
+        if parse_xmltv_digits(programa[field]) is None:
+            return False, f"Formato de fecha inválido: '{programa[field]}'"
+    
+    return True, "OK"
+
+def chunk_programs(programs, chunk_size=1000):
+    """Procesa los programas en chunks para mejor manejo de memoria"""
+    for i in range(0, len(programs), chunk_size):
+        yield programs[i:i + chunk_size]
+
+XMLTV_HEADER = b'<?xml version="1.0" encoding="UTF-8"?>\n<tv generator-info-name="JhonVT-EPG-Generator">\n'
+XMLTV_FOOTER = b'</tv>'
+WRITE_BUFFER_SIZE = 256 * 1024  # Bytes acumulados antes de escribir en el flujo
+ESCAPE_CACHE_LIMIT = 65536      # Entradas máximas del caché de textos escapados
+
+class XMLTVWriter:
+    """
+    Serializa canales y programas XMLTV como bytes UTF-8 sobre un flujo binario.
+
+    Los textos que se repiten (canales, títulos de series, imágenes) se escapan y
+    codifican una sola vez; los bytes se acumulan en un buffer y se vuelcan al
+    flujo (archivo, gzip, BytesIO) en bloques de WRITE_BUFFER_SIZE. Con un
+    StringPool, las descripciones que el pool sabe repetidas también se cachean.
+    icon_map (opcional) reescribe las URLs de los iconos (ver Guide/assets.py);
+    una URL mapeada a "" omite el icono.
+    """
+
+    def __init__(self, stream, buffer_size=WRITE_BUFFER_SIZE, pool=None, icon_map=None):
+        self.stream = stream
+        self.pool = pool
+        self.icon_map = icon_map
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        self.bytes_written = 0
+        self.valid_programs = 0
+        self.invalid_programs = 0
+        self._escaped = {}
+        self._channel_attrs = {}
+        self._icons = {}
+
+    def escaped(self, texto):
+        """Devuelve el texto escapado y codificado, reutilizando el caché"""
+        cached = self._escaped.get(texto)
+        if cached is None:
+            cached = escapar_xml(texto).encode("utf-8")
+            if len(self._escaped) >= ESCAPE_CACHE_LIMIT:
+                self._escaped.clear()
+            self._escaped[texto] = cached
+        return cached
+
+    def _icon(self, url):
+        """Elemento <icon> ya codificado para una URL (b"" si se omite)"""
+        icon = self._icons.get(url)
+        if icon is None:
+            src = self.icon_map.get(url, url) if self.icon_map else url
+            icon = b'    <icon src="' + self.escaped(src) + b'"/>\n' if src else b""
+            if len(self._icons) >= ESCAPE_CACHE_LIMIT:
+                self._icons.clear()
+            self._icons[url] = icon
+        return icon
+
+    def _channel_attr(self, channel_id):
+        """Fragmento fijo entre 'stop' y el título de los programas de un canal"""
+        attr = self._channel_attrs.get(channel_id)
+        if attr is None:
+            attr = b'" channel="' + self.escaped(channel_id) + b'">\n    <title lang="es">'
+            self._channel_attrs[channel_id] = attr
+        return attr
+
+    def _maybe_flush(self):
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.stream.write(self.buffer)
+            self.bytes_written += len(self.buffer)
+            self.buffer = bytearray()
+
+    def write_header(self):
+        self.buffer += XMLTV_HEADER
+
+    def write_channel(self, ch):
+        buf = self.buffer
+        buf += b'  <channel id="'
+        buf += self.escaped(ch["id"])
+        buf += b'">\n    <display-name>'
+        buf += self.escaped(ch["nombre"])
+        buf += b'</display-name>\n'
+        if ch.get("logo"):
+            buf += self._icon(ch["logo"])
+        buf += b'  </channel>\n'
+        self._maybe_flush()
+
+    def write_programs(self, programs):
+        """Valida y serializa programas; devuelve cuántos se escribieron"""
+        # Bucle caliente: atributos y métodos en variables locales
+        escaped = self.escaped
+        icon = self._icon
+        channel_attr = self._channel_attr
+        buffer_size = self.buffer_size
+        is_repeated = self.pool.is_repeated if self.pool is not None else None
+        written = 0
+        for programa in programs:
+            is_valid, error_msg = validate_program_data(programa)
+            if not is_valid:
+                logging.warning("Programa inválido: %s", error_msg)
+                self.invalid_programs += 1
+                continue
+
+            buf = self.buffer
+            buf += b'  <programme start="'
+            buf += programa["start"].encode("utf-8")
+            buf += b'" stop="'
+            buf += programa["stop"].encode("utf-8")
+            buf += channel_attr(programa["channel_id"])
+            buf += escaped(programa["title"])
+            buf += b'</title>\n'
+            description = programa.get("description")
+            if description:
+                # Solo las descripciones repetidas pasan por el caché
+                buf += b'    <desc lang="es">'
+                if is_repeated is not None and is_repeated(description):
+                    buf += escaped(description)
+                else:
+                    buf += escapar_xml(description).encode("utf-8")
+                buf += b'</desc>\n'
+            image = programa.get("image")
+            if image:
+                buf += icon(image)
+            buf += b'  </programme>\n'
+            written += 1
+            if len(buf) >= buffer_size:
+                self.flush()
+
+        self.valid_programs += written
+        return written
+
+    def write_program(self, programa):
+        """Valida y serializa un programa; devuelve False si se descartó"""
+        return self.write_programs((programa,)) == 1
+
+    def write_footer(self):
+        self.buffer += XMLTV_FOOTER
+        self.flush()
+
+def write_xmltv(stream, channels, all_programs, pool=None, icon_map=None):
+    """
+    Escribe una guía XMLTV completa en un flujo binario.
+    pool: StringPool del almacén (opcional) para reutilizar descripciones repetidas.
+    icon_map: URL remota -> URL local de los iconos (opcional, ver Guide/assets.py).
+    Devuelve el XMLTVWriter usado (bytes escritos y programas válidos/inválidos).
+    """
+    writer = XMLTVWriter(stream, pool=pool, icon_map=icon_map)
+    writer.write_header()
+    for ch in channels:
+        writer.write_channel(ch)
+    writer.write_programs(all_programs)
+    writer.write_footer()
+
+    logging.info("Programas procesados - Válidos: %s, "
+                 "Inválidos: %s",
+                 writer.valid_programs, writer.invalid_programs)
+    return writer
+
+def generate_xml_structure(channels, all_programs):
+    """Genera la estructura XML del EPG como texto (ver write_xmltv para escribir a disco)"""
+    buffer = io.BytesIO()
+    write_xmltv(buffer, channels, all_programs)
+    return buffer.getvalue().decode("utf-8")
+
+DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+# Las mismas marcas de tiempo se repiten en muchos canales (horarios en punto y
+# media hora) y cada 'stop' es el 'start' del siguiente programa
+@lru_cache(maxsize=16384)
+def parse_xmltv_digits(value):
+    """
+    Valida la parte 'YYYYMMDDHHMMSS' de una marca XMLTV usando solo enteros.
+    Devuelve (año, mes, día, hora, minuto, segundo) o None si no es válida.
+    """
+    digits = value[:14]
+    if len(digits) != 14 or not digits.isdigit():
+        return None
+    year, month, day = int(digits[:4]), int(digits[4:6]), int(digits[6:8])
+    hour, minute, second = int(digits[8:10]), int(digits[10:12]), int(digits[12:14])
+    if not 1 <= month <= 12 or hour > 23 or minute > 59 or second > 61:
+        return None
+    max_day = DAYS_IN_MONTH[month - 1]
+    if month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
+        max_day = 29
+    if not 1 <= day <= max_day:
+        return None
+    return year, month, day, hour, minute, second
+
+def xmltv_to_epoch(value):
+    """
+    Convierte una marca XMLTV ('YYYYMMDDHHMMSS' con desplazamiento opcional ' +HHMM')
+    a segundos desde epoch. Sin desplazamiento se interpreta como UTC.
+    """
+    parts = parse_xmltv_digits(value)
+    if parts is None:
+        raise ValueError(f"Marca XMLTV inválida: '{value}'")
+    seconds = calendar.timegm(parts)
+    offset = value[14:].strip()
+    if len(offset) == 5 and offset[0] in "+-" and offset[1:].isdigit():
+        sign = 1 if offset[0] == "+" else -1
+        seconds -= sign * (int(offset[1:3]) * 3600 + int(offset[3:5]) * 60)
+    return seconds
+
+def epoch_to_xmltv(seconds):
+    """Convierte segundos desde epoch a la marca XMLTV 'YYYYMMDDHHMMSS' (UTC)"""
+    return time.strftime("%Y%m%d%H%M%S", time.gmtime(seconds))
+
+def shift_xmltv(value, seconds):
+    """Desplaza una marca XMLTV 'seconds' segundos (devuelve 'YYYYMMDDHHMMSS' sin desplazamiento)"""
+    return epoch_to_xmltv(xmltv_to_epoch(value) + seconds)
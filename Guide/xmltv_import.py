@@ -0,0 +1,122 @@
+import gzip
+import logging
+import os
+
+from lxml import etree
+
+from Guide.xmltv import xmltv_to_epoch, epoch_to_xmltv
+
+BATCH_SIZE = 500  # Programas acumulados por canal antes de volcarlos al almacén
+
+def _open_guide(path):
+    """Abre una guía XMLTV, comprimida con gzip o no"""
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+def normalize_xmltv_time(value, offset_hours=0):
+    """
+    Normaliza una marca XMLTV a la convención del almacén ('YYYYMMDDHHMMSS' sin
+    desplazamiento, hora local). Las marcas con desplazamiento se convierten a la
+    hora local de offset_hours (horas al oeste de UTC, como timezone_offset_hours).
+    """
+    value = (value or "").strip()
+    if len(value) < 12 or not value[:12].isdigit():
+        raise ValueError(f"Marca de tiempo XMLTV inválida: '{value}'")
+    digits = value[:14].ljust(14, "0")
+    if value[14:].strip():
+        return epoch_to_xmltv(xmltv_to_epoch(digits + value[14:]) - int(offset_hours * 3600))
+    return digits
+
+def _text(elem, tag):
+    child = elem.find(tag)
+    return (child.text or "").strip() if child is not None else ""
+
+def _icon(elem):
+    icon = elem.find("icon")
+    return icon.get("src", "") if icon is not None else ""
+
+def iter_xmltv(path):
+    """
+    Recorre una guía XMLTV en streaming y produce ('channel', dict) y ('programme', dict).
+    Cada elemento se libera tras procesarse, por lo que la memoria no crece con el archivo.
+    """
+    with _open_guide(path) as source:
+        context = etree.iterparse(source, events=("end",), tag=("channel", "programme"),
+                                  huge_tree=True, recover=True)
+        for _, elem in context:
+            if elem.tag == "channel":
+                yield "channel", {
+                    "id": elem.get("id", ""),
+                    "nombre": _text(elem, "display-name") or elem.get("id", ""),
+                    "logo": _icon(elem)
+                }
+            else:
+                yield "programme", {
+                    "channel_id": elem.get("channel", ""),
+                    "start": elem.get("start", ""),
+                    "stop": elem.get("stop", ""),
+                    "title": _text(elem, "title"),
+                    "description": _text(elem, "desc"),
+                    "image": _icon(elem)
+                }
+
+            # Liberar el elemento y los hermanos ya procesados
+            elem.clear()
+            parent = elem.getparent()
+            if parent is not None:
+                while elem.getprevious() is not None:
+                    del parent[0]
+        del context
+
+def import_xmltv(path, store, channel_ids=None, offset_hours=0):
+    """
+    Carga una guía XMLTV (propia o de terceros) en el almacén de programas.
+    channel_ids: si se indica, solo se importan esos canales.
+    offset_hours: zona local (horas al oeste de UTC) a la que se llevan las marcas con desplazamiento.
+    Devuelve un diccionario con estadísticas de la importación.
+    """
+    if not os.path.exists(path):
+        logging.warning("[XMLTV] Guía no encontrada: %s", path)
+        return {"channels": 0, "programs": 0, "invalid": 0}
+
+    wanted = set(channel_ids) if channel_ids is not None else None
+    pending = {}
+    stats = {"channels": 0, "programs": 0, "invalid": 0}
+
+    def flush(channel_id):
+        store.add_programs(channel_id, pending.pop(channel_id))
+
+    for kind, data in iter_xmltv(path):
+        channel_id = data["id"] if kind == "channel" else data["channel_id"]
+        if not channel_id or (wanted is not None and channel_id not in wanted):
+            continue
+
+        if kind == "channel":
+            store.add_channel(data)
+            stats["channels"] += 1
+            continue
+
+        try:
+            data["start"] = normalize_xmltv_time(data["start"], offset_hours)
+            data["stop"] = normalize_xmltv_time(data["stop"], offset_hours)
+        except ValueError as e:
+            logging.debug("[XMLTV] Programa descartado en '%s': %s", channel_id, e)
+            stats["invalid"] += 1
+            continue
+
+        batch = pending.setdefault(channel_id, [])
+        batch.append(data)
+        stats["programs"] += 1
+        if len(batch) >= BATCH_SIZE:
+            flush(channel_id)
+
+    for channel_id in list(pending):
+        flush(channel_id)
+
+    logging.info("[XMLTV] Importado %s: %s canales, "
+                 "%s programas (%s inválidos)",
+                 path, stats['channels'], stats['programs'], stats['invalid'])
+    return stats
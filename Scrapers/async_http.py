@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import aiohttp
+except ImportError:  # Dependencia opcional: solo la necesita el motor async
+    aiohttp = None
+
+# Mismos reintentos que las sesiones de requests (Retry total=3, backoff 0.5)
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUS = {500, 502, 503, 504}
+DEFAULT_MAX_CONNECTIONS = 64
+
+class AsyncFetchError(Exception):
+    """Error de red o HTTP al descargar una página con el motor async"""
+
+def async_available():
+    """Indica si el motor async puede usarse (aiohttp instalado)"""
+    return aiohttp is not None
+
+def parse_executor():
+    """
+    Hilo de parseo de un scraper: el parseo (CPU) sale del event loop para no
+    frenar las demás descargas. Un solo hilo por scraper mantiene sus páginas
+    en orden y sin carreras en sus planes de selectores. El pool de textos es
+    compartido por todos los scrapers y el almacén, así que se protege con su
+    propio cerrojo (ver Guide/string_pool.py).
+    """
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="parse")
+
+async def run_parser(executor, func, *args):
+    """Ejecuta func(*args) en el hilo de parseo y espera su resultado"""
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+def create_session(headers=None, max_connections=DEFAULT_MAX_CONNECTIONS):
+    """
+    Crea una sesión aiohttp compartida por todos los scrapers.
+    Las conexiones se reutilizan (keep-alive) y se limitan a max_connections.
+    """
+    if aiohttp is None:
+        raise RuntimeError("El motor async requiere 'aiohttp' (pip install aiohttp)")
+    connector = aiohttp.TCPConnector(limit=max_connections, ttl_dns_cache=300)
+    return aiohttp.ClientSession(connector=connector, headers=headers)
+
+async def fetch_text(session, url, headers=None, timeout=15):
+    """
+    Descarga una página como texto con reintentos y backoff exponencial.
+    Lanza AsyncFetchError si la descarga falla definitivamente.
+    """
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    for attempt in range(RETRY_TOTAL + 1):
+        try:
+            async with session.get(url, headers=headers, timeout=client_timeout) as response:
+                if response.status in RETRY_STATUS and attempt < RETRY_TOTAL:
+                    logging.debug("[Async] HTTP %s en %s, reintento %d", response.status, url, attempt + 1)
+                else:
+                    response.raise_for_status()
+                    return await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt >= RETRY_TOTAL or (isinstance(e, aiohttp.ClientResponseError)
+                                          and e.status not in RETRY_STATUS):
+                raise AsyncFetchError(str(e)) from e
+        await asyncio.sleep(RETRY_BACKOFF * (2 ** attempt))
+    raise AsyncFetchError("reintentos agotados")
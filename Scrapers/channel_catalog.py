@@ -0,0 +1,272 @@
+"""
+Catálogo de canales con búsqueda difusa.
+
+Indexa por trigramas el nombre, el site_id y el país de los canales descubiertos
+(discover_gatotv_channels, discover_mitv_channels o el volcado channel_list.txt),
+de modo que buscar "azteca uno" o "canal 6 costa rica" es instantáneo aunque el
+texto tenga errores o falten acentos. También detecta casi-duplicados, como las
+variantes con desfase horario ("Azteca Uno -1 h") de un mismo canal.
+
+Uso:
+    python -m Scrapers.channel_catalog build [channel_list.txt]
+    python -m Scrapers.channel_catalog search "azteca uno"
+"""
+import json
+import logging
+import os
+import re
+import sys
+import unicodedata
+
+CATALOG_FILE = "channel_catalog.json"
+CATALOG_VERSION = 1
+MIN_SCORE = 0.3
+DUPLICATE_SCORE = 0.75
+
+# Países que aparecen en nombres y site_id de GatoTV / Mi.TV
+COUNTRIES = {
+    "argentina": "ar", "bolivia": "bo", "chile": "cl", "colombia": "co", "costa rica": "cr",
+    "cuba": "cu", "ecuador": "ec", "el salvador": "sv", "espana": "es", "estados unidos": "us",
+    "guatemala": "gt", "guate": "gt", "honduras": "hn", "mexico": "mx", "nicaragua": "ni",
+    "panama": "pa", "paraguay": "py", "peru": "pe", "puerto rico": "pr",
+    "republica dominicana": "do", "uruguay": "uy", "venezuela": "ve"
+}
+
+# "Azteca Uno -1 h", "Canal 5 +2h", "HBO -1 hora"
+TIMESHIFT_RE = re.compile(r"\s*([+-])\s*(\d{1,2})\s*h(?:oras?)?\.?\s*$", re.IGNORECASE)
+# Sufijos que no cambian el canal
+VARIANT_RE = re.compile(r"\b(hd|sd|fhd|uhd|4k)\b")
+NUMBER_RE = re.compile(r"\d+")
+CHANNEL_LIST_RE = re.compile(r"^\s*\d+\.\s+(?P<nombre>.+?)\s+\(ID:\s*(?P<id>[^)]+)\)\s*$")
+
+def normalize(text):
+    """Minúsculas, sin acentos y solo letras/dígitos separados por un espacio"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+def split_timeshift(name):
+    """Separa el desfase horario de un nombre: 'Azteca Uno -1 h' -> ('Azteca Uno', -1)"""
+    match = TIMESHIFT_RE.search(name or "")
+    if not match:
+        return name, 0
+    hours = int(match.group(2))
+    return name[:match.start()], -hours if match.group(1) == "-" else hours
+
+def base_name(name):
+    """Nombre normalizado sin desfase horario ni sufijos de calidad (HD, SD...)"""
+    return " ".join(VARIANT_RE.sub(" ", normalize(split_timeshift(name)[0])).split())
+
+def trigrams(text):
+    """Trigramas de un texto normalizado (con relleno para pesar los inicios de palabra)"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def guess_country(channel):
+    """Código de país del canal a partir de 'country', del nombre o del site_id"""
+    if channel.get("country"):
+        return channel["country"]
+    text = f" {normalize(channel.get('nombre'))} {normalize(channel.get('site_id', '').replace('_', ' '))} "
+    for name, code in COUNTRIES.items():
+        if f" {name} " in text:
+            return code
+    return ""
+
+class ChannelCatalog:
+    """Catálogo persistente de canales con índice de trigramas"""
+
+    def __init__(self, channels=()):
+        self.channels = []
+        self._keys = {}        # (scraper, site_id o id) -> posición
+        self._grams = []       # posición -> trigramas del canal
+        self._bases = []       # posición -> (nombre base, trigramas del nombre base)
+        self._postings = {}    # trigrama -> posiciones
+        for channel in channels:
+            self.add(channel)
+
+    def __len__(self):
+        return len(self.channels)
+
+    @staticmethod
+    def _key(channel):
+        return channel.get("scraper", ""), channel.get("site_id") or channel.get("id")
+
+    @staticmethod
+    def _search_text(channel):
+        site_id = (channel.get("site_id") or channel.get("id", "")).replace("_", " ").replace("-", " ")
+        return normalize(f"{channel.get('nombre', '')} {site_id} {channel.get('country', '')}")
+
+    def add(self, channel):
+        """Añade (o actualiza) un canal; devuelve True si era nuevo"""
+        entry = dict(channel)
+        entry["country"] = guess_country(entry)
+        key = self._key(entry)
+        pos = self._keys.get(key)
+        if pos is not None:
+            self.channels[pos].update(entry)
+            return False
+
+        pos = self._keys[key] = len(self.channels)
+        self.channels.append(entry)
+        grams = trigrams(self._search_text(entry))
+        self._grams.append(grams)
+        base = base_name(entry.get("nombre", ""))
+        self._bases.append((base, trigrams(base)))
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(pos)
+        return True
+
+    def search(self, query, limit=10, min_score=MIN_SCORE):
+        """
+        Búsqueda difusa por nombre, site_id o país.
+        Devuelve [(puntuación, canal)] ordenado de mayor a menor puntuación.
+        """
+        text = normalize(query)
+        if not text:
+            return []
+        query_grams = trigrams(text)
+
+        # Solo se puntúan los canales que comparten algún trigrama con la consulta
+        shared = {}
+        for gram in query_grams:
+            for pos in self._postings.get(gram, ()):
+                shared[pos] = shared.get(pos, 0) + 1
+
+        results = []
+        for pos, count in shared.items():
+            # Proporción de la consulta encontrada, con una penalización suave por longitud
+            score = count / len(query_grams) * (0.75 + 0.25 * count / len(self._grams[pos]))
+            if score >= min_score:
+                results.append((round(score, 3), self.channels[pos]))
+        results.sort(key=lambda item: -item[0])
+        return results[:limit]
+
+    def near_duplicates(self, channel, threshold=DUPLICATE_SCORE, candidates=None):
+        """
+        Canales que probablemente son el mismo que 'channel': mismo nombre base
+        (sin desfase horario ni HD/SD) o nombres muy parecidos.
+        candidates: lista donde buscar (por defecto el catálogo completo).
+        """
+        base = base_name(channel.get("nombre", ""))
+        grams = trigrams(base)
+        own_key = self._key(channel)
+        if candidates is None:
+            # Solo los canales que comparten algún trigrama con el nombre base
+            positions = sorted({pos for gram in grams for pos in self._postings.get(gram, ())})
+            candidates = [(self.channels[pos], *self._bases[pos]) for pos in positions]
+        else:
+            candidates = [(other, base_name(other.get("nombre", ""))) for other in candidates]
+            candidates = [(other, other_base, trigrams(other_base)) for other, other_base in candidates]
+
+        # "2 de México" y "22 de México" se parecen pero son canales distintos
+        numbers = NUMBER_RE.findall(base)
+        found = []
+        for other, other_base, other_grams in candidates:
+            if self._key(other) == own_key:
+                continue
+            if other_base == base or (NUMBER_RE.findall(other_base) == numbers and
+                                      len(grams & other_grams) / len(grams | other_grams) >= threshold):
+                found.append(other)
+        return found
+
+    def save(self, path=CATALOG_FILE):
+        """Guarda el catálogo (el índice se reconstruye al cargar en milisegundos)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CATALOG_VERSION, "channels": self.channels}, f, indent=1, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logging.info("[Catálogo] Guardado %s (%s canales)", path, len(self.channels))
+
+    @classmethod
+    def load(cls, path=CATALOG_FILE):
+        """Carga un catálogo guardado; si no existe devuelve uno vacío"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        if data.get("version") != CATALOG_VERSION:
+            logging.warning("[Catálogo] Versión desconocida en %s; se ignora", path)
+            return cls()
+        return cls(data.get("channels", []))
+
+def as_derived_channels(channels, existing=()):
+    """
+    Convierte las variantes con desfase horario ("Azteca Uno -1 h") en canales
+    derivados de su canal base cuando este también está disponible, para no
+    descargar la misma programación varias veces. Una señal "-1 h" (zona una hora
+    por detrás) emite cada programa una hora más tarde: offset_hours = 1.
+    """
+    bases = {}
+    for channel in list(existing) + list(channels):
+        name = channel.get("nombre", "")
+        if not channel.get("derived_from") and split_timeshift(name)[1] == 0:
+            bases.setdefault(base_name(name), channel["id"])
+
+    result = []
+    for channel in channels:
+        offset = split_timeshift(channel.get("nombre", ""))[1]
+        base_id = bases.get(base_name(channel.get("nombre", ""))) if offset else None
+        if base_id:
+            result.append({
+                "id": channel["id"],
+                "nombre": channel["nombre"],
+                "logo": channel.get("logo", ""),
+                "derived_from": base_id,
+                "offset_hours": -offset
+            })
+        else:
+            result.append(channel)
+    return result
+
+def parse_channel_list(path):
+    """Lee el volcado de list_available_channels() (channel_list.txt) como canales GatoTV"""
+    channels = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            match = CHANNEL_LIST_RE.match(line)
+            if not match:
+                continue
+            channel_id = match.group("id").strip()
+            site_id = channel_id.rsplit(".", 1)[0]
+            channels.append({
+                "id": channel_id,
+                "nombre": match.group("nombre").strip(),
+                "site_id": site_id,
+                "scraper": "gatotv",
+                "url": f"https://www.gatotv.com/canal/{site_id}"
+            })
+    return channels
+
+def build_catalog(channel_list=None, path=CATALOG_FILE):
+    """
+    Construye y guarda el catálogo: desde el descubrimiento en línea o, si se
+    indica, desde un volcado channel_list.txt.
+    """
+    from Scrapers.channel_discovery import discover_gatotv_channels, discover_mitv_channels
+
+    catalog = ChannelCatalog.load(path)
+    if channel_list:
+        channels = parse_channel_list(channel_list)
+    else:
+        channels = discover_gatotv_channels() + discover_mitv_channels()
+    added = sum(catalog.add(channel) for channel in channels)
+    catalog.save(path)
+    logging.info("[Catálogo] %s canales nuevos, %s en total", added, len(catalog))
+    return catalog
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        build_catalog(sys.argv[2] if len(sys.argv) > 2 else None)
+    elif len(sys.argv) > 2 and sys.argv[1] == "search":
+        catalog = ChannelCatalog.load()
+        for score, channel in catalog.search(" ".join(sys.argv[2:])):
+            duplicates = catalog.near_duplicates(channel)
+            extra = f"  ~ {', '.join(d['nombre'] for d in duplicates)}" if duplicates else ""
+            print(f"{score:.2f}  {channel['nombre']} (ID: {channel['id']}, {channel['scraper']}){extra}")
+    else:
+        print("Uso:")
+        print("  python -m Scrapers.channel_catalog build [channel_list.txt]  - Construir el catálogo")
+        print("  python -m Scrapers.channel_catalog search <texto>            - Buscar canales")
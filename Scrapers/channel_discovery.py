@@ -3,6 +3,7 @@ from bs4 import BeautifulSoup
 from urllib.parse import urlparse, urljoin
 import logging
 import json
+from Scrapers.channel_catalog import ChannelCatalog, as_derived_channels
 
 def discover_gatotv_channels():
     """
@@ -92,20 +93,20 @@ def discover_gatotv_channels():
                                 }
                                 
                                 channels.append(channel_data)
-                                logging.info(f"[GatoTV] Canal encontrado: {name} ({site_id})")
+                                logging.info("[GatoTV] Canal encontrado: %s (%s)", name, site_id)
                         
             except Exception as e:
-                logging.debug(f"[GatoTV] Error procesando fila de canal: {e}")
+                logging.debug("[GatoTV] Error procesando fila de canal: %s", e)
                 continue
         
         # Filtrar canales con nombres muy cortos o inválidos
         channels = [ch for ch in channels if len(ch['nombre']) > 2 and not ch['nombre'].isdigit()]
         
-        logging.info(f"[GatoTV] Descubrimiento completado: {len(channels)} canales encontrados")
+        logging.info("[GatoTV] Descubrimiento completado: %s canales encontrados", len(channels))
         return channels
         
     except Exception as e:
-        logging.error(f"[GatoTV] Error en descubrimiento de canales: {e}")
+        logging.error("[GatoTV] Error en descubrimiento de canales: %s", e)
         return []
 
 def extract_logo_url(row):
@@ -123,7 +124,7 @@ def extract_logo_url(row):
                     src = f"https://www.gatotv.com/{src}"
                 return src
     except Exception as e:
-        logging.debug(f"[GatoTV] Error extrayendo logo: {e}")
+        logging.debug("[GatoTV] Error extrayendo logo: %s", e)
     return ""
 
 def discover_mitv_channels():
@@ -151,7 +152,7 @@ def discover_mitv_channels():
         }
     ]
     
-    logging.info(f"[Mi.TV] {len(known_channels)} canales conocidos disponibles")
+    logging.info("[Mi.TV] %s canales conocidos disponibles", len(known_channels))
     return known_channels
 
 def update_config_with_discovered_channels(config_file='config.json'):
@@ -170,10 +171,32 @@ def update_config_with_discovered_channels(config_file='config.json'):
         all_discovered = gatotv_channels + mitv_channels
         
         if all_discovered:
+            # Persistir el catálogo buscable (python -m Scrapers.channel_catalog search ...)
+            catalog = ChannelCatalog.load()
+            for ch in all_discovered:
+                catalog.add(ch)
+            catalog.save()
+            
             # Combinar con canales existentes (evitar duplicados por ID)
-            existing_ids = {ch.get('id') for ch in config.get('channels', [])}
+            existing = config.get('channels', [])
+            existing_ids = {ch.get('id') for ch in existing}
             new_channels = [ch for ch in all_discovered if ch['id'] not in existing_ids]
             
+            # Las variantes con desfase horario se derivan de su canal base (sin descargas)
+            new_channels = as_derived_channels(new_channels, existing)
+            derived = sum(1 for ch in new_channels if ch.get('derived_from'))
+            if derived:
+                logging.info("%s canales con desfase horario se generarán a partir de su canal base", derived)
+            
+            # Avisar de casi-duplicados (p. ej. variantes "-1 h" de un canal ya configurado)
+            for ch in new_channels:
+                if ch.get('derived_from'):
+                    continue
+                duplicates = catalog.near_duplicates(ch, candidates=existing)
+                if duplicates:
+                    logging.info("  ~ %s parece una variante de: %s",
+                                 ch['nombre'], ', '.join(d.get('nombre', d.get('id')) for d in duplicates))
+            
             if new_channels:
                 config.setdefault('channels', []).extend(new_channels)
                 
@@ -181,13 +204,13 @@ def update_config_with_discovered_channels(config_file='config.json'):
                 with open(config_file, 'w', encoding='utf-8') as f:
                     json.dump(config, f, indent=2, ensure_ascii=False)
                 
-                logging.info(f"Configuración actualizada con {len(new_channels)} canales nuevos")
+                logging.info("Configuración actualizada con %s canales nuevos", len(new_channels))
                 
                 # Mostrar resumen de canales añadidos
                 for ch in new_channels[:5]:  # Mostrar solo los primeros 5
-                    logging.info(f"  + {ch['nombre']} ({ch['scraper']})")
+                    logging.info("  + %s (%s)", ch['nombre'], ch.get('scraper', 'derivado'))
                 if len(new_channels) > 5:
-                    logging.info(f"  ... y {len(new_channels) - 5} canales más")
+                    logging.info("  ... y %s canales más", len(new_channels) - 5)
                 
                 return True
             else:
@@ -198,22 +221,22 @@ def update_config_with_discovered_channels(config_file='config.json'):
             return False
             
     except Exception as e:
-        logging.error(f"Error actualizando configuración: {e}")
+        logging.error("Error actualizando configuración: %s", e)
         return False
 
-def auto_discover_channels_if_needed(min_channels=3):
+def auto_discover_channels_if_needed(min_channels=3, current_channels=None):
     """
-    Descubre canales automáticamente si la lista está vacía o es muy pequeña
+    Descubre canales automáticamente si la lista está vacía o es muy pequeña.
+    current_channels: número de canales ya configurados (evita releer config.json)
     """
     try:
-        with open('config.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        
-        current_channels = len(config.get('channels', []))
+        if current_channels is None:
+            with open('config.json', 'r', encoding='utf-8') as f:
+                current_channels = len(json.load(f).get('channels', []))
         
         # Si hay pocos canales, intentar descubrir más
         if current_channels < min_channels:
-            logging.info(f"Solo {current_channels} canales en config (mínimo: {min_channels}). Iniciando descubrimiento automático...")
+            logging.info("Solo %s canales en config (mínimo: %s). Iniciando descubrimiento automático...", current_channels, min_channels)
             success = update_config_with_discovered_channels()
             
             if success:
@@ -221,14 +244,14 @@ def auto_discover_channels_if_needed(min_channels=3):
             else:
                 logging.warning("⚠ No se pudieron añadir canales nuevos")
         else:
-            logging.info(f"Configuración actual: {current_channels} canales (suficientes)")
+            logging.info("Configuración actual: %s canales (suficientes)", current_channels)
         
     except FileNotFoundError:
         logging.error("Archivo config.json no encontrado")
     except json.JSONDecodeError:
         logging.error("Error leyendo config.json - formato JSON inválido")
     except Exception as e:
-        logging.error(f"Error en auto-descubrimiento: {e}")
+        logging.error("Error en auto-descubrimiento: %s", e)
 
 def list_available_channels():
     """
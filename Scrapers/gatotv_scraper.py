@@ -1,17 +1,36 @@
+import asyncio
 import logging
 import requests
 from bs4 import BeautifulSoup
 from datetime import datetime, timedelta, timezone
 import re
+import time
+import soupsieve as sv
+from lxml import etree
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 from urllib.parse import urlparse
+from Scrapers.selector_plan import SelectorPlan, has_text
+from Scrapers.time_parsing import parse_clock_24h, combine_date_time, format_xmltv
+from Scrapers.async_http import AsyncFetchError, create_session, fetch_text, parse_executor, run_parser
+from Guide.config import channel_timezone
+from Guide.metrics import FetchStats
+from Guide.string_pool import StringPool
+
+# Clases de las filas de programación en las páginas de día
+ROW_CLASSES = {"tbl_EPG_row", "tbl_EPG_rowAlternate", "tbl_EPG_row_selected"}
+STREAM_CHUNK_SIZE = 16 * 1024
 
 class GatoTVScraper:
-    def __init__(self, config):
+    def __init__(self, config, pool=None):
         self.headers = config.get("headers", {"User-Agent": "Mozilla/5.0"})
         self.config = config
+        # Pool de textos compartido con el almacén: un título repetido se guarda una vez
+        self.pool = pool if pool is not None else StringPool()
+        self.stats = FetchStats()
+        self.parser = parse_executor()   # parseo fuera del event loop en el motor async
         self.timeout = config.get("timeout", 15)
+        self.streaming = config.get("streaming_parse", False)
         
         # Configuración de días a scrapear
         if config.get("is_full_week_mode", False):
@@ -22,7 +41,7 @@ class GatoTVScraper:
             logging.info("[GatoTV] Configurado en modo FIN DE SEMANA")
         else:
             self.days_to_scrape = config.get("days_to_scrape", 1)
-            logging.info(f"[GatoTV] Configurado en modo NORMAL - {self.days_to_scrape} día(s)")
+            logging.info("[GatoTV] Configurado en modo NORMAL - %s día(s)", self.days_to_scrape)
 
         # Configuración de sesión HTTP con reintentos
         self.session = requests.Session()
@@ -33,6 +52,39 @@ class GatoTVScraper:
         )
         self.session.mount('https://', HTTPAdapter(max_retries=retries))
 
+        # Planes de selectores precompilados: la variante que funciona se aprende
+        # en la primera página y los respaldos solo se reintentan si deja de coincidir
+        self.plans = {
+            "rows": SelectorPlan("GatoTV", "filas", [
+                "tr.tbl_EPG_row, tr.tbl_EPG_rowAlternate, tr.tbl_EPG_row_selected"
+            ]),
+            "start": SelectorPlan("GatoTV", "inicio", ["td:nth-child(2) time"]),
+            "stop": SelectorPlan("GatoTV", "fin", ["td:nth-child(3) time"]),
+            "title": SelectorPlan("GatoTV", "título", [
+                'td:nth-child(4) > div > div > a > span',
+                'td:nth-child(3) > div > div > span', 
+                'td:nth-child(3) > div > div > a > span',
+                'td:nth-child(3) span',
+            ], accept=has_text),
+            "description": SelectorPlan("GatoTV", "descripción", [
+                'td:nth-child(4) > div > div.hidden-xs',
+                'td:nth-child(3) > div > div.hidden-xs',
+                'td:nth-child(4) div.hidden-xs',
+                'td:nth-child(3) div.hidden-xs'
+            ], accept=has_text),
+            "image": SelectorPlan("GatoTV", "imagen", ['td:nth-child(3) > a > img'],
+                                  accept=lambda elem: elem is not None and elem.get('src'))
+        }
+
+    def drift_events(self):
+        """Cambios de estructura detectados durante la ejecución"""
+        return [event for plan in self.plans.values() for event in plan.drift_events]
+
+    def finish_page(self, url):
+        """Cierra la página en los planes de selectores (detección de cambios de estructura)"""
+        for plan in self.plans.values():
+            plan.end_page(url)
+
     def validate_site_structure(self, soup, url):
         """Valida que la estructura del sitio no haya cambiado"""
         expected_elements = [
@@ -41,25 +93,17 @@ class GatoTVScraper:
         ]
         
         for element in expected_elements:
-            if not soup.select(element):
-                logging.error(f"[GatoTV] Estructura del sitio cambió - No se encontró: {element}")
-                logging.error(f"[GatoTV] URL: {url}")
+            if not sv.select_one(element, soup):
+                logging.error("[GatoTV] Estructura del sitio cambió - No se encontró: %s", element)
+                logging.error("[GatoTV] URL: %s", url)
                 return False
         return True
 
     def parse_title(self, row):
-        """Extrae el título usando múltiples selectores"""
-        selectors = [
-            'td:nth-child(4) > div > div > a > span',
-            'td:nth-child(3) > div > div > span', 
-            'td:nth-child(3) > div > div > a > span',
-            'td:nth-child(3) span',
-        ]
-        
-        for selector in selectors:
-            title_elem = row.select_one(selector)
-            if title_elem and title_elem.get_text(strip=True):
-                return title_elem.get_text(strip=True)
+        """Extrae el título usando el plan de selectores (con respaldos)"""
+        title_elem = self.plans["title"].select_one(row)
+        if title_elem:
+            return title_elem.get_text(strip=True)
         
         spans = row.select('td:nth-child(3) span, td:nth-child(4) span')
         for span in spans:
@@ -71,36 +115,26 @@ class GatoTVScraper:
 
     def parse_description(self, row):
         """Extrae descripción con limpieza mejorada"""
-        desc_selectors = [
-            'td:nth-child(4) > div > div.hidden-xs',
-            'td:nth-child(3) > div > div.hidden-xs',
-            'td:nth-child(4) div.hidden-xs',
-            'td:nth-child(3) div.hidden-xs'
-        ]
-        
-        for selector in desc_selectors:
-            desc_elem = row.select_one(selector)
-            if desc_elem:
-                desc = desc_elem.get_text(strip=True)
-                if desc:
-                    return desc.replace('\n', ' ').strip()
+        desc_elem = self.plans["description"].select_one(row)
+        if desc_elem:
+            return desc_elem.get_text(strip=True).replace('\n', ' ').strip()
         
         return ""
 
     def parse_image(self, row):
         """Extrae URL de imagen del programa si está disponible"""
         try:
-            img_elem = row.select_one('td:nth-child(3) > a > img')
-            if img_elem and img_elem.get('src'):
+            img_elem = self.plans["image"].select_one(row)
+            if img_elem:
                 return img_elem['src']
         except Exception as e:
-            logging.warning(f"[GatoTV] Error extrayendo imagen: {e}")
+            logging.warning("[GatoTV] Error extrayendo imagen: %s", e)
         return ""
 
     def parse_time_with_validation(self, time_elem, fecha_local, column_name):
         """Parsea tiempo con validación mejorada"""
         if not time_elem:
-            logging.warning(f"[GatoTV] No se encontró elemento time en {column_name}")
+            logging.warning("[GatoTV] No se encontró elemento time en %s", column_name)
             return None
             
         datetime_attr = time_elem.get("datetime")
@@ -109,15 +143,14 @@ class GatoTVScraper:
             if re.match(r'^\d{2}:\d{2}', time_text):
                 datetime_attr = time_text
             else:
-                logging.error(f"[GatoTV] Formato de tiempo inválido: {time_text}")
+                logging.error("[GatoTV] Formato de tiempo inválido: %s", time_text)
                 return None
         
-        try:
-            time_local = datetime.strptime(datetime_attr, "%H:%M")
-            return datetime.combine(fecha_local, time_local.time())
-        except ValueError as e:
-            logging.error(f"[GatoTV] Error parseando tiempo '{datetime_attr}' en {column_name}: {e}")
+        clock = parse_clock_24h(datetime_attr)
+        if clock is None:
+            logging.error("[GatoTV] Error parseando tiempo '%s' en %s", datetime_attr, column_name)
             return None
+        return combine_date_time(fecha_local, clock)
 
     def handle_day_transitions(self, programs_list):
         """Maneja transiciones de día"""
@@ -132,7 +165,7 @@ class GatoTVScraper:
                 # El programa termina al día siguiente
                 stop_dt = stop_dt + timedelta(days=1)
                 prog['stop_dt'] = stop_dt
-                prog['stop'] = stop_dt.strftime("%Y%m%d%H%M%S")
+                prog['stop'] = format_xmltv(stop_dt)
         
         return programs_list
 
@@ -144,91 +177,213 @@ class GatoTVScraper:
         except:
             return False
 
-    def fetch_programs(self, channel_config):
-        """Obtiene la programación de un canal específico"""
-        url_base = channel_config["url"]
-        if not self.validate_url(url_base):
-            logging.error(f"[GatoTV] URL inválida: {url_base}")
-            return []
-
-        programas = []
-        
-        # Configuración de zona horaria
-        tz_override = channel_config.get("timezone_override")
-        global_offset_hours = self.config.get("timezone_offset_hours", 6)
-
-        if tz_override is not None:
-            offset_hours = tz_override
-            logging.info(f"[GatoTV] Usando zona horaria específica del canal: UTC-{offset_hours}")
-        else:
-            offset_hours = global_offset_hours
-            logging.info(f"[GatoTV] Usando zona horaria global: UTC-{offset_hours}")
+    def get_local_today(self, channel_config):
+        """Fecha local actual según la zona horaria del canal"""
+        # Ya resuelta al compilar config.json (timezone_override o global)
+        offset_hours = channel_timezone(channel_config, self.config)
+        logging.debug("[GatoTV] Zona horaria del canal: UTC-%s", offset_hours)
         
         timezone_offset = timedelta(hours=offset_hours)
-        
-        # Cálculo de fechas
-        today_local = (datetime.now(timezone.utc) - timezone_offset).date()
+        return (datetime.now(timezone.utc) - timezone_offset).date()
+
+    def get_dates_to_scrape(self, channel_config):
+        """Calcula las fechas locales a scrapear para un canal"""
+        today_local = self.get_local_today(channel_config)
         current_weekday = today_local.weekday()
         
         if hasattr(self, 'days_to_scrape') and self.days_to_scrape == 7:
             monday_this_week = today_local - timedelta(days=current_weekday)
             start_date = monday_this_week
-            logging.info(f"[GatoTV] Modo semana completa: iniciando desde lunes {start_date}")
+            logging.info("[GatoTV] Modo semana completa: iniciando desde lunes %s", start_date)
         else:
             start_date = today_local
 
-        # Procesar cada día
-        for i in range(self.days_to_scrape):
-            fecha_local = start_date + timedelta(days=i)
-            url = f"{url_base}/{fecha_local.strftime('%Y-%m-%d')}"
+        days = channel_config.get("days_to_scrape") or self.days_to_scrape
+        return [start_date + timedelta(days=i) for i in range(days)]
+
+    def get_day_url(self, channel_config, fecha_local):
+        """URL de la página de un día"""
+        return f"{channel_config['url']}/{fecha_local.strftime('%Y-%m-%d')}"
+
+    def parse_day(self, html, fecha_local, url):
+        """Parsea la página de un día y devuelve sus programas"""
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        rows = self.plans["rows"].select(soup)
+        if not rows:
+            # Solo se recorre el documento completo para diagnosticar qué cambió
+            self.validate_site_structure(soup, url)
+            return []
+        
+        daily_programs = self.parse_rows(rows, fecha_local)
+        self.finish_page(url)
+        return daily_programs
+
+    def iter_stream_rows(self, chunks, encoding=None):
+        """
+        Alimenta un parser HTML incremental con el cuerpo de la respuesta y produce
+        cada fila de programación en cuanto se cierra su <tr>. El resto del documento
+        (cabeceras, scripts, anuncios) se descarta a medida que se parsea.
+        """
+        parser = etree.HTMLPullParser(events=("start", "end"), encoding=encoding)
+        row_depth = 0
+
+        def drain():
+            nonlocal row_depth
+            for event, elem in parser.read_events():
+                is_row = elem.tag == "tr" and ROW_CLASSES.intersection((elem.get("class") or "").split())
+                if event == "start":
+                    if is_row:
+                        row_depth += 1
+                    continue
+
+                if is_row:
+                    row_depth -= 1
+                    html = etree.tostring(elem, encoding="unicode", method="html", with_tail=False)
+                    yield BeautifulSoup(html, 'html.parser').tr
+                elif row_depth:
+                    continue  # Celdas de una fila todavía abierta
+
+                # Liberar el elemento y los hermanos ya procesados
+                elem.clear(keep_tail=True)
+                parent = elem.getparent()
+                if parent is not None:
+                    while elem.getprevious() is not None:
+                        del parent[0]
+
+        for chunk in chunks:
+            parser.feed(chunk)
+            yield from drain()
+        parser.close()
+        yield from drain()
+
+    def parse_day_stream(self, response, fecha_local, url):
+        """Parsea la página de un día en streaming, sin construir el documento completo"""
+        content_type = response.headers.get("Content-Type", "")
+        encoding = response.encoding if "charset" in content_type.lower() else None
+        chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+        
+        daily_programs = self.parse_rows(self.iter_stream_rows(chunks, encoding), fecha_local)
+        self.finish_page(url)
+        if not daily_programs:
+            logging.error("[GatoTV] Estructura del sitio cambió - No se encontraron filas del EPG (streaming)")
+            logging.error("[GatoTV] URL: %s", url)
+        return daily_programs
+
+    def parse_rows(self, rows, fecha_local):
+        """Convierte las filas de programación de un día en programas"""
+        daily_programs = []
+        
+        for row in rows:
+            start_time = self.parse_time_with_validation(
+                self.plans["start"].select_one(row),
+                fecha_local,
+                "inicio"
+            )
+            stop_time = self.parse_time_with_validation(
+                self.plans["stop"].select_one(row),
+                fecha_local,
+                "fin"
+            )
             
-            try:
+            if not all([start_time, stop_time]):
+                continue
+            
+            program = {
+                'start_dt': start_time,
+                'stop_dt': stop_time,
+                'start': format_xmltv(start_time),
+                'stop': format_xmltv(stop_time),
+                'title': self.pool.intern(self.parse_title(row)),
+                'description': self.pool.intern(self.parse_description(row)),
+                'image': self.pool.intern(self.parse_image(row))
+            }
+            
+            daily_programs.append(program)
+        
+        # Manejar transiciones de día
+        return self.handle_day_transitions(daily_programs)
+
+    def fetch_day(self, channel_config, fecha_local):
+        """Descarga y parsea la programación de un canal para un día"""
+        url = self.get_day_url(channel_config, fecha_local)
+        started = time.perf_counter()
+        
+        try:
+            if self.streaming:
+                with self.session.get(url, headers=self.headers, timeout=self.timeout, stream=True) as response:
+                    response.raise_for_status()
+                    daily_programs = self.parse_day_stream(response, fecha_local, url)
+                    nbytes = response.raw.tell()
+            else:
                 response = self.session.get(url, headers=self.headers, timeout=self.timeout)
                 response.raise_for_status()
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                if not self.validate_site_structure(soup, url):
-                    continue
-                
-                rows = soup.select("tr.tbl_EPG_row, tr.tbl_EPG_rowAlternate, tr.tbl_EPG_row_selected")
-                daily_programs = []
-                
-                for row in rows:
-                    start_time = self.parse_time_with_validation(
-                        row.select_one("td:nth-child(2) time"),
-                        fecha_local,
-                        "inicio"
-                    )
-                    stop_time = self.parse_time_with_validation(
-                        row.select_one("td:nth-child(3) time"),
-                        fecha_local,
-                        "fin"
-                    )
-                    
-                    if not all([start_time, stop_time]):
-                        continue
-                    
-                    program = {
-                        'start_dt': start_time,
-                        'stop_dt': stop_time,
-                        'start': start_time.strftime("%Y%m%d%H%M%S"),
-                        'stop': stop_time.strftime("%Y%m%d%H%M%S"),
-                        'title': self.parse_title(row),
-                        'description': self.parse_description(row),
-                        'image': self.parse_image(row)
-                    }
-                    
-                    daily_programs.append(program)
-                
-                # Manejar transiciones de día y añadir programas
-                daily_programs = self.handle_day_transitions(daily_programs)
-                programas.extend(daily_programs)
-                
-                logging.info(f"[GatoTV] Procesados {len(daily_programs)} programas para {fecha_local}")
-                
-            except requests.RequestException as e:
-                logging.error(f"[GatoTV] Error descargando {url}: {e}")
-            except Exception as e:
-                logging.error(f"[GatoTV] Error procesando {url}: {e}")
+                nbytes = len(response.content)
+                daily_programs = self.parse_day(response.text, fecha_local, url)
+            self.stats.record(nbytes, time.perf_counter() - started)
+            logging.info("[GatoTV] Procesados %d programas para %s", len(daily_programs), fecha_local)
+            return daily_programs
+            
+        except requests.RequestException as e:
+            self.stats.record(0, time.perf_counter() - started, ok=False)
+            logging.error("[GatoTV] Error descargando %s: %s", url, e)
+        except Exception as e:
+            logging.error("[GatoTV] Error procesando %s: %s", url, e)
+        return []
+
+    def fetch_programs(self, channel_config, dates=None):
+        """
+        Obtiene la programación de un canal específico.
+        dates: fechas locales a descargar (por defecto get_dates_to_scrape)
+        """
+        url_base = channel_config["url"]
+        if not self.validate_url(url_base):
+            logging.error("[GatoTV] URL inválida: %s", url_base)
+            return []
+
+        programas = []
+        
+        # Procesar cada día
+        for fecha_local in dates if dates is not None else self.get_dates_to_scrape(channel_config):
+            programas.extend(self.fetch_day(channel_config, fecha_local))
                 
-        return programas
\ No newline at end of file
+        return programas
+
+    async def afetch_day(self, session, channel_config, fecha_local):
+        """Versión async de fetch_day: descarga con aiohttp y reutiliza parse_day"""
+        url = self.get_day_url(channel_config, fecha_local)
+        started = time.perf_counter()
+        try:
+            html = await fetch_text(session, url, self.headers, self.timeout)
+            self.stats.record(len(html), time.perf_counter() - started)
+            daily_programs = await run_parser(self.parser, self.parse_day, html, fecha_local, url)
+            logging.info("[GatoTV] Procesados %d programas para %s", len(daily_programs), fecha_local)
+            return daily_programs
+            
+        except AsyncFetchError as e:
+            self.stats.record(0, time.perf_counter() - started, ok=False)
+            logging.error("[GatoTV] Error descargando %s: %s", url, e)
+        except Exception as e:
+            logging.error("[GatoTV] Error procesando %s: %s", url, e)
+        return []
+
+    async def afetch_programs(self, channel_config, dates=None, session=None):
+        """
+        Versión async de fetch_programs: los días se descargan concurrentemente
+        sobre un único event loop.
+        session: sesión aiohttp compartida (ver Scrapers/async_http.py); si no se
+        indica se crea una para esta llamada.
+        """
+        url_base = channel_config["url"]
+        if not self.validate_url(url_base):
+            logging.error("[GatoTV] URL inválida: %s", url_base)
+            return []
+
+        if session is None:
+            async with create_session() as own_session:
+                return await self.afetch_programs(channel_config, dates, own_session)
+
+        fechas = dates if dates is not None else self.get_dates_to_scrape(channel_config)
+        results = await asyncio.gather(*(self.afetch_day(session, channel_config, fecha_local)
+                                         for fecha_local in fechas))
+        return [prog for daily_programs in results for prog in daily_programs]
@@ -0,0 +1,54 @@
+"""
+Listados de varios días por petición.
+
+Algunas fuentes publican, además de la página de cada día, un listado con la
+programación de varios días de un canal. Si el canal lo indica (listing_url),
+el primer trabajo de día de ese canal descarga el listado una sola vez y lo
+reparte por fechas; los demás días del canal salen de aquí sin otra petición.
+Un día que falta en el listado, o un listado que no se pudo descargar o
+parsear, se descarga por la página del día como siempre.
+
+El planificador intercala los días de todos los canales, así que un listado no
+puede descartarse por antigüedad (un LRU lo volvería a descargar para los días
+que quedan): cada día se suelta al entregarse, y del canal solo queda un {}
+que evita repetir la descarga.
+"""
+import asyncio
+
+class ListingCache:
+    """Días de los listados descargados, pendientes de entregar a sus trabajos"""
+
+    def __init__(self):
+        # channel_id -> {fecha: programas} aún sin entregar; {} si ya se entregó todo o el listado no sirvió
+        self._days = {}
+        self._pending = {}      # channel_id -> tarea async del listado en curso
+
+    def __contains__(self, channel_id):
+        return channel_id in self._days
+
+    def take(self, channel_id, fecha):
+        """Programas de un día del listado (se entregan una sola vez) o None"""
+        days = self._days.get(channel_id)
+        if not days:
+            return None
+        return days.pop(fecha, None)
+
+    def load(self, channel_id, fetch):
+        """Descarga el listado del canal con fetch() -> {fecha: programas} si aún no se hizo"""
+        if channel_id not in self._days:
+            self._days[channel_id] = fetch() or {}
+
+    async def aload(self, channel_id, fetch):
+        """Versión async de load: los días del canal que llegan a la vez esperan a la misma descarga"""
+        if channel_id in self._days:
+            return
+        task = self._pending.get(channel_id)
+        if task is None:
+            task = self._pending[channel_id] = asyncio.ensure_future(self._afetch(channel_id, fetch))
+        await task
+
+    async def _afetch(self, channel_id, fetch):
+        try:
+            self._days[channel_id] = await fetch() or {}
+        finally:
+            del self._pending[channel_id]
@@ -1,14 +1,24 @@
+import asyncio
 import logging
 import requests
 from bs4 import BeautifulSoup
 from datetime import datetime, timedelta, timezone
 import re
+import time
+import soupsieve as sv
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 from urllib.parse import urlparse, urljoin
+from Scrapers.selector_plan import SelectorPlan
+from Scrapers.time_parsing import parse_clock_24h, combine_date_time, format_xmltv
+from Scrapers.async_http import AsyncFetchError, create_session, fetch_text, parse_executor, run_parser
+from Guide.config import channel_timezone
+from Guide.memory import DEFAULT_CACHE_ENTRIES, LRUCache
+from Guide.metrics import FetchStats
+from Guide.string_pool import StringPool
 
 class MiTVScraper:
-    def __init__(self, config):
+    def __init__(self, config, pool=None):
         self.base_url = "https://www.mi.tv"
         self.headers = config.get("headers", {
             "User-Agent": "Mozilla/5.0",
@@ -16,8 +26,13 @@ class MiTVScraper:
             "Accept-Language": "es-CO,es;q=0.8"
         })
         self.config = config
+        # Pool de textos compartido con el almacén: un título repetido se guarda una vez
+        self.pool = pool if pool is not None else StringPool()
+        self.stats = FetchStats()
+        self.parser = parse_executor()   # parseo fuera del event loop en el motor async
         self.timeout = config.get("timeout", 15)
-        self.cache = {}
+        # Caché de días ya parseados, acotado (LRU) para ejecuciones largas
+        self.cache = LRUCache(config.get("cache_max_entries", DEFAULT_CACHE_ENTRIES))
         
         # Configuración de días
         self.days_to_scrape = self._configure_days(config)
@@ -25,6 +40,25 @@ class MiTVScraper:
         # Configurar sesión HTTP
         self.session = self._setup_session()
         
+        # Planes de selectores precompilados
+        self.plans = {
+            "items": SelectorPlan("MiTV", "programas", [".schedule-item"]),
+            "time": SelectorPlan("MiTV", "hora", [".schedule-time"]),
+            "duration": SelectorPlan("MiTV", "duración", [".duration"]),
+            "title": SelectorPlan("MiTV", "título", [".program-title"]),
+            "description": SelectorPlan("MiTV", "descripción", [".program-description"]),
+            "image": SelectorPlan("MiTV", "imagen", [".program-image img"])
+        }
+
+    def drift_events(self):
+        """Cambios de estructura detectados durante la ejecución"""
+        return [event for plan in self.plans.values() for event in plan.drift_events]
+
+    def finish_page(self, url):
+        """Cierra la página en los planes de selectores (detección de cambios de estructura)"""
+        for plan in self.plans.values():
+            plan.end_page(url)
+
     def _configure_days(self, config):
         """Configura los días a scrapear según el modo"""
         if config.get("is_full_week_mode", False):
@@ -32,11 +66,11 @@ class MiTVScraper:
             return 7
         elif config.get("is_weekend_mode", False):
             days = config.get("days_to_scrape", 2)
-            logging.info(f"[MiTV] Modo fin de semana ({days} días)")
+            logging.info("[MiTV] Modo fin de semana (%s días)", days)
             return days
         else:
             days = config.get("days_to_scrape", 1)
-            logging.info(f"[MiTV] Modo normal ({days} día(s))")
+            logging.info("[MiTV] Modo normal (%s día(s))", days)
             return days
 
     def _setup_session(self):
@@ -67,31 +101,26 @@ class MiTVScraper:
         ]
         
         for selector in required_elements:
-            if not soup.select(selector):
-                logging.error(f"[MiTV] Estructura inválida - No se encontró: {selector}")
-                logging.error(f"[MiTV] URL: {url}")
+            if not sv.select_one(selector, soup):
+                logging.error("[MiTV] Estructura inválida - No se encontró: %s", selector)
+                logging.error("[MiTV] URL: %s", url)
                 return False
         return True
 
     def parse_time(self, time_str, fecha_local):
         """Parsea tiempo con validación mejorada"""
-        try:
-            # Formato esperado: "20:30" o "20:30:00"
-            time_parts = time_str.strip().split(":")
-            if len(time_parts) >= 2:
-                hours = int(time_parts[0])
-                minutes = int(time_parts[1])
-                time_obj = datetime.strptime(f"{hours:02d}:{minutes:02d}", "%H:%M")
-                return datetime.combine(fecha_local, time_obj.time())
-        except ValueError as e:
-            logging.error(f"[MiTV] Error parseando tiempo '{time_str}': {e}")
-        return None
+        # Formato esperado: "20:30" o "20:30:00"
+        clock = parse_clock_24h(time_str)
+        if clock is None:
+            logging.error("[MiTV] Error parseando tiempo '%s'", time_str)
+            return None
+        return combine_date_time(fecha_local, clock)
 
     def parse_program_details(self, item):
         """Extrae detalles del programa con validación"""
-        title_elem = item.select_one(".program-title")
-        desc_elem = item.select_one(".program-description")
-        img_elem = item.select_one(".program-image img")
+        title_elem = self.plans["title"].select_one(item)
+        desc_elem = self.plans["description"].select_one(item)
+        img_elem = self.plans["image"].select_one(item)
         
         details = {
             'title': "Sin título",
@@ -108,7 +137,7 @@ class MiTVScraper:
         if img_elem and img_elem.get('src'):
             details['image'] = urljoin(self.base_url, img_elem['src'])
             
-        return details
+        return {field: self.pool.intern(value) for field, value in details.items()}
 
     def handle_day_transition(self, programs):
         """Maneja transiciones entre días"""
@@ -122,92 +151,170 @@ class MiTVScraper:
             if next_prog['start_dt'] < current['stop_dt']:
                 next_prog['start_dt'] += timedelta(days=1)
                 next_prog['stop_dt'] += timedelta(days=1)
-                next_prog['start'] = next_prog['start_dt'].strftime("%Y%m%d%H%M%S")
-                next_prog['stop'] = next_prog['stop_dt'].strftime("%Y%m%d%H%M%S")
+                next_prog['start'] = format_xmltv(next_prog['start_dt'])
+                next_prog['stop'] = format_xmltv(next_prog['stop_dt'])
         
         return programs
 
-    def fetch_programs(self, channel_config):
-        """Obtiene la programación de un canal"""
+    def get_local_today(self, channel_config):
+        """Fecha local actual según la zona horaria del canal"""
+        offset_hours = channel_timezone(channel_config, self.config)
+        timezone_offset = timedelta(hours=offset_hours)
+        
+        return (datetime.now(timezone.utc) - timezone_offset).date()
+
+    def get_dates_to_scrape(self, channel_config):
+        """Calcula las fechas locales a scrapear para un canal"""
+        today_local = self.get_local_today(channel_config)
+        days = channel_config.get("days_to_scrape") or self.days_to_scrape
+        return [today_local + timedelta(days=day_offset) for day_offset in range(days)]
+
+    def get_day_url(self, channel_config, fecha_local):
+        """URL de la página de un día"""
+        return f"{channel_config.get('url')}/{fecha_local.strftime('%Y-%m-%d')}"
+
+    def parse_day(self, html, fecha_local, url):
+        """Parsea la página de un día y devuelve sus programas"""
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        schedule_items = self.plans["items"].select(soup)
+        if not schedule_items:
+            # Solo se recorre el documento completo para diagnosticar qué cambió
+            self.validate_page_structure(soup, url)
+            return []
+        
+        daily_programs = []
+        
+        for item in schedule_items:
+            time_elem = self.plans["time"].select_one(item)
+            duration_elem = self.plans["duration"].select_one(item)
+            
+            if not time_elem:
+                continue
+                
+            start_time = self.parse_time(time_elem.get_text(), fecha_local)
+            if not start_time:
+                continue
+            
+            # Calcular duración
+            duration = 30  # duración por defecto
+            if duration_elem:
+                duration_match = re.search(r'(\d+)\s*min', duration_elem.get_text())
+                if duration_match:
+                    duration = int(duration_match.group(1))
+            
+            stop_time = start_time + timedelta(minutes=duration)
+            
+            program_details = self.parse_program_details(item)
+            program = {
+                'start_dt': start_time,
+                'stop_dt': stop_time,
+                'start': format_xmltv(start_time),
+                'stop': format_xmltv(stop_time),
+                **program_details
+            }
+            
+            daily_programs.append(program)
+        
+        self.finish_page(url)
+        # Manejar transiciones de día
+        return self.handle_day_transition(daily_programs)
+
+    def fetch_day(self, channel_config, fecha_local):
+        """Descarga y parsea la programación de un canal para un día"""
+        url = self.get_day_url(channel_config, fecha_local)
+        
+        # Verificar caché
+        cache_key = f"{url}_{fecha_local.isoformat()}"
+        if cache_key in self.cache:
+            logging.info("[MiTV] Usando caché para %s", url)
+            self.stats.record_cache_hit()
+            return self.cache[cache_key]
+        
+        started = time.perf_counter()
+        try:
+            response = self.session.get(url, headers=self.headers, timeout=self.timeout)
+            response.raise_for_status()
+            self.stats.record(len(response.content), time.perf_counter() - started)
+            daily_programs = self.parse_day(response.text, fecha_local, url)
+            
+            # Guardar en caché
+            self.cache[cache_key] = daily_programs
+            
+            logging.info("[MiTV] Procesados %d programas para %s", len(daily_programs), fecha_local)
+            return daily_programs
+            
+        except requests.RequestException as e:
+            self.stats.record(0, time.perf_counter() - started, ok=False)
+            logging.error("[MiTV] Error de red en %s: %s", url, e)
+        except Exception as e:
+            logging.error("[MiTV] Error procesando %s: %s", url, e)
+        return []
+
+    def fetch_programs(self, channel_config, dates=None):
+        """
+        Obtiene la programación de un canal.
+        dates: fechas locales a descargar (por defecto get_dates_to_scrape)
+        """
         url_base = channel_config.get("url")
         if not self.validate_url(url_base):
-            logging.error(f"[MiTV] URL inválida: {url_base}")
+            logging.error("[MiTV] URL inválida: %s", url_base)
             return []
 
         all_programs = []
         
-        # Configuración de zona horaria
-        tz_override = channel_config.get("timezone_override")
-        offset_hours = tz_override if tz_override is not None else self.config.get("timezone_offset_hours", 6)
-        timezone_offset = timedelta(hours=offset_hours)
+        for fecha_local in dates if dates is not None else self.get_dates_to_scrape(channel_config):
+            all_programs.extend(self.fetch_day(channel_config, fecha_local))
         
-        today_local = (datetime.now(timezone.utc) - timezone_offset).date()
+        return all_programs
+
+    async def afetch_day(self, session, channel_config, fecha_local):
+        """Versión async de fetch_day: descarga con aiohttp y reutiliza parse_day"""
+        url = self.get_day_url(channel_config, fecha_local)
         
-        for day_offset in range(self.days_to_scrape):
-            fecha_local = today_local + timedelta(days=day_offset)
-            url = f"{url_base}/{fecha_local.strftime('%Y-%m-%d')}"
+        # Verificar caché
+        cache_key = f"{url}_{fecha_local.isoformat()}"
+        if cache_key in self.cache:
+            logging.info("[MiTV] Usando caché para %s", url)
+            self.stats.record_cache_hit()
+            return self.cache[cache_key]
+        
+        started = time.perf_counter()
+        try:
+            html = await fetch_text(session, url, self.headers, self.timeout)
+            self.stats.record(len(html), time.perf_counter() - started)
+            daily_programs = await run_parser(self.parser, self.parse_day, html, fecha_local, url)
             
-            # Verificar caché
-            cache_key = f"{url}_{fecha_local.isoformat()}"
-            if cache_key in self.cache:
-                logging.info(f"[MiTV] Usando caché para {url}")
-                all_programs.extend(self.cache[cache_key])
-                continue
+            # Guardar en caché
+            self.cache[cache_key] = daily_programs
             
-            try:
-                response = self.session.get(url, headers=self.headers, timeout=self.timeout)
-                response.raise_for_status()
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                if not self.validate_page_structure(soup, url):
-                    continue
-                
-                daily_programs = []
-                schedule_items = soup.select(".schedule-item")
-                
-                for item in schedule_items:
-                    time_elem = item.select_one(".schedule-time")
-                    duration_elem = item.select_one(".duration")
-                    
-                    if not time_elem:
-                        continue
-                        
-                    start_time = self.parse_time(time_elem.get_text(), fecha_local)
-                    if not start_time:
-                        continue
-                    
-                    # Calcular duración
-                    duration = 30  # duración por defecto
-                    if duration_elem:
-                        duration_match = re.search(r'(\d+)\s*min', duration_elem.get_text())
-                        if duration_match:
-                            duration = int(duration_match.group(1))
-                    
-                    stop_time = start_time + timedelta(minutes=duration)
-                    
-                    program_details = self.parse_program_details(item)
-                    program = {
-                        'start_dt': start_time,
-                        'stop_dt': stop_time,
-                        'start': start_time.strftime("%Y%m%d%H%M%S"),
-                        'stop': stop_time.strftime("%Y%m%d%H%M%S"),
-                        **program_details
-                    }
-                    
-                    daily_programs.append(program)
-                
-                # Manejar transiciones de día
-                daily_programs = self.handle_day_transition(daily_programs)
-                
-                # Guardar en caché
-                self.cache[cache_key] = daily_programs
-                
-                all_programs.extend(daily_programs)
-                logging.info(f"[MiTV] Procesados {len(daily_programs)} programas para {fecha_local}")
-                
-            except requests.RequestException as e:
-                logging.error(f"[MiTV] Error de red en {url}: {e}")
-            except Exception as e:
-                logging.error(f"[MiTV] Error procesando {url}: {e}")
-        
-        return all_programs
\ No newline at end of file
+            logging.info("[MiTV] Procesados %d programas para %s", len(daily_programs), fecha_local)
+            return daily_programs
+            
+        except AsyncFetchError as e:
+            self.stats.record(0, time.perf_counter() - started, ok=False)
+            logging.error("[MiTV] Error de red en %s: %s", url, e)
+        except Exception as e:
+            logging.error("[MiTV] Error procesando %s: %s", url, e)
+        return []
+
+    async def afetch_programs(self, channel_config, dates=None, session=None):
+        """
+        Versión async de fetch_programs: los días se descargan concurrentemente
+        sobre un único event loop.
+        session: sesión aiohttp compartida (ver Scrapers/async_http.py); si no se
+        indica se crea una para esta llamada.
+        """
+        url_base = channel_config.get("url")
+        if not self.validate_url(url_base):
+            logging.error("[MiTV] URL inválida: %s", url_base)
+            return []
+
+        if session is None:
+            async with create_session() as own_session:
+                return await self.afetch_programs(channel_config, dates, own_session)
+
+        fechas = dates if dates is not None else self.get_dates_to_scrape(channel_config)
+        results = await asyncio.gather(*(self.afetch_day(session, channel_config, fecha_local)
+                                         for fecha_local in fechas))
+        return [prog for daily_programs in results for prog in daily_programs]
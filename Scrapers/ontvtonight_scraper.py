@@ -1,20 +1,34 @@
+import asyncio
 import logging
 import requests
 from bs4 import BeautifulSoup
 from datetime import datetime, timedelta, timezone
 import re
+import time
+import soupsieve as sv
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 from urllib.parse import urlparse, urljoin
+from Scrapers.selector_plan import SelectorPlan
+from Scrapers.time_parsing import parse_clock_12h, combine_date_time, format_xmltv
+from Scrapers.async_http import AsyncFetchError, create_session, fetch_text, parse_executor, run_parser
+from Scrapers.listing import ListingCache
+from Guide.config import channel_timezone
+from Guide.metrics import FetchStats
+from Guide.string_pool import StringPool
 
 class OnTVTonightScraper:
-    def __init__(self, config):
+    def __init__(self, config, pool=None):
         self.base_url = "https://www.ontvtonight.com"
         self.headers = config.get("headers", {
             "User-Agent": "Mozilla/5.0",
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8"
         })
         self.config = config
+        # Pool de textos compartido con el almacén: un título repetido se guarda una vez
+        self.pool = pool if pool is not None else StringPool()
+        self.stats = FetchStats()
+        self.parser = parse_executor()   # parseo fuera del event loop en el motor async
         self.timeout = config.get("timeout", 15)
         
         # Configuración de días
@@ -23,6 +37,29 @@ class OnTVTonightScraper:
         # Configurar sesión HTTP con reintentos
         self.session = self._setup_session()
 
+        # Días ya descargados en listados de varios días (canales con listing_url)
+        self.listings = ListingCache()
+        
+        # Planes de selectores precompilados
+        self.plans = {
+            "entries": SelectorPlan("OnTVTonight", "programas", [".schedule-entry"]),
+            "days": SelectorPlan("OnTVTonight", "días", [".schedule[data-date]"]),
+            "time": SelectorPlan("OnTVTonight", "hora", [".schedule-time"]),
+            "duration": SelectorPlan("OnTVTonight", "duración", [".duration"]),
+            "title": SelectorPlan("OnTVTonight", "título", [".show-title"]),
+            "description": SelectorPlan("OnTVTonight", "descripción", [".show-description"]),
+            "image": SelectorPlan("OnTVTonight", "imagen", ["img"])
+        }
+
+    def drift_events(self):
+        """Cambios de estructura detectados durante la ejecución"""
+        return [event for plan in self.plans.values() for event in plan.drift_events]
+
+    def finish_page(self, url):
+        """Cierra la página en los planes de selectores (detección de cambios de estructura)"""
+        for plan in self.plans.values():
+            plan.end_page(url)
+
     def _get_days_to_scrape(self, config):
         """Determina los días a scrapear basado en la configuración"""
         if config.get("is_full_week_mode", False):
@@ -30,11 +67,11 @@ class OnTVTonightScraper:
             return 7
         elif config.get("is_weekend_mode", False):
             days = config.get("days_to_scrape", 2)
-            logging.info(f"[OnTVTonight] Modo fin de semana ({days} días)")
+            logging.info("[OnTVTonight] Modo fin de semana (%s días)", days)
             return days
         else:
             days = config.get("days_to_scrape", 1)
-            logging.info(f"[OnTVTonight] Modo normal ({days} día(s))")
+            logging.info("[OnTVTonight] Modo normal (%s día(s))", days)
             return days
 
     def _setup_session(self):
@@ -65,32 +102,32 @@ class OnTVTonightScraper:
         ]
         
         for selector in required_elements:
-            if not soup.select(selector):
-                logging.error(f"[OnTVTonight] Estructura inválida - No se encontró: {selector}")
-                logging.error(f"[OnTVTonight] URL: {url}")
+            if not sv.select_one(selector, soup):
+                logging.error("[OnTVTonight] Estructura inválida - No se encontró: %s", selector)
+                logging.error("[OnTVTonight] URL: %s", url)
                 return False
         return True
 
     def parse_time(self, time_str, fecha_local):
         """Parsea tiempo con manejo de errores mejorado"""
-        try:
-            # Formato esperado: "8:00 PM" o "11:30 AM"
-            time_obj = datetime.strptime(time_str.strip(), "%I:%M %p")
-            return datetime.combine(fecha_local, time_obj.time())
-        except ValueError as e:
-            logging.error(f"[OnTVTonight] Error parseando tiempo '{time_str}': {e}")
+        # Formato esperado: "8:00 PM" o "11:30 AM"
+        clock = parse_clock_12h(time_str)
+        if clock is None:
+            logging.error("[OnTVTonight] Error parseando tiempo '%s'", time_str)
             return None
+        return combine_date_time(fecha_local, clock)
 
     def parse_program_details(self, entry):
         """Extrae detalles del programa con validación mejorada"""
-        title = entry.select_one(".show-title")
-        desc = entry.select_one(".show-description")
-        img = entry.select_one("img")
+        title = self.plans["title"].select_one(entry)
+        desc = self.plans["description"].select_one(entry)
+        img = self.plans["image"].select_one(entry)
         
+        intern = self.pool.intern
         return {
-            'title': title.get_text(strip=True) if title else "Sin título",
-            'description': desc.get_text(strip=True) if desc else "",
-            'image': urljoin(self.base_url, img['src']) if img and img.get('src') else ""
+            'title': intern(title.get_text(strip=True) if title else "Sin título"),
+            'description': intern(desc.get_text(strip=True) if desc else ""),
+            'image': intern(urljoin(self.base_url, img['src']) if img and img.get('src') else "")
         }
 
     def handle_day_transition(self, programs):
@@ -105,81 +142,238 @@ class OnTVTonightScraper:
             if next_prog['start_dt'] < current['stop_dt']:
                 next_prog['start_dt'] += timedelta(days=1)
                 next_prog['stop_dt'] += timedelta(days=1)
-                next_prog['start'] = next_prog['start_dt'].strftime("%Y%m%d%H%M%S")
-                next_prog['stop'] = next_prog['stop_dt'].strftime("%Y%m%d%H%M%S")
+                next_prog['start'] = format_xmltv(next_prog['start_dt'])
+                next_prog['stop'] = format_xmltv(next_prog['stop_dt'])
         
         return programs
 
-    def fetch_programs(self, channel_config):
-        """Obtiene la programación de un canal específico"""
-        url_base = channel_config.get("url")
-        if not self.validate_url(url_base):
-            logging.error(f"[OnTVTonight] URL inválida: {url_base}")
-            return []
+    def get_local_today(self, channel_config):
+        """Fecha local actual según la zona horaria del canal"""
+        offset_hours = channel_timezone(channel_config, self.config)
+        timezone_offset = timedelta(hours=offset_hours)
+        
+        return (datetime.now(timezone.utc) - timezone_offset).date()
 
-        all_programs = []
+    def get_dates_to_scrape(self, channel_config):
+        """Calcula las fechas locales a scrapear para un canal"""
+        today_local = self.get_local_today(channel_config)
+        days = channel_config.get("days_to_scrape") or self.days_to_scrape
+        return [today_local + timedelta(days=day_offset) for day_offset in range(days)]
+
+    def get_day_url(self, channel_config, fecha_local):
+        """URL de la página de un día"""
+        return f"{channel_config.get('url')}/{fecha_local.strftime('%Y-%m-%d')}"
+
+    def parse_day(self, html, fecha_local, url):
+        """Parsea la página de un día y devuelve sus programas"""
+        soup = BeautifulSoup(html, 'html.parser')
         
-        # Configuración de zona horaria
-        tz_override = channel_config.get("timezone_override")
-        offset_hours = tz_override if tz_override is not None else self.config.get("timezone_offset_hours", 6)
-        timezone_offset = timedelta(hours=offset_hours)
+        entries = self.plans["entries"].select(soup)
+        if not entries:
+            # Solo se recorre el documento completo para diagnosticar qué cambió
+            self.validate_page_structure(soup, url)
+            return []
         
-        today_local = (datetime.now(timezone.utc) - timezone_offset).date()
+        daily_programs = self.parse_entries(entries, fecha_local)
+        self.finish_page(url)
+        return daily_programs
+
+    def parse_entries(self, entries, fecha_local):
+        """Convierte las entradas de programación de un día en programas"""
+        daily_programs = []
         
-        for day_offset in range(self.days_to_scrape):
-            fecha_local = today_local + timedelta(days=day_offset)
-            url = f"{url_base}/{fecha_local.strftime('%Y-%m-%d')}"
+        for entry in entries:
+            time_elem = self.plans["time"].select_one(entry)
+            duration_elem = self.plans["duration"].select_one(entry)
             
-            try:
-                response = self.session.get(url, headers=self.headers, timeout=self.timeout)
-                response.raise_for_status()
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                if not self.validate_page_structure(soup, url):
-                    continue
-                
-                daily_programs = []
-                entries = soup.select(".schedule-entry")
+            if not time_elem or not duration_elem:
+                continue
                 
-                for entry in entries:
-                    time_elem = entry.select_one(".schedule-time")
-                    duration_elem = entry.select_one(".duration")
-                    
-                    if not time_elem or not duration_elem:
-                        continue
-                        
-                    start_time = self.parse_time(time_elem.get_text(), fecha_local)
-                    if not start_time:
-                        continue
-                    
-                    # Extraer duración en minutos
-                    duration_match = re.search(r'(\d+)\s*min', duration_elem.get_text())
-                    if not duration_match:
-                        continue
-                    
-                    duration = int(duration_match.group(1))
-                    stop_time = start_time + timedelta(minutes=duration)
-                    
-                    program_details = self.parse_program_details(entry)
-                    program = {
-                        'start_dt': start_time,
-                        'stop_dt': stop_time,
-                        'start': start_time.strftime("%Y%m%d%H%M%S"),
-                        'stop': stop_time.strftime("%Y%m%d%H%M%S"),
-                        **program_details
-                    }
-                    
-                    daily_programs.append(program)
-                
-                # Manejar transiciones de día
-                daily_programs = self.handle_day_transition(daily_programs)
-                all_programs.extend(daily_programs)
-                
-                logging.info(f"[OnTVTonight] Procesados {len(daily_programs)} programas para {fecha_local}")
-                
-            except requests.RequestException as e:
-                logging.error(f"[OnTVTonight] Error de red en {url}: {e}")
-            except Exception as e:
-                logging.error(f"[OnTVTonight] Error procesando {url}: {e}")
+            start_time = self.parse_time(time_elem.get_text(), fecha_local)
+            if not start_time:
+                continue
+            
+            # Extraer duración en minutos
+            duration_match = re.search(r'(\d+)\s*min', duration_elem.get_text())
+            if not duration_match:
+                continue
+            
+            duration = int(duration_match.group(1))
+            stop_time = start_time + timedelta(minutes=duration)
+            
+            program_details = self.parse_program_details(entry)
+            program = {
+                'start_dt': start_time,
+                'stop_dt': stop_time,
+                'start': format_xmltv(start_time),
+                'stop': format_xmltv(stop_time),
+                **program_details
+            }
+            
+            daily_programs.append(program)
+        
+        # Manejar transiciones de día
+        return self.handle_day_transition(daily_programs)
+
+    def get_listing_url(self, channel_config):
+        """URL del listado de varios días del canal (listing_url) o None"""
+        return channel_config.get("listing_url")
+
+    def parse_listing(self, html, url, dates):
+        """
+        Parsea un listado de varios días. Formato esperado (no comprobado con una
+        captura real: ningún canal de config.json usa listing_url todavía):
+
+            <div class="schedule" data-date="YYYY-MM-DD">
+              <div class="schedule-entry">...</div>   (igual que en la página del día)
+            </div>
+
+        Cualquier otro marcado no se reconoce y los días se descargan por su página.
+        Devuelve {fecha: programas} de las fechas pedidas.
+        """
+        soup = BeautifulSoup(html, 'html.parser')
+        wanted = {fecha.isoformat(): fecha for fecha in dates}
+        days = {}
+        for section in self.plans["days"].select(soup):
+            fecha_local = wanted.get(section.get("data-date"))
+            if fecha_local is None or fecha_local in days:
+                continue
+            entries = self.plans["entries"].select(section)
+            if entries:
+                days[fecha_local] = self.parse_entries(entries, fecha_local)
+        self.finish_page(url)
+        if not days:
+            logging.warning("[OnTVTonight] El listado no trae días reconocibles: %s", url)
+        return days
+
+    def fetch_listing(self, channel_config):
+        """Descarga el listado de varios días de un canal: {fecha: programas} ({} si falla)"""
+        url = self.get_listing_url(channel_config)
+        started = time.perf_counter()
+        try:
+            response = self.session.get(url, headers=self.headers, timeout=self.timeout)
+            response.raise_for_status()
+            self.stats.record(len(response.content), time.perf_counter() - started)
+            days = self.parse_listing(response.text, url, self.get_dates_to_scrape(channel_config))
+            logging.info("[OnTVTonight] Listado de '%s': %d día(s) en una petición", channel_config.get("id"), len(days))
+            return days
+        except requests.RequestException as e:
+            self.stats.record(0, time.perf_counter() - started, ok=False)
+            logging.warning("[OnTVTonight] Listado no disponible %s, se descarga día a día: %s", url, e)
+        except Exception as e:
+            logging.warning("[OnTVTonight] Error procesando el listado %s, se descarga día a día: %s", url, e)
+        return {}
+
+    def listing_day(self, channel_config, fecha_local):
+        """Programas de un día servidos desde el listado ya descargado (None si no está)"""
+        daily_programs = self.listings.take(channel_config.get("id"), fecha_local)
+        if daily_programs is not None:
+            self.stats.record_cache_hit()
+            logging.info("[OnTVTonight] Procesados %d programas para %s (listado)", len(daily_programs), fecha_local)
+        return daily_programs
+
+    def fetch_day(self, channel_config, fecha_local):
+        """Descarga y parsea la programación de un canal para un día"""
+        if self.get_listing_url(channel_config):
+            self.listings.load(channel_config.get("id"), lambda: self.fetch_listing(channel_config))
+            daily_programs = self.listing_day(channel_config, fecha_local)
+            if daily_programs is not None:
+                return daily_programs
+
+        url = self.get_day_url(channel_config, fecha_local)
+        started = time.perf_counter()
+        
+        try:
+            response = self.session.get(url, headers=self.headers, timeout=self.timeout)
+            response.raise_for_status()
+            self.stats.record(len(response.content), time.perf_counter() - started)
+            daily_programs = self.parse_day(response.text, fecha_local, url)
+            logging.info("[OnTVTonight] Procesados %d programas para %s", len(daily_programs), fecha_local)
+            return daily_programs
+            
+        except requests.RequestException as e:
+            self.stats.record(0, time.perf_counter() - started, ok=False)
+            logging.error("[OnTVTonight] Error de red en %s: %s", url, e)
+        except Exception as e:
+            logging.error("[OnTVTonight] Error procesando %s: %s", url, e)
+        return []
+
+    def fetch_programs(self, channel_config, dates=None):
+        """
+        Obtiene la programación de un canal específico.
+        dates: fechas locales a descargar (por defecto get_dates_to_scrape)
+        """
+        url_base = channel_config.get("url")
+        if not self.validate_url(url_base):
+            logging.error("[OnTVTonight] URL inválida: %s", url_base)
+            return []
+
+        all_programs = []
+        
+        for fecha_local in dates if dates is not None else self.get_dates_to_scrape(channel_config):
+            all_programs.extend(self.fetch_day(channel_config, fecha_local))
         
         return all_programs
+
+    async def afetch_listing(self, session, channel_config):
+        """Versión async de fetch_listing"""
+        url = self.get_listing_url(channel_config)
+        started = time.perf_counter()
+        try:
+            html = await fetch_text(session, url, self.headers, self.timeout)
+            self.stats.record(len(html), time.perf_counter() - started)
+            days = await run_parser(self.parser, self.parse_listing, html, url,
+                                    self.get_dates_to_scrape(channel_config))
+            logging.info("[OnTVTonight] Listado de '%s': %d día(s) en una petición", channel_config.get("id"), len(days))
+            return days
+        except AsyncFetchError as e:
+            self.stats.record(0, time.perf_counter() - started, ok=False)
+            logging.warning("[OnTVTonight] Listado no disponible %s, se descarga día a día: %s", url, e)
+        except Exception as e:
+            logging.warning("[OnTVTonight] Error procesando el listado %s, se descarga día a día: %s", url, e)
+        return {}
+
+    async def afetch_day(self, session, channel_config, fecha_local):
+        """Versión async de fetch_day: descarga con aiohttp y reutiliza parse_day"""
+        if self.get_listing_url(channel_config):
+            await self.listings.aload(channel_config.get("id"), lambda: self.afetch_listing(session, channel_config))
+            daily_programs = self.listing_day(channel_config, fecha_local)
+            if daily_programs is not None:
+                return daily_programs
+
+        url = self.get_day_url(channel_config, fecha_local)
+        started = time.perf_counter()
+        try:
+            html = await fetch_text(session, url, self.headers, self.timeout)
+            self.stats.record(len(html), time.perf_counter() - started)
+            daily_programs = await run_parser(self.parser, self.parse_day, html, fecha_local, url)
+            logging.info("[OnTVTonight] Procesados %d programas para %s", len(daily_programs), fecha_local)
+            return daily_programs
+            
+        except AsyncFetchError as e:
+            self.stats.record(0, time.perf_counter() - started, ok=False)
+            logging.error("[OnTVTonight] Error de red en %s: %s", url, e)
+        except Exception as e:
+            logging.error("[OnTVTonight] Error procesando %s: %s", url, e)
+        return []
+
+    async def afetch_programs(self, channel_config, dates=None, session=None):
+        """
+        Versión async de fetch_programs: los días se descargan concurrentemente
+        sobre un único event loop.
+        session: sesión aiohttp compartida (ver Scrapers/async_http.py); si no se
+        indica se crea una para esta llamada.
+        """
+        url_base = channel_config.get("url")
+        if not self.validate_url(url_base):
+            logging.error("[OnTVTonight] URL inválida: %s", url_base)
+            return []
+
+        if session is None:
+            async with create_session() as own_session:
+                return await self.afetch_programs(channel_config, dates, own_session)
+
+        fechas = dates if dates is not None else self.get_dates_to_scrape(channel_config)
+        results = await asyncio.gather(*(self.afetch_day(session, channel_config, fecha_local)
+                                         for fecha_local in fechas))
+        return [prog for daily_programs in results for prog in daily_programs]
@@ -0,0 +1,85 @@
+import logging
+import soupsieve as sv
+
+def has_text(elem):
+    """Acepta elementos con texto no vacío"""
+    return elem is not None and bool(elem.get_text(strip=True))
+
+class SelectorPlan:
+    """
+    Plan de selección con variantes de respaldo precompiladas.
+
+    Primero se prueba la variante activa (al principio la primera declarada) y
+    solo si no coincide las demás en el orden declarado, de modo que tras un
+    cambio de estructura cada fila no paga el selector que ya no funciona.
+    Al terminar cada página (end_page) se elige la activa: la preferida si
+    coincidió en algún elemento, si no la activa si siguió funcionando, y si no
+    el respaldo más usado. Cada cambio de activa registra un evento de cambio de
+    estructura (drift); las páginas con filas de marcado alterno no generan eventos.
+    """
+
+    def __init__(self, site, name, selectors, accept=None):
+        self.site = site
+        self.name = name
+        self.variants = [(selector, sv.compile(selector)) for selector in selectors]
+        self.accept = accept or (lambda elem: elem is not None)
+        self.active = None          # variante con la que funcionó la última página
+        self.drift_events = []
+        self._page_hits = {}        # variante -> coincidencias en la página actual
+        self._order = list(enumerate(compiled for _, compiled in self.variants))
+
+    @property
+    def active_selector(self):
+        return self.variants[self.active][0] if self.active is not None else None
+
+    def _hit(self, idx):
+        self._page_hits[idx] = self._page_hits.get(idx, 0) + 1
+
+    def end_page(self, context=""):
+        """Cierra la página actual y registra un cambio de estructura si lo hubo"""
+        hits, self._page_hits = self._page_hits, {}
+        if not hits:
+            return
+        previous = self.active if self.active is not None else 0
+        # La preferida manda si coincidió en algún elemento de la página; si no, la activa si siguió valiendo
+        if 0 in hits:
+            idx = 0
+        elif previous in hits:
+            idx = previous
+        else:
+            idx = max(hits, key=hits.get)
+        if idx != previous:
+            event = {
+                "site": self.site,
+                "plan": self.name,
+                "from": self.variants[previous][0],
+                "to": self.variants[idx][0],
+                "context": context
+            }
+            self.drift_events.append(event)
+            logging.warning("[%s] Cambio de estructura en '%s': '%s' -> '%s' (%s)",
+                            self.site, self.name, event['from'], event['to'], context)
+        elif self.active is None:
+            logging.debug("[%s] Plan '%s' usa '%s'", self.site, self.name, self.variants[idx][0])
+        if idx != previous:
+            # La activa primero y el resto en el orden declarado
+            self._order.sort(key=lambda item: (item[0] != idx, item[0]))
+        self.active = idx
+
+    def select_one(self, node):
+        """Devuelve el primer elemento aceptado probando la variante activa y luego las demás"""
+        for idx, compiled in self._order:
+            elem = compiled.select_one(node)
+            if self.accept(elem):
+                self._hit(idx)
+                return elem
+        return None
+
+    def select(self, node):
+        """Devuelve todos los elementos de la primera variante (activa y luego las demás) con resultados"""
+        for idx, compiled in self._order:
+            elems = compiled.select(node)
+            if elems:
+                self._hit(idx)
+                return elems
+        return []
@@ -0,0 +1,55 @@
+from datetime import datetime
+from functools import lru_cache
+
+# Las páginas repiten las mismas horas en cada fila y cada día, así que el caché
+# convierte casi todas las llamadas en una simple búsqueda en diccionario
+CACHE_SIZE = 4096
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_clock_24h(text):
+    """
+    Parsea una hora 'HH:MM' (o 'HH:MM:SS') sin strptime.
+    Devuelve (hora, minuto) o None si el texto no es una hora válida.
+    """
+    parts = text.strip().split(":")
+    if len(parts) < 2 or len(parts) > 3:
+        return None
+    hours, minutes = parts[0].strip(), parts[1].strip()
+    if not (hours.isdigit() and minutes.isdigit()) or len(hours) > 2 or len(minutes) > 2:
+        return None
+    hour, minute = int(hours), int(minutes)
+    if hour > 23 or minute > 59:
+        return None
+    return hour, minute
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_clock_12h(text):
+    """
+    Parsea una hora en formato de 12 horas ('8:00 PM', '11:30am') sin strptime.
+    Devuelve (hora, minuto) en formato 24 horas o None.
+    """
+    value = text.strip().upper()
+    meridiem = value[-2:]
+    if meridiem not in ("AM", "PM"):
+        return None
+    parts = value[:-2].strip().split(":")
+    if len(parts) != 2:
+        return None
+    hours, minutes = parts
+    if not (hours.isdigit() and minutes.isdigit()) or len(hours) > 2 or len(minutes) != 2:
+        return None
+    hour, minute = int(hours), int(minutes)
+    if not 1 <= hour <= 12 or minute > 59:
+        return None
+    hour %= 12
+    if meridiem == "PM":
+        hour += 12
+    return hour, minute
+
+def combine_date_time(fecha, clock):
+    """Combina una fecha con (hora, minuto)"""
+    return datetime(fecha.year, fecha.month, fecha.day, clock[0], clock[1])
+
+def format_xmltv(dt):
+    """Formatea un datetime como 'YYYYMMDDHHMMSS' (equivalente a strftime, más rápido)"""
+    return f"{dt.year:04d}{dt.month:02d}{dt.day:02d}{dt.hour:02d}{dt.minute:02d}{dt.second:02d}"
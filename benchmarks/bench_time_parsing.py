@@ -0,0 +1,98 @@
+"""
+Micro-benchmark del parseo de horas: implementación anterior (strptime) frente
+a los parsers con caché de Scrapers/time_parsing.py, sobre una semana de programas.
+
+Uso: python -m benchmarks.bench_time_parsing [canales] [filas_por_día]
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from Guide.xmltv import validate_program_data
+from Scrapers.time_parsing import parse_clock_24h, parse_clock_12h, combine_date_time, format_xmltv
+
+# --- Implementaciones anteriores (copiadas tal cual de los scrapers) ---
+
+def legacy_gatotv(fecha, text):
+    return datetime.combine(fecha, datetime.strptime(text, "%H:%M").time())
+
+def legacy_mitv(fecha, text):
+    parts = text.strip().split(":")
+    hours, minutes = int(parts[0]), int(parts[1])
+    time_obj = datetime.strptime(f"{hours:02d}:{minutes:02d}", "%H:%M")
+    return datetime.combine(fecha, time_obj.time())
+
+def legacy_ontvtonight(fecha, text):
+    return datetime.combine(fecha, datetime.strptime(text.strip(), "%I:%M %p").time())
+
+def legacy_validate(programa):
+    try:
+        datetime.strptime(programa['start'][:14], "%Y%m%d%H%M%S")
+        datetime.strptime(programa['stop'][:14], "%Y%m%d%H%M%S")
+    except ValueError as e:
+        return False, f"Formato de fecha inválido: {e}"
+    return True, "OK"
+
+# --- Implementaciones nuevas ---
+
+def fast_24h(fecha, text):
+    return combine_date_time(fecha, parse_clock_24h(text))
+
+def fast_12h(fecha, text):
+    return combine_date_time(fecha, parse_clock_12h(text))
+
+def build_rows(channels, rows_per_day):
+    """Genera (fecha, 'HH:MM', 'H:MM AM/PM') para una semana de programación"""
+    rng = random.Random(42)
+    today = datetime(2024, 1, 1).date()
+    rows = []
+    for _ in range(channels):
+        for day in range(7):
+            fecha = today + timedelta(days=day)
+            for _ in range(rows_per_day):
+                hour, minute = rng.randrange(24), rng.choice((0, 15, 30, 45))
+                clock_12 = f"{hour % 12 or 12}:{minute:02d} {'PM' if hour >= 12 else 'AM'}"
+                rows.append((fecha, f"{hour:02d}:{minute:02d}", clock_12))
+    return rows
+
+def timed(func, items):
+    start = time.perf_counter()
+    for item in items:
+        func(*item)
+    return time.perf_counter() - start
+
+def report(name, old, new):
+    print(f"{name:<22} anterior {old * 1000:8.1f} ms   nuevo {new * 1000:8.1f} ms   x{old / new:5.1f}")
+
+def main(channels=200, rows_per_day=30):
+    rows = build_rows(channels, rows_per_day)
+    print(f"Filas: {len(rows)} ({channels} canales x 7 días x {rows_per_day} filas)\n")
+
+    rows_24 = [(fecha, clock) for fecha, clock, _ in rows]
+    rows_12 = [(fecha, clock) for fecha, _, clock in rows]
+    for name, legacy, fast, items in (
+        ("GatoTV (HH:MM)", legacy_gatotv, fast_24h, rows_24),
+        ("MiTV (HH:MM)", legacy_mitv, fast_24h, rows_24),
+        ("OnTVTonight (12h)", legacy_ontvtonight, fast_12h, rows_12),
+    ):
+        parse_clock_24h.cache_clear()
+        parse_clock_12h.cache_clear()
+        report(name, timed(legacy, items), timed(fast, items))
+
+    programs = []
+    for fecha, clock, _ in rows:
+        start = fast_24h(fecha, clock)
+        programs.append(({
+            "title": "Programa", "channel_id": "canal",
+            "start": format_xmltv(start),
+            "stop": format_xmltv(start + timedelta(minutes=30))
+        },))
+    report("validate_program_data", timed(legacy_validate, programs), timed(validate_program_data, programs))
+
+    datetimes = [(fast_24h(fecha, clock),) for fecha, clock, _ in rows]
+    report("strftime -> format", timed(lambda dt: dt.strftime("%Y%m%d%H%M%S"), datetimes),
+           timed(format_xmltv, datetimes))
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,131 @@
+"""
+Benchmark de serialización XMLTV: generate_xml_structure anterior (concatenación
+de str + escapar_xml por campo) frente a write_xmltv (bytes UTF-8 con caché de
+textos escapados). Reporta MB/s de XMLTV producido (sin comprimir y con gzip) y el pico de memoria.
+
+Uso: python -m benchmarks.bench_xml_serialization [canales] [programas_por_canal]
+"""
+import gzip
+import io
+import logging
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from Guide.xmltv import escapar_xml, parse_xmltv_digits, write_xmltv
+
+# --- Implementación anterior (copiada de generate_xml_structure) ---
+
+def legacy_validate(programa):
+    """validate_program_data sin el caché de marcas de tiempo"""
+    for field in ('title', 'start', 'stop', 'channel_id'):
+        if not programa.get(field):
+            return False, f"Campo requerido '{field}' faltante o vacío"
+    if len(programa['title']) > 200:
+        programa['title'] = programa['title'][:197] + "..."
+    if programa.get('description') and len(programa['description']) > 500:
+        programa['description'] = programa['description'][:497] + "..."
+    for field in ('start', 'stop'):
+        if parse_xmltv_digits.__wrapped__(programa[field]) is None:
+            return False, f"Formato de fecha inválido: '{programa[field]}'"
+    return True, "OK"
+
+def legacy_generate(channels, all_programs):
+    xml_header = '<?xml version="1.0" encoding="UTF-8"?>\n<tv generator-info-name="JhonVT-EPG-Generator">\n'
+    channel_xml = "".join(
+        f'  <channel id="{ch["id"]}">\n'
+        f'    <display-name>{escapar_xml(ch["nombre"])}</display-name>\n'
+        + (f'    <icon src="{escapar_xml(ch["logo"])}"/>\n' if ch.get("logo") else "")
+        + '  </channel>\n'
+        for ch in channels
+    )
+    program_xml = ""
+    for programa in all_programs:
+        is_valid, error_msg = legacy_validate(programa)
+        if not is_valid:
+            continue
+        program_xml += (
+            f'  <programme start="{programa["start"]}" stop="{programa["stop"]}" '
+            f'channel="{programa["channel_id"]}">\n'
+            f'    <title lang="es">{escapar_xml(programa["title"])}</title>\n'
+        )
+        if programa.get("description"):
+            program_xml += f'    <desc lang="es">{escapar_xml(programa["description"])}</desc>\n'
+        if programa.get("image"):
+            program_xml += f'    <icon src="{escapar_xml(programa["image"])}"/>\n'
+        program_xml += '  </programme>\n'
+    return xml_header + channel_xml + program_xml + '</tv>'
+
+def build_guide(channel_count, per_channel):
+    """Guía sintética con títulos de series repetidos, logos e imágenes compartidas"""
+    rng = random.Random(7)
+    series = [f"Serie {n} & Compañía" if n % 10 == 0 else f"Noticias {n}" for n in range(300)]
+    channels, programs = [], []
+    base = datetime(2024, 1, 1)
+    for c in range(channel_count):
+        channel_id = f"canal{c}.mx"
+        channels.append({"id": channel_id, "nombre": f"Canal {c}",
+                         "logo": f"https://img.example.com/logos/{c}.png"})
+        start = base
+        for p in range(per_channel):
+            stop = start + timedelta(minutes=rng.choice((30, 60, 90)))
+            title = rng.choice(series)
+            programs.append({
+                "channel_id": channel_id,
+                "start": start.strftime("%Y%m%d%H%M%S"),
+                "stop": stop.strftime("%Y%m%d%H%M%S"),
+                "title": title,
+                "description": f"Episodio {p} de {title}: una descripción con <detalles> del capítulo.",
+                "image": f"https://img.example.com/series/{series.index(title)}.jpg"
+            })
+            start = stop
+    return channels, programs
+
+def measure(label, func):
+    start = time.perf_counter()
+    size = func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<30} {elapsed * 1000:8.1f} ms  {size / 1e6 / elapsed:7.1f} MB/s  "
+          f"pico {peak / 1e6:6.1f} MB")
+    return elapsed
+
+def main(channel_count=200, per_channel=250):
+    logging.disable(logging.INFO)
+    channels, programs = build_guide(channel_count, per_channel)
+    expected = legacy_generate(channels, programs).encode("utf-8")
+    buffer = io.BytesIO()
+    write_xmltv(buffer, channels, programs)
+    assert buffer.getvalue() == expected, "La salida no coincide con la implementación anterior"
+    print(f"Programas: {len(programs)}  XMLTV: {len(expected) / 1e6:.1f} MB\n")
+
+    def legacy_plain():
+        return len(legacy_generate(channels, programs).encode("utf-8"))
+
+    def new_plain():
+        return write_xmltv(io.BytesIO(), channels, programs).bytes_written
+
+    def legacy_gzip():
+        content = legacy_generate(channels, programs)
+        with gzip.GzipFile(fileobj=io.BytesIO(), mode="wb") as f:
+            f.write(content.encode("utf-8"))
+        return len(content.encode("utf-8"))
+
+    def new_gzip():
+        with gzip.GzipFile(fileobj=io.BytesIO(), mode="wb") as f:
+            return write_xmltv(f, channels, programs).bytes_written
+
+    old = measure("anterior (str)", legacy_plain)
+    new = measure("write_xmltv (bytes)", new_plain)
+    print(f"{'':<30} x{old / new:.1f}\n")
+    old = measure("anterior + gzip", legacy_gzip)
+    new = measure("write_xmltv + gzip", new_gzip)
+    print(f"{'':<30} x{old / new:.1f}")
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
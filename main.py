@@ -1,78 +1,56 @@
-import json
+import asyncio
 import gzip
 from datetime import datetime, timedelta, timezone
-from logging.handlers import RotatingFileHandler
 import logging
+import os
 import sys
+import time
+import argparse
+from collections import Counter
 from Scrapers.gatotv_scraper import GatoTVScraper
 from Scrapers.ontvtonight_scraper import OnTVTonightScraper
 from Scrapers.channel_discovery import auto_discover_channels_if_needed
+from Scrapers.async_http import async_available, create_session, DEFAULT_MAX_CONNECTIONS
+from Guide.program_store import ProgramStore
+from Guide.snapshot import Snapshot, SnapshotError
+from Guide.diff import diff_guides, write_delta
+from Guide.xmltv_import import import_xmltv
+from Guide.checkpoint import CheckpointJournal
+from Guide.assets import AssetCache, asset_urls
+from Guide.config import CONFIG_FILE, ConfigError, load_runtime_config
+from Guide.scheduler import schedule_jobs
+from Guide.planner import plan_jobs, plan_report, print_plan
+from Guide.health import HEALTH_FILE, ChannelHealth
+from Guide.memory import MemoryWatchdog, PressureGate
+from Guide.sharding import merge_shard_stores, parse_shard, select_shard, shard_files, shard_path, shard_settings
+from Guide.logging_setup import setup_logging as configure_logging
+from Guide.metrics import METRICS_FILE, append_run, cost_model, load_history, log_run_summary
+from Guide.xmltv import escapar_xml, validate_program_data, chunk_programs, generate_xml_structure, write_xmltv, XMLTVWriter
 
-def setup_logging():
-    """Configura el sistema de logging con rotación de archivos"""
-    log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    
-    # Configurar el manejador de archivos con rotación
-    file_handler = RotatingFileHandler(
-        'epg_generator.log',
-        maxBytes=5*1024*1024,  # 5MB
-        backupCount=3,
-        encoding='utf-8'
-    )
-    file_handler.setFormatter(log_formatter)
-    
-    # Configurar el manejador de consola
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(log_formatter)
-    
-    # Configurar el logger raíz
-    root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
-    
-    return root_logger
+# Fuentes disponibles (clave "scraper" de cada canal en config.json)
+SCRAPERS = {
+    "gatotv": GatoTVScraper,
+    "ontvtonight": OnTVTonightScraper
+}
+
+def setup_logging(settings=None):
+    """
+    Configura el logging según settings.logging de config.json: cola asíncrona,
+    archivo rotativo (texto o JSON) y muestreo por etapa (ver Guide/logging_setup.py)
+    """
+    if settings is None:
+        settings = load_config().settings
+    return configure_logging(settings.get("logging"))
 
 def load_config():
-    """Carga y valida la configuración"""
+    """Carga, valida y compila config.json (ver Guide/config.py); termina si no es válido"""
     try:
-        with open("config.json", "r", encoding="utf-8") as f:
-            config = json.load(f)
-        
-        # Validar campos requeridos
-        required_fields = ["settings", "channels"]
-        for field in required_fields:
-            if field not in config:
-                raise ValueError(f"Campo requerido '{field}' faltante en config.json")
-        
-        # Validar configuración de timezone
-        if not isinstance(config["settings"].get("timezone_offset_hours"), (int, float)):
-            config["settings"]["timezone_offset_hours"] = 6
-            logging.warning("Usando timezone_offset_hours por defecto: 6")
-            
-        return config
-        
-    except FileNotFoundError:
-        logging.error("ERROR: El archivo config.json no se encontró")
+        return load_runtime_config(CONFIG_FILE, known_scrapers=SCRAPERS)
+    except ConfigError as e:
+        logging.error("ERROR: Configuración inválida en %s:", e.path)
+        for error in e.errors:
+            logging.error("  - %s", error)
         sys.exit(1)
-    except json.JSONDecodeError as e:
-        logging.error(f"ERROR: El archivo config.json tiene un formato inválido: {e}")
-        sys.exit(1)
-    except Exception as e:
-        logging.error(f"ERROR inesperado cargando configuración: {e}")
-        sys.exit(1)
-
-def escapar_xml(texto):
-    """Escapa caracteres especiales para que el XML sea válido."""
-    if not texto:
-        return ""
-    return (
-        texto.replace("&", "&amp;")
-        .replace("<", "&lt;")
-        .replace(">", "&gt;")
-        .replace('"', "&quot;")
-        .replace("'", "&apos;")
-    )
 
 def calculate_days_to_scrape(timezone_offset_hours, settings):
     """Calcula cuántos días scraper basado en el día actual y configuración."""
@@ -85,203 +63,530 @@ def calculate_days_to_scrape(timezone_offset_hours, settings):
     day_name = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"][current_weekday]
     
     if current_weekday == 5:  # Sábado
-        logging.info(f"Es sábado ({local_now.strftime('%Y-%m-%d')}). Modo fin de semana.")
+        logging.info("Es sábado (%s). Modo fin de semana.", local_now.strftime('%Y-%m-%d'))
         return 2
     elif current_weekday == 6:  # Domingo
-        logging.info(f"Es domingo ({local_now.strftime('%Y-%m-%d')}). Solo domingo.")
+        logging.info("Es domingo (%s). Solo domingo.", local_now.strftime('%Y-%m-%d'))
         return 1
     else:
-        logging.info(f"Es {day_name} ({local_now.strftime('%Y-%m-%d')}). Modo normal.")
+        logging.info("Es %s (%s). Modo normal.", day_name, local_now.strftime('%Y-%m-%d'))
         return None
 
-def validate_program_data(programa):
-    """Valida que un programa tenga los campos requeridos y formatos correctos"""
-    required_fields = ['title', 'start', 'stop', 'channel_id']
-    
-    # Validar campos requeridos
-    for field in required_fields:
-        if not programa.get(field):
-            return False, f"Campo requerido '{field}' faltante o vacío"
-    
-    # Validar longitud máxima de título y descripción
-    if len(programa['title']) > 200:
-        programa['title'] = programa['title'][:197] + "..."
-    
-    if programa.get('description') and len(programa['description']) > 500:
-        programa['description'] = programa['description'][:497] + "..."
+def seed_store(store, settings, channel_ids):
+    """
+    Siembra el almacén antes de scrapear: con la guía de la ejecución anterior
+    (seed_from_previous) y con guías XMLTV externas (import_guides).
+    Devuelve True si se cargó algún programa.
+    """
+    offset_hours = settings.get("timezone_offset_hours", 6)
+    if settings.get("seed_from_previous", False):
+        store_file = settings.get("store_file", "epg_store.bin")
+        output_file = settings.get("output_file", "epgpersonal.xml.gz")
+        try:
+            # La instantánea binaria es mucho más rápida que re-parsear el XML
+            previous = ProgramStore.load(store_file)
+            for channel_id in channel_ids:
+                if channel_id in previous.channels:
+                    store.add_channel(previous.channels[channel_id])
+                    store.add_programs(channel_id, previous.get_programs(channel_id))
+            logging.info("Guía previa cargada desde %s: %s programas", store_file, len(store))
+        except SnapshotError:
+            import_xmltv(output_file, store, channel_ids, offset_hours)
+
+    for entry in settings.get("import_guides", []):
+        if isinstance(entry, str):
+            entry = {"path": entry}
+        try:
+            import_xmltv(entry["path"], store, entry.get("channels"), offset_hours)
+        except Exception as e:
+            logging.error("Error importando guía externa %s: %s", entry.get('path'), e)
+
+    if not len(store):
+        return False
+
+    # Descartar programas que ya terminaron
+    today_local = (datetime.now(timezone.utc) - timedelta(hours=offset_hours)).date()
+    removed = store.prune(today_local.strftime("%Y%m%d000000"))
+    if removed:
+        logging.info("Descartados %s programas pasados de guías previas", removed)
+    return True
+
+def report_changes(store, settings):
+    """
+    Compara la guía nueva con la de la ejecución anterior, registra el resumen
+    y escribe el archivo delta si está configurado (delta_file).
+    """
+    store_file = settings.get("store_file", "epg_store.bin")
+    output_file = settings.get("output_file", "epgpersonal.xml.gz")
     
-    # Validar formato de fechas
     try:
-        datetime.strptime(programa['start'][:14], "%Y%m%d%H%M%S")
-        datetime.strptime(programa['stop'][:14], "%Y%m%d%H%M%S")
-    except ValueError as e:
-        return False, f"Formato de fecha inválido: {e}"
+        with Snapshot(store_file) as previous:
+            diff = diff_guides(previous, store)
+        base_path = store_file
+    except SnapshotError:
+        if not os.path.exists(output_file):
+            logging.info("Sin guía previa: no se calculan cambios")
+            return None
+        previous = ProgramStore()
+        import_xmltv(output_file, previous, offset_hours=settings.get("timezone_offset_hours", 6))
+        diff = diff_guides(previous, store)
+        base_path = output_file
+    
+    summary = diff.summary()
+    logging.info("Cambios respecto a la ejecución anterior: +%d -%d ~%d programas en %d canales",
+                 summary['added'], summary['removed'], summary['changed'], summary['channels_changed'])
     
-    return True, "OK"
+    delta_file = settings.get("delta_file")
+    if delta_file:
+        base_version = datetime.fromtimestamp(os.path.getmtime(base_path)).strftime("%Y%m%d%H%M%S")
+        try:
+            write_delta(delta_file, diff, base_version)
+        except Exception as e:
+            logging.error("Error guardando delta: %s", e)
+    return diff
 
-def chunk_programs(programs, chunk_size=1000):
-    """Procesa los programas en chunks para mejor manejo de memoria"""
-    for i in range(0, len(programs), chunk_size):
-        yield programs[i:i + chunk_size]
+def store_day(store, channel_id, programas_dia):
+    """Añade al almacén los programas de un día recién descargado"""
+    for prog in programas_dia:
+        prog['channel_id'] = channel_id
+    store.replace_span(channel_id, programas_dia)
+    return len(programas_dia)
 
-def generate_xml_structure(channels, all_programs):
-    """Genera la estructura XML del EPG con manejo optimizado de memoria"""
-    xml_header = '<?xml version="1.0" encoding="UTF-8"?>\n<tv generator-info-name="JhonVT-EPG-Generator">\n'
-    
-    # Generar canales
-    channel_xml = "".join(
-        f'  <channel id="{ch["id"]}">\n'
-        f'    <display-name>{escapar_xml(ch["nombre"])}</display-name>\n'
-        f'    {f"""<icon src="{escapar_xml(ch["logo"])}"/>\n""" if ch.get("logo") else ""}'
-        f'  </channel>\n'
-        for ch in channels
+async def fetch_jobs_async(jobs, settings, journal=None, deadline=None, on_result=None, watchdog=None):
+    """
+    Descarga todos los trabajos (canal, día) en un único event loop.
+    Los trabajos se lanzan en orden de prioridad, así que las conexiones libres
+    atienden primero a los más valiosos. El resultado de cada trabajo son sus
+    programas, la excepción si falló o None si se agotó el presupuesto de tiempo (deadline).
+    on_result(job, resultado): se llama en el orden de los trabajos en cuanto un
+    resultado y todos los anteriores están listos, sin retener las listas de
+    programas; sin él se devuelve la lista de resultados.
+    journal: CheckpointJournal donde registrar cada día en cuanto termina.
+    watchdog: MemoryWatchdog; con presión de memoria se reduce la concurrencia.
+    """
+    max_connections = settings.get("async_max_connections", DEFAULT_MAX_CONNECTIONS)
+    async with create_session(max_connections=max_connections) as session:
+        gate = PressureGate(watchdog, max_connections, max_connections // 4)
+        ready = {}
+        next_index = 0
+
+        async def fetch_job(index, job):
+            nonlocal next_index
+            try:
+                async with gate:
+                    if deadline is not None and time.monotonic() > deadline:
+                        result = None
+                    else:
+                        started = time.perf_counter()
+                        result = await job.scraper.afetch_programs(job.channel, dates=[job.fecha], session=session)
+                        job.elapsed = time.perf_counter() - started
+                if journal and result is not None:
+                    journal.record(job.channel["id"], job.fecha, result)
+            except Exception as e:
+                result = e
+            if on_result is None:
+                return result
+            ready[index] = result
+            while next_index in ready:
+                on_result(jobs[next_index], ready.pop(next_index))
+                next_index += 1
+            return None
+
+        return await asyncio.gather(*(fetch_job(i, job) for i, job in enumerate(jobs)))
+
+def mirror_assets(store, settings):
+    """Descarga o revalida las imágenes de la guía y devuelve el mapa URL remota -> local"""
+    asset_settings = settings.get("assets", {})
+    cache = AssetCache(
+        asset_settings.get("dir", "epg_assets"),
+        base_url=asset_settings["base_url"],
+        ttl_hours=asset_settings.get("ttl_hours", 168),
+        max_size=asset_settings.get("max_size", 256),
+        workers=asset_settings.get("workers", 8),
+        headers=settings.get("headers"),
+        timeout=settings.get("timeout", 15)
     )
-    
-    # Procesar programas en chunks
-    program_xml = ""
-    valid_programs = 0
-    invalid_programs = 0
-    
-    for chunk in chunk_programs(all_programs):
-        for programa in chunk:
-            is_valid, error_msg = validate_program_data(programa)
-            if not is_valid:
-                logging.warning(f"Programa inválido: {error_msg}")
-                invalid_programs += 1
-                continue
-                
-            program_xml += (
-                f'  <programme start="{programa["start"]}" stop="{programa["stop"]}" '
-                f'channel="{programa["channel_id"]}">\n'
-                f'    <title lang="es">{escapar_xml(programa["title"])}</title>\n'
-            )
-            
-            if programa.get("description"):
-                program_xml += f'    <desc lang="es">{escapar_xml(programa["description"])}</desc>\n'
-            if programa.get("image"):
-                program_xml += f'    <icon src="{escapar_xml(programa["image"])}"/>\n'
-            
-            program_xml += '  </programme>\n'
-            valid_programs += 1
-    
-    logging.info(f"Programas procesados - Válidos: {valid_programs}, Inválidos: {invalid_programs}")
-    
-    return xml_header + channel_xml + program_xml + '</tv>'
+    urls = asset_urls(list(store.channels.values()), store.iter_programs())
+    icon_map = cache.mirror(urls)
+    removed = cache.prune(urls)
+    if removed:
+        logging.info("[Assets] %s imagen(es) sin uso eliminadas", removed)
+    return icon_map
 
-def main():
-    """Función principal que orquesta la generación del EPG."""
-    start_time = datetime.now()
-    logger = setup_logging()
-    logging.info("="*60)
-    logging.info("INICIANDO GENERACIÓN DE EPG")
-    logging.info("="*60)
-    
-    # Cargar configuración
-    config = load_config()
-    
-    # Auto-descubrir canales si es necesario
+def write_outputs(store, settings):
+    """
+    Escribe los resultados de la guía completa: cambios respecto a la anterior,
+    instantánea binaria, copia de imágenes (opcional) y el XMLTV comprimido.
+    Devuelve la ruta del XMLTV; los errores al escribirlo se propagan.
+    """
+    # Comparar con la ejecución anterior antes de sobrescribirla
     try:
-        auto_discover_channels_if_needed(min_channels=3)
-        config = load_config()  # Recargar configuración
+        report_changes(store, settings)
     except Exception as e:
-        logging.warning(f"WARNING: Auto-descubrimiento falló: {e}")
+        logging.warning("No se pudieron calcular los cambios: %s", e)
 
-    settings = config.get("settings", {})
-    timezone_offset_hours = settings.get("timezone_offset_hours", 6)
-    
-    # Mostrar configuración
-    logging.info(f"Configuración actual:")
-    logging.info(f"  * Zona horaria: UTC-{timezone_offset_hours}")
-    logging.info(f"  * Canales configurados: {len(config.get('channels', []))}")
-    logging.info(f"  * Modo semana completa: {settings.get('force_full_week', False)}")
-    
-    # Calcular días a scrapear
-    weekend_days = calculate_days_to_scrape(timezone_offset_hours, settings)
-    weekend_settings = settings.copy()
+    # Guardar instantánea binaria del almacén (servidor, consultas y reinicios rápidos)
+    try:
+        store.save(settings.get("store_file", "epg_store.bin"))
+    except Exception as e:
+        logging.error("Error guardando almacén de programas: %s", e)
+
+    # Copia local de logos e imágenes (opcional): la guía apunta a /assets/ del servidor
+    icon_map = None
+    asset_settings = settings.get("assets", {})
+    if asset_settings.get("enabled", False):
+        try:
+            icon_map = mirror_assets(store, settings)
+        except Exception as e:
+            logging.warning("[Assets] No se pudieron copiar las imágenes, se usan las URLs originales: %s", e)
+
+    # Generar y guardar XML
+    logging.info("Generando EPG...")
+    output_file = settings.get("output_file", "epgpersonal.xml.gz")
+    # Escritura atómica: el servidor nunca sirve un archivo a medio escribir
+    tmp_output = f"{output_file}.tmp"
+    # Los bytes UTF-8 se escriben directamente en el flujo gzip, sin armar el XML en memoria
+    with gzip.open(tmp_output, "wb") as f:
+        write_xmltv(f, list(store.channels.values()), store.iter_programs(), pool=store.pool, icon_map=icon_map)
+    os.replace(tmp_output, output_file)
+    return output_file
+
+def merge_shards(count):
+    """
+    Combina los almacenes parciales de 'python main.py --shard i/N' en la guía
+    completa. Los canales de un shard que falte conservan la guía previa.
+    """
+    config = load_config()
+    settings = config.settings
+    setup_logging(settings)
+
+    store = ProgramStore()
+    for channel in config.channels:
+        store.add_channel(channel)
+    seed_store(store, settings, [ch.id for ch in config.channels])
+
+    store_file = settings.get("store_file", "epg_store.bin")
+    merged, missing = merge_shard_stores(store, store_file, count, ProgramStore.load)
+    if not merged:
+        logging.error("[Shards] No hay almacenes parciales que combinar (%s...)", shard_path(store_file, (1, count)))
+        return None
+
+    output_file = write_outputs(store, settings)
+    # Ya incorporados: si un shard falla en la próxima ejecución no se reutilizan datos viejos
+    for path in merged:
+        os.remove(path)
+    logging.info("[Shards] Guía combinada: %s/%s shards, %s programas en %s", len(merged), count, len(store), output_file)
+    if missing:
+        logging.warning("[Shards] Shards sin almacén parcial: %s (se usó la guía previa)", ', '.join(map(str, missing)))
+    return output_file
+
+def load_health(settings):
+    """Registro de salud de los canales (None si channel_health está desactivado)"""
+    if not settings.get("channel_health", True):
+        return None
+    return ChannelHealth(settings.get("health_file", HEALTH_FILE))
+
+def build_run_settings(settings):
+    """Ajustes de la ejecución con los días a scrapear según el día de la semana"""
+    weekend_days = calculate_days_to_scrape(settings["timezone_offset_hours"], settings)
+    run_settings = dict(settings)
     if weekend_days:
-        weekend_settings.update({
+        run_settings.update({
             "days_to_scrape": weekend_days,
             "is_weekend_mode": weekend_days == 2,
             "is_full_week_mode": weekend_days == 7
         })
     else:
-        weekend_settings.update({
+        run_settings.update({
             "is_weekend_mode": False,
             "is_full_week_mode": False
         })
+    return run_settings
+
+def select_engine(settings):
+    """Motor de descarga configurado ('sync' si el async no está disponible)"""
+    engine = settings.get("engine", "sync")
+    if engine == "async" and not async_available():
+        logging.warning("Motor async no disponible (falta 'aiohttp'); usando motor sync")
+        engine = "sync"
+    return engine
+
+def checkpoint_run_id(settings):
+    """Identificador de ejecución del diario de progreso (fecha local)"""
+    offset_hours = settings["timezone_offset_hours"]
+    return (datetime.now(timezone.utc) - timedelta(hours=offset_hours)).date().isoformat()
+
+def dry_run(resume=False, as_json=False, shard=None):
+    """
+    Muestra el plan de descargas de la próxima ejecución (canal, URL, día) y su
+    coste estimado según el historial de métricas, sin acceder a la red.
+    shard: (i, N) para planificar solo los canales de ese shard con su diario y salud.
+    """
+    config = load_config()
+    settings = shard_settings(config.settings, shard) if shard else config.settings
+    run_settings = build_run_settings(settings)
+    channels = select_shard(config.channels, shard) if shard else config.channels
+
+    store = ProgramStore()
+    scrapers = {key: scraper_class(run_settings, pool=store.pool) for key, scraper_class in SCRAPERS.items()}
+    for channel in channels:
+        store.add_channel(channel)
+    seeded = seed_store(store, settings, [ch.id for ch in channels])
+
+    completed_days = {}
+    if resume and settings.get("checkpoint", True):
+        journal = CheckpointJournal(settings.get("checkpoint_file", "epg_checkpoint.jsonl"))
+        completed_days = journal.read(checkpoint_run_id(settings))
+
+    plan = plan_jobs(channels, scrapers, store, seeded, completed_days, load_health(settings))
+    jobs = schedule_jobs(plan.jobs, store)
+    # El coste por petición no depende del shard: cuentan el historial sin shards y el de todos los shards
+    metrics_file = config.settings.get("metrics_file", METRICS_FILE)
+    history = [run for path in [metrics_file] + shard_files(metrics_file) for run in load_history(path)]
+    model = cost_model(history)
+    report = plan_report(plan, jobs, model, select_engine(settings),
+                         settings.get("async_max_connections", DEFAULT_MAX_CONNECTIONS),
+                         settings.get("time_budget_minutes"))
+    report["invalid_channels"] = [{"position": i, "reason": reason} for i, _, reason in config.invalid_channels]
+    print_plan(report, as_json=as_json)
+    return report
+
+def main(resume=False, shard=None):
+    """
+    Función principal que orquesta la generación del EPG.
+    resume: reanudar una ejecución interrumpida a partir del diario de progreso.
+    shard: (i, N) para descargar solo la parte i de N de los canales y guardar
+    un almacén parcial (ver Guide/sharding.py y merge_shards).
+    """
+    start_time = datetime.now()
+    config = load_config()
+    logger = setup_logging(shard_settings(config.settings, shard) if shard else config.settings)
+    logging.info("="*60)
+    logging.info("INICIANDO GENERACIÓN DE EPG" + (f" (shard {shard[0]}/{shard[1]})" if shard else ""))
+    logging.info("="*60)
+    
+    # Auto-descubrir canales si es necesario (no en shards: todos comparten config.json)
+    if shard is None:
+        try:
+            auto_discover_channels_if_needed(min_channels=3, current_channels=len(config.channels))
+            config = load_config()  # Solo se recompila si el descubrimiento modificó el archivo
+        except Exception as e:
+            logging.warning("WARNING: Auto-descubrimiento falló: %s", e)
+
+    settings = shard_settings(config.settings, shard) if shard else config.settings
+    timezone_offset_hours = settings["timezone_offset_hours"]
+    
+    # Mostrar configuración
+    logging.info("Configuración actual:")
+    logging.info("  * Zona horaria: UTC-%s", timezone_offset_hours)
+    logging.info("  * Canales configurados: %s", len(config.channels) + len(config.invalid_channels))
+    logging.info("  * Modo semana completa: %s", settings.get('force_full_week', False))
+    
+    # Calcular días a scrapear
+    weekend_settings = build_run_settings(settings)
     
-    # Inicializar scrapers
-    scrapers = {
-        "gatotv": GatoTVScraper(weekend_settings),
-        "ontvtonight": OnTVTonightScraper(weekend_settings)
-    }
+    # Inicializar scrapers (comparten el pool de textos del almacén)
+    store = ProgramStore()
+    scrapers = {key: scraper_class(weekend_settings, pool=store.pool) for key, scraper_class in SCRAPERS.items()}
 
-    all_programs = []
     processed_channels = []
     failed_channels = []
-    channels = config.get("channels", [])
+    channels = config.channels
+    if shard:
+        channels = select_shard(channels, shard)
+        logging.info("Shard %s/%s: %s de %s canales", shard[0], shard[1], len(channels), len(config.channels))
+    
+    # Los canales inválidos se detectan al compilar la configuración, antes de descargar nada
+    for i, channel, reason in config.invalid_channels:
+        logging.warning("Canal %s inválido (%s): %s", i, reason, channel)
+        failed_channels.append((channel.get("nombre") if isinstance(channel, dict) else None) or f"Canal {i}")
     
     if not channels:
         logging.error("ERROR: No hay canales configurados")
         return
     
-    logging.info(f"Procesando {len(channels)} canales...")
+    # Partir de guías existentes (ejecución anterior y/o guías externas)
+    seeded = seed_store(store, settings, [ch.id for ch in channels])
     
-    # Procesar cada canal
-    for i, channel in enumerate(channels, 1):
-        channel_id = channel.get("id")
-        channel_name = channel.get("nombre")
-        scraper_key = channel.get("scraper")
-
-        if not all([channel_id, channel_name, scraper_key]):
-            logging.warning(f"Canal {i} inválido: {channel}")
-            failed_channels.append(channel_name or f"Canal {i}")
-            continue
-
+    engine = select_engine(settings)
+    
+    # Diario de progreso: cada día descargado queda registrado para poder reanudar
+    journal = None
+    completed_days = {}
+    if settings.get("checkpoint", True):
+        journal = CheckpointJournal(settings.get("checkpoint_file", "epg_checkpoint.jsonl"))
+        completed_days = journal.start(checkpoint_run_id(settings), resume=resume)
+    elif resume:
+        logging.warning("--resume requiere \"checkpoint\": true; se descarga todo")
+    
+    logging.info("Procesando %s canales (motor %s)...", len(channels), engine)
+    
+    # Planificar cada canal: días pendientes como trabajos (canal, día)
+    for channel in channels:
         processed_channels.append(channel)
-        scraper = scrapers.get(scraper_key)
-        
-        if not scraper:
-            logging.error(f"Scraper '{scraper_key}' no encontrado para '{channel_name}'")
-            failed_channels.append(channel_name)
-            continue
-            
-        mode_text = "SEMANA COMPLETA" if weekend_settings.get("is_full_week_mode") else \
-                   "FIN DE SEMANA" if weekend_settings.get("is_weekend_mode") else "NORMAL"
-        
-        logging.info(f"[{i}/{len(channels)}] Procesando '{channel_name}' ({mode_text})")
-        
-        try:
-            programas_canal = scraper.fetch_programs(channel)
-            
-            # Guardar datos crudos para debug
-            raw_filename = f"d:\\jhonv\\EPG\\{scraper_key}_{channel_id}_raw.json"
+        store.add_channel(channel)
+    health = load_health(settings)
+    plan = plan_jobs(channels, scrapers, store, seeded, completed_days, health)
+    derived_channels = plan.derived
+    totals = {channel.id: 0 for channel in channels if not channel.derived_from}
+    for channel, _, programas_dia in plan.restored:
+        totals[channel.id] += store_day(store, channel.id, programas_dia)
+    for channel, e in plan.errors:
+        logging.error("Error en '%s': %s", channel.nombre, e)
+        failed_channels.append(channel.nombre)
+    if plan.skipped:
+        logging.info("[Salud] %d canal(es) en espera por fallos repetidos: %s",
+                     len(plan.skipped), ', '.join(ch.nombre for ch in plan.skipped))
+    if plan.probes:
+        logging.info("[Salud] %s canal(es) se sondean con un solo día", len(plan.probes))
+
+    # Lo más valioso primero: canales con más peso, hoy antes que mañana, huecos antes que refrescos
+    jobs = schedule_jobs(plan.jobs, store)
+    budget = settings.get("time_budget_minutes")
+    deadline = time.monotonic() + budget * 60 if budget else None
+    mode_text = "SEMANA COMPLETA" if weekend_settings.get("is_full_week_mode") else \
+               "FIN DE SEMANA" if weekend_settings.get("is_weekend_mode") else "NORMAL"
+    logging.info("%s páginas de día por descargar (%s)", len(jobs), mode_text)
+
+    # Presupuesto de memoria: canales completos a disco y menos concurrencia cerca del límite
+    watchdog = None
+    memory_budget = settings.get("memory_budget_mb")
+    if memory_budget:
+        watchdog = MemoryWatchdog(memory_budget * 1024 * 1024).start()
+        store.enable_spill(settings.get("spill_dir"))
+
+    # Cada resultado se aplica al almacén en el orden de los trabajos y se suelta
+    remaining = Counter(job.channel["id"] for job in jobs)
+    completed_channels = []
+    outcomes = {}   # channel_id -> [días con programas, páginas, segundos, último error]
+    skipped = 0
+
+    def apply_result(job, result):
+        nonlocal skipped
+        channel_id, channel_name = job.channel["id"], job.channel["nombre"]
+        if result is None:
+            skipped += 1
+        else:
+            outcome = outcomes.setdefault(channel_id, [0, 0, 0.0, None])
+            outcome[1] += 1
+            outcome[2] += job.elapsed
+            if isinstance(result, Exception):
+                outcome[3] = str(result)
+                logging.error("Error en '%s' (%s): %s", channel_name, job.fecha, result)
+                if channel_name not in failed_channels:
+                    failed_channels.append(channel_name)
+            elif result:
+                outcome[0] += 1
+                totals[channel_id] += store_day(store, channel_id, result)
+            else:
+                outcome[3] = f"sin programas ({job.fecha})"
+        remaining[channel_id] -= 1
+        if not remaining[channel_id]:
+            completed_channels.append(channel_id)
+        if watchdog is not None and watchdog.over_budget and completed_channels:
+            spilled = store.spill(completed_channels)
+            logging.debug("[Memoria] %d canales (%d programas) volcados a disco", len(completed_channels), spilled)
+            completed_channels.clear()
+
+    def fetch_all(job_list):
+        if engine == "async":
+            asyncio.run(fetch_jobs_async(job_list, settings, journal, deadline, on_result=apply_result, watchdog=watchdog))
+            return
+        for n, job in enumerate(job_list, 1):
+            if deadline is not None and time.monotonic() > deadline:
+                for pending_job in job_list[n - 1:]:
+                    apply_result(pending_job, None)
+                break
+            logging.info("[Descarga] %d/%d '%s' %s (prioridad %.2f)", n, len(job_list), job.channel["nombre"], job.fecha, job.priority)
+            started = time.perf_counter()
             try:
-                with open(raw_filename, "w", encoding="utf-8") as f:
-                    json.dump(programas_canal, f, indent=4, ensure_ascii=False)
+                result = job.scraper.fetch_programs(job.channel, dates=[job.fecha])
             except Exception as e:
-                logging.error(f"Error guardando datos crudos: {e}")
-            
-            # Añadir channel_id a programas
-            for prog in programas_canal:
-                prog['channel_id'] = channel_id
-            
-            all_programs.extend(programas_canal)
-            logging.info(f"OK - {len(programas_canal)} programas para '{channel_name}'")
-            
-        except Exception as e:
-            logging.error(f"Error en '{channel_name}': {e}")
-            failed_channels.append(channel_name)
+                result = e
+            job.elapsed = time.perf_counter() - started
+            if journal and isinstance(result, list):
+                journal.record(job.channel["id"], job.fecha, result)
+            apply_result(job, result)
+
+    fetch_started = time.monotonic()
+    fetch_all(jobs)
+
+    # Canales que salían de su espera: el resto de días solo si el sondeo trajo programas
+    followups = [job for channel_id, deferred in plan.probes.items()
+                 if outcomes.get(channel_id, [0])[0] for job in deferred]
+    if followups:
+        logging.info("[Salud] Sondeo correcto en %d canal(es): %d días más por descargar",
+                     len({job.channel['id'] for job in followups}), len(followups))
+        remaining.update(job.channel["id"] for job in followups)
+        followups = schedule_jobs(followups, store)
+        jobs = jobs + followups
+        fetch_all(followups)
+
+    if health is not None:
+        for channel_id, (ok_days, pages, seconds, error) in outcomes.items():
+            entry = health.record(channel_id, ok_days > 0, pages, seconds, error)
+            if entry["retry_at"]:
+                logging.warning("[Salud] '%s' falló %d ejecuciones seguidas; en espera hasta %s",
+                                channel_id, entry['consecutive_failures'], entry['retry_at'])
+        health.prune(ch.id for ch in channels)
+        try:
+            health.save()
+        except OSError as e:
+            logging.warning("[Salud] No se pudo guardar %s: %s", health.path, e)
+
+    if skipped:
+        logging.warning("Presupuesto de tiempo agotado: %s página(s) de menor prioridad sin descargar", skipped)
+
+    # Historial de métricas: base de las estimaciones de --plan
+    log_run_summary(scrapers)
+    if jobs:
+        try:
+            append_run(settings.get("metrics_file", METRICS_FILE), scrapers, engine,
+                       time.monotonic() - fetch_started, len(jobs))
+        except OSError as e:
+            logging.warning("No se pudo guardar el historial de métricas: %s", e)
+
+    for channel in processed_channels:
+        if channel["id"] in totals and channel["nombre"] not in failed_channels:
+            logging.info("OK - %s programas para '%s'", totals[channel['id']], channel['nombre'])
+
+    # Canales derivados (timeshift): se generan del canal base sin ninguna descarga
+    for channel in derived_channels:
+        base_id = channel["derived_from"]
+        offset_hours = channel.get("offset_hours", 0)
+        if not store.get_programs(base_id):
+            logging.error("Canal derivado '%s': el canal base '%s' no tiene programas", channel['nombre'], base_id)
+            failed_channels.append(channel["nombre"])
             continue
+        count = store.derive_channel(channel["id"], base_id, offset_hours)
+        logging.info("OK - %s programas para '%s' (derivado de '%s', %+g h)", count, channel['nombre'], base_id, offset_hours)
+    if watchdog is not None and watchdog.over_budget:
+        store.spill(list(store.channels))
+
+    # Un shard solo guarda su almacén parcial; 'python main.py --merge N' genera la guía
+    if shard is not None:
+        partial_file = shard_path(settings.get("store_file", "epg_store.bin"), shard)
+        try:
+            store.save(partial_file)
+            if journal:
+                journal.close(completed=True)
+            logging.info("Shard %s/%s completado: %s programas en %s", shard[0], shard[1], len(store), partial_file)
+            if failed_channels:
+                logging.warning("Canales con error (%s): %s", len(failed_channels), ', '.join(failed_channels))
+        except Exception as e:
+            logging.error("Error guardando el almacén parcial %s: %s", partial_file, e)
+            if journal:
+                journal.close()
+        finally:
+            if watchdog is not None:
+                watchdog.stop()
+                store.close_spill()
+        return
 
-    # Generar y guardar XML
-    logging.info("Generando EPG...")
-    xml_content = generate_xml_structure(processed_channels, all_programs)
-    output_file = settings.get("output_file", "epgpersonal.xml.gz")
-    
     try:
-        with gzip.open(output_file, "wt", encoding="utf-8") as f:
-            f.write(xml_content)
+        output_file = write_outputs(store, settings)
+        if journal:
+            journal.close(completed=True)
         
         # Estadísticas finales
         end_time = datetime.now()
@@ -291,19 +596,141 @@ def main():
         logging.info("="*60)
         logging.info("GENERACIÓN EPG COMPLETADA")
         logging.info("="*60)
-        logging.info(f"Archivo: {output_file}")
-        logging.info(f"Modo: {mode_text}")
-        logging.info(f"Canales OK: {successful_channels}/{len(channels)}")
-        logging.info(f"Programas: {len(all_programs)}")
-        logging.info(f"Tiempo: {duration.total_seconds():.2f} segundos")
+        logging.info("Archivo: %s", output_file)
+        logging.info("Modo: %s", mode_text)
+        logging.info("Canales OK: %s/%s", successful_channels, len(channels) + len(config.invalid_channels))
+        logging.info("Programas: %s", len(store))
+        logging.info("Tiempo: %.2f segundos", duration.total_seconds())
+        pool_stats = store.pool.report()
+        logging.info("Textos: %d únicos (%.0f KB), %.0f KB ahorrados por deduplicación",
+                     pool_stats['unique'], pool_stats['bytes_unique'] / 1024, pool_stats['bytes_saved'] / 1024)
+        
+        if watchdog is not None:
+            logging.info("Memoria: pico %.0f MB de %s MB, %d programas volcados a disco",
+                         watchdog.peak / 1024 / 1024, memory_budget, store.programs.spilled_programs)
         
         if failed_channels:
-            logging.warning(f"Canales con error ({len(failed_channels)}): {', '.join(failed_channels)}")
+            logging.warning("Canales con error (%s): %s", len(failed_channels), ', '.join(failed_channels))
+        
+        drift_events = [event for scraper in scrapers.values() for event in scraper.drift_events()]
+        if drift_events:
+            logging.warning("Cambios de estructura detectados (%s):", len(drift_events))
+            for event in drift_events:
+                logging.warning("  [%s] %s: '%s' -> '%s'", event['site'], event['plan'], event['from'], event['to'])
         
         logging.info("="*60)
         
     except Exception as e:
-        logging.error(f"Error guardando EPG: {e}")
+        logging.error("Error guardando EPG: %s", e)
+        if journal:
+            journal.close()  # Se conserva para reanudar con --resume
+    finally:
+        if watchdog is not None:
+            watchdog.stop()
+            store.close_spill()
+
+def run_profiled(mode, resume=False, shard=None):
+    """Ejecuta main() bajo el perfilador; los perfiles se guardan junto al log"""
+    from Guide.profiling import RunProfiler
+
+    settings = load_config().settings
+    log_file = settings.get("logging", {}).get("file", "epg_generator.log")
+    profiler = RunProfiler(os.path.dirname(os.path.abspath(log_file)), mode)
+    for scraper_class in SCRAPERS.values():
+        profiler.instrument(scraper_class)
+    profiler.instrument(XMLTVWriter)
+    with profiler:
+        main(resume=resume, shard=shard)
+    return profiler.paths
+
+def serve(config, host=None, port=None):
+    """Sirve la última guía generada por HTTP sin regenerarla"""
+    from Guide.server import serve_guide
+
+    settings = config.settings
+    server_settings = settings.get("server", {})
+    asset_settings = settings.get("assets", {})
+    serve_guide(
+        settings.get("output_file", "epgpersonal.xml.gz"),
+        store_path=settings.get("store_file", "epg_store.bin"),
+        host=host or server_settings.get("host", "0.0.0.0"),
+        port=port or server_settings.get("port", 8080),
+        cache_dir=server_settings.get("cache_dir", "epg_server_cache"),
+        asset_dir=asset_settings.get("dir", "epg_assets") if asset_settings.get("enabled", False) else None,
+        asset_base_url=asset_settings.get("base_url")
+    )
+
+def query_store(mode, at=None, hours=3, channel_ids=None):
+    """Consulta el almacén desde la CLI (--query); devuelve False si no se pudo"""
+    from Guide.query import parse_at, run_query
+
+    settings = load_config().settings
+    if at:
+        try:
+            parse_at(at)
+        except ValueError as e:
+            logging.error("ERROR: %s", e)
+            return False
+    store_file = settings.get("store_file", "epg_store.bin")
+    try:
+        store = ProgramStore.load(store_file)
+    except (OSError, SnapshotError) as e:
+        logging.error("ERROR: No se pudo leer el almacén %s: %s", store_file, e)
+        return False
+    run_query(store, mode, settings["timezone_offset_hours"],
+              at=at, hours=hours, channel_ids=channel_ids)
+    return True
+
+def shard_arg(value):
+    """Tipo argparse para --shard i/N"""
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def parse_args(argv=None):
+    """Interpreta los argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Generador de EPG XMLTV")
+    parser.add_argument("--serve", action="store_true",
+                        help="Servir la guía generada por HTTP en lugar de generarla")
+    parser.add_argument("--plan", action="store_true",
+                        help="Mostrar el plan de descargas y su coste estimado sin acceder a la red")
+    parser.add_argument("--json", action="store_true", help="Con --plan: salida en JSON")
+    parser.add_argument("--profile", nargs="?", const="sample", choices=["sample", "cprofile"],
+                        help="Perfilar la ejecución (muestreo por defecto o cprofile); "
+                             "los perfiles se guardan junto al log")
+    parser.add_argument("--shard", type=shard_arg, metavar="i/N",
+                        help="Descargar solo la parte i de N de los canales (almacén parcial para --merge); "
+                             "con --plan, planificar solo esa parte")
+    parser.add_argument("--merge", type=int, metavar="N",
+                        help="Combinar los almacenes parciales de N shards en la guía completa")
+    parser.add_argument("--resume", action="store_true",
+                        help="Reanudar una ejecución interrumpida sin repetir los días ya descargados")
+    parser.add_argument("--host", help="Dirección de escucha del servidor")
+    parser.add_argument("--port", type=int, help="Puerto del servidor")
+    parser.add_argument("--query", choices=["now", "grid"],
+                        help="Consultar el almacén: 'now' (ahora/siguiente) o 'grid' (parrilla)")
+    parser.add_argument("--hours", type=float, default=3, help="Horas de la parrilla (por defecto 3)")
+    parser.add_argument("--at", help="Instante de la consulta YYYYMMDDHHMM (por defecto ahora)")
+    parser.add_argument("--channel", action="append", dest="channels",
+                        help="Limitar la consulta a un canal (se puede repetir)")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    if args.serve:
+        setup_logging()
+        serve(load_config(), host=args.host, port=args.port)
+    elif args.plan:
+        logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+        dry_run(resume=args.resume, as_json=args.json, shard=args.shard)
+    elif args.query:
+        logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+        if not query_store(args.query, at=args.at, hours=args.hours, channel_ids=args.channels):
+            sys.exit(1)
+    elif args.merge:
+        merge_shards(args.merge)
+    elif args.profile:
+        run_profiled(args.profile, resume=args.resume, shard=args.shard)
+    else:
+        main(resume=args.resume, shard=args.shard)
\ No newline at end of file
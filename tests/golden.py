@@ -0,0 +1,176 @@
+"""
+Arnés de fixtures de los scrapers: páginas guardadas, salida esperada y coste.
+
+Cada caso de tests/fixtures/cases.json es una página de día sintética, escrita
+a mano con la estructura de cada fuente (no una captura real), que se pasa por
+parse_day del scraper correspondiente. La salida normalizada se
+compara con el .json esperado junto a la página, y el tiempo de parseo y el
+pico de memoria asignada se comparan con perf_baseline.json.
+
+Uso:
+    python -m tests.golden            # tabla de resultados frente a la línea base
+    python -m tests.golden --update   # regenerar salidas esperadas y línea base
+
+Regenerar solo tras comprobar que un cambio de salida es intencionado.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Scrapers.gatotv_scraper import GatoTVScraper
+from Scrapers.mitv_scraper import MiTVScraper
+from Scrapers.ontvtonight_scraper import OnTVTonightScraper
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+CASES_FILE = os.path.join(FIXTURES_DIR, "cases.json")
+BASELINE_FILE = os.path.join(FIXTURES_DIR, "perf_baseline.json")
+SCRAPER_CLASSES = {
+    "gatotv": GatoTVScraper,
+    "mitv": MiTVScraper,
+    "ontvtonight": OnTVTonightScraper
+}
+REPEATS = 5
+# Regresión: más lento que TIME_TOLERANCE veces la línea base (el tiempo varía
+# entre máquinas) o más memoria que ALLOC_TOLERANCE veces (casi determinista)
+TIME_TOLERANCE = float(os.environ.get("EPG_PERF_TIME_TOLERANCE", 3.0))
+ALLOC_TOLERANCE = float(os.environ.get("EPG_PERF_ALLOC_TOLERANCE", 1.5))
+TIME_SLACK = 0.005          # segundos: páginas pequeñas no fallan por ruido
+ALLOC_SLACK = 64 * 1024     # bytes
+
+class FixtureResponse:
+    """Respuesta mínima para parse_day_stream a partir de una página guardada"""
+
+    def __init__(self, data, chunk_size=1000):
+        self.headers = {"Content-Type": "text/html; charset=utf-8"}
+        self.encoding = "utf-8"
+        self._data = data
+        self._chunk_size = chunk_size
+
+    def iter_content(self, chunk_size=None):
+        # Trozos pequeños a propósito: las filas quedan partidas entre trozos
+        size = self._chunk_size
+        return (self._data[i:i + size] for i in range(0, len(self._data), size))
+
+def load_cases():
+    with open(CASES_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_baseline():
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def expected_path(case):
+    return os.path.join(FIXTURES_DIR, os.path.splitext(case["page"])[0] + ".json")
+
+def read_page(case):
+    with open(os.path.join(FIXTURES_DIR, case["page"]), "r", encoding="utf-8") as f:
+        return f.read()
+
+def load_expected(case):
+    with open(expected_path(case), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def normalize(programs):
+    """Programas comparables: sin los datetime auxiliares (*_dt), en el orden producido"""
+    return [{key: value for key, value in program.items() if not key.endswith("_dt")}
+            for program in programs]
+
+def run_case(case, measure=True):
+    """
+    Parsea la página de un caso. Devuelve (programas normalizados, segundos, bytes):
+    el mejor tiempo de REPEATS parseos y el pico de memoria asignada de uno.
+    """
+    scraper = SCRAPER_CLASSES[case["scraper"]](case.get("settings", {}))
+    html = read_page(case)
+    fecha = date.fromisoformat(case["date"])
+    programs = normalize(scraper.parse_day(html, fecha, case["url"]))
+    if not measure:
+        return programs, None, None
+
+    best = None
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        scraper.parse_day(html, fecha, case["url"])
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    try:
+        scraper.parse_day(html, fecha, case["url"])
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return programs, best, peak
+
+def run_stream_case(case):
+    """Programas normalizados del parseo en streaming (solo scrapers que lo tienen)"""
+    scraper = SCRAPER_CLASSES[case["scraper"]](case.get("settings", {}))
+    response = FixtureResponse(read_page(case).encode("utf-8"))
+    fecha = date.fromisoformat(case["date"])
+    return normalize(scraper.parse_day_stream(response, fecha, case["url"]))
+
+def perf_regressions(name, seconds, peak, baseline, check_time=True):
+    """
+    Mensajes de regresión de un caso frente a su línea base (lista vacía si no hay).
+    check_time=False solo compara la memoria: el tiempo depende de la máquina.
+    """
+    reference = baseline.get(name)
+    if not reference:
+        return []
+    problems = []
+    time_limit = reference["seconds"] * TIME_TOLERANCE + TIME_SLACK
+    if check_time and seconds > time_limit:
+        problems.append(f"{name}: {seconds * 1000:.1f} ms > límite {time_limit * 1000:.1f} ms "
+                        f"(línea base {reference['seconds'] * 1000:.1f} ms)")
+    alloc_limit = reference["alloc_bytes"] * ALLOC_TOLERANCE + ALLOC_SLACK
+    if peak > alloc_limit:
+        problems.append(f"{name}: {peak / 1024:.0f} KB > límite {alloc_limit / 1024:.0f} KB "
+                        f"(línea base {reference['alloc_bytes'] / 1024:.0f} KB)")
+    return problems
+
+def update():
+    """Regenera las salidas esperadas y la línea base de rendimiento"""
+    baseline = {}
+    for case in load_cases():
+        programs, seconds, peak = run_case(case)
+        with open(expected_path(case), "w", encoding="utf-8") as f:
+            json.dump(programs, f, ensure_ascii=False, indent=1, sort_keys=True)
+            f.write("\n")
+        baseline[case["name"]] = {"seconds": round(seconds, 6), "alloc_bytes": peak}
+        print(f"{case['name']:<32} {len(programs):>4} programas {seconds * 1000:8.2f} ms {peak / 1024:8.0f} KB")
+    with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=1, sort_keys=True)
+        f.write("\n")
+
+def report():
+    """Compara cada caso con su salida esperada y su línea base"""
+    baseline = load_baseline()
+    failed = False
+    for case in load_cases():
+        programs, seconds, peak = run_case(case)
+        reference = baseline.get(case["name"], {})
+        status = "OK" if programs == load_expected(case) else "SALIDA DISTINTA"
+        problems = perf_regressions(case["name"], seconds, peak, baseline)
+        failed = failed or status != "OK" or bool(problems)
+        ratio = f"x{seconds / reference['seconds']:.2f}" if reference.get("seconds") else "-"
+        print(f"{case['name']:<32} {status:<16} {seconds * 1000:8.2f} ms ({ratio:>6}) {peak / 1024:8.0f} KB")
+        for problem in problems:
+            print(f"  REGRESIÓN {problem}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fixtures de los scrapers")
+    parser.add_argument("--update", action="store_true", help="Regenerar salidas esperadas y línea base")
+    args = parser.parse_args()
+    if args.update:
+        update()
+    else:
+        sys.exit(report())
@@ -0,0 +1,1059 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import gzip
+import shutil
+import subprocess
+import tempfile
+import threading
+import http.client
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import io
+import json
+import logging
+from datetime import date
+
+# Configurar logging básico para tests
+logging.basicConfig(level=logging.WARNING)
+
+# Añadir directorio raíz al path
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from Guide.program_store import ProgramStore
+from Guide.server import GuideServer, parse_range, accepts_gzip
+from Guide.query import ProgramIndex
+from Guide.diff import diff_guides, write_delta
+from Guide.snapshot import Snapshot, SnapshotError
+from Guide.xmltv import generate_xml_structure, write_xmltv, xmltv_to_epoch, XMLTVWriter
+from Guide.xmltv_import import import_xmltv
+from Guide.string_pool import StringPool
+from Guide.checkpoint import CheckpointJournal
+from Guide.scheduler import FetchJob, schedule_jobs, day_coverage
+from Guide.assets import AssetCache, asset_urls, load_url_map
+from Guide.config import ConfigError, compile_config, load_runtime_config
+from Guide.planner import plan_jobs, plan_report
+from Guide.metrics import cost_model
+from Guide.profiling import RunProfiler
+from Guide.logging_setup import setup_logging, stop_logging
+from Guide.memory import LRUCache
+from Guide.sharding import merge_shard_stores, parse_shard, select_shard, shard_path
+from Guide.health import HEALTHY, PROBE, SKIP, ChannelHealth, backoff_hours
+
+CHANNELS = [
+    {"id": "Canal6.cr", "nombre": "Canal 6", "logo": "https://example.com/6.png"},
+    {"id": "HBO2.lat", "nombre": "HBO 2", "logo": ""}
+]
+
+PROGRAMS = [
+    {"channel_id": "Canal6.cr", "start": "20240805080000", "stop": "20240805090000",
+     "title": "Noticias", "description": "Edición matutina", "image": ""},
+    {"channel_id": "Canal6.cr", "start": "20240806080000", "stop": "20240806090000",
+     "title": "Noticias", "description": "Edición matutina", "image": ""},
+    {"channel_id": "HBO2.lat", "start": "20240805200000", "stop": "20240805220000",
+     "title": "Película & Estreno", "description": "", "image": ""}
+]
+
+def build_store():
+    """Construye un almacén de prueba"""
+    store = ProgramStore()
+    for channel in CHANNELS:
+        store.add_channel(channel)
+    for channel in CHANNELS:
+        store.add_programs(channel["id"], [p for p in PROGRAMS if p["channel_id"] == channel["id"]])
+    return store
+
+class TestProgramStore(unittest.TestCase):
+    def test_slice_by_date_and_channel(self):
+        """Verifica los recortes por fecha y por canal"""
+        store = build_store()
+        channels, programs = store.slice(date="2024-08-05")
+        self.assertEqual(len(channels), 2)
+        self.assertEqual(len(programs), 2)
+
+        channels, programs = store.slice(channel_ids=["Canal6.cr"])
+        self.assertEqual([c["id"] for c in channels], ["Canal6.cr"])
+        self.assertEqual(len(programs), 2)
+
+    def test_derive_timeshift_channel(self):
+        """Un canal derivado reutiliza los programas del base con las horas desplazadas"""
+        store = build_store()
+        store.add_channel({"id": "Canal6_1h.cr", "nombre": "Canal 6 -1 h"})
+        self.assertEqual(store.derive_channel("Canal6_1h.cr", "Canal6.cr", 1), 2)
+        base, derived = store.get_programs("Canal6.cr")[0], store.get_programs("Canal6_1h.cr")[0]
+        self.assertEqual((derived["start"], derived["stop"]), ("20240805090000", "20240805100000"))
+        self.assertEqual(derived["channel_id"], "Canal6_1h.cr")
+        self.assertIs(derived["title"], base["title"])
+        self.assertEqual(base["start"], "20240805080000")
+
+    def test_save_and_load(self):
+        """Verifica que el almacén se guarda y recarga sin pérdidas"""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, "store.bin")
+        build_store().save(path)
+        store = ProgramStore.load(path)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.get_programs("HBO2.lat")[0]["title"], "Película & Estreno")
+
+class TestStringPool(unittest.TestCase):
+    def test_intern_shares_instances_and_counts_savings(self):
+        """Textos iguales comparten instancia y se contabilizan los bytes ahorrados"""
+        pool = StringPool()
+        first = pool.intern("".join(["Noti", "cias"]))
+        second = pool.intern("".join(["Noti", "cias"]))
+        self.assertIs(first, second)
+        self.assertTrue(pool.is_repeated(first))
+        report = pool.report()
+        self.assertEqual((report["unique"], report["lookups"]), (1, 2))
+        self.assertGreater(report["bytes_saved"], 0)
+
+    def test_reinterning_is_not_a_repeat(self):
+        """Un texto que el scraper ya internó y luego guarda el almacén no cuenta como repetido"""
+        store = ProgramStore()
+        description = store.pool.intern("".join(["Única ", "descripción"]))
+        store.add_programs("Canal6.cr", [{"start": "20240805080000", "stop": "20240805090000",
+                                          "title": "Noticias", "description": description}])
+        self.assertFalse(store.pool.is_repeated(description))
+        self.assertEqual(store.pool.report()["repeated"], 0)
+
+    def test_intern_from_several_threads(self):
+        """Varios hilos de parseo internan a la vez en el mismo pool sin perder cuentas ni duplicar textos"""
+        pool = StringPool()
+        texts = [f"Programa {i}" for i in range(200)]
+        results = []
+
+        def parse():
+            results.append([pool.intern("".join(["", text])) for text in texts * 20])
+
+        threads = [threading.Thread(target=parse) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(pool.report()["lookups"], 4 * 20 * 200)
+        self.assertEqual(len(pool), 200)
+        self.assertTrue(all(a is b for result in results[1:] for a, b in zip(result, results[0])))
+
+    def test_store_and_snapshot_share_strings(self):
+        """El almacén y las instantáneas cargadas guardan cada texto una vez"""
+        store = build_store()
+        canal6 = store.get_programs("Canal6.cr")
+        self.assertIs(canal6[0]["title"], canal6[1]["title"])
+        self.assertIs(canal6[0]["description"], canal6[1]["description"])
+
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, "store.bin")
+        store.save(path)
+        loaded = ProgramStore.load(path)
+        titles = [p["title"] for p in loaded.get_programs("Canal6.cr")]
+        self.assertIs(titles[0], titles[1])
+        self.assertIs(loaded.pool.intern("Noticias"), titles[0])
+
+class TestXMLTVWriter(unittest.TestCase):
+    def test_escapes_and_reuses_repeated_text(self):
+        """Escapa caracteres especiales y cachea los textos repetidos"""
+        buffer = io.BytesIO()
+        writer = XMLTVWriter(buffer, buffer_size=64)
+        writer.write_header()
+        writer.write_programs([dict(p) for p in PROGRAMS])
+        writer.write_footer()
+
+        xml = buffer.getvalue().decode("utf-8")
+        self.assertIn("<title lang=\"es\">Película &amp; Estreno</title>", xml)
+        self.assertEqual(writer.valid_programs, 3)
+        self.assertEqual(writer.bytes_written, len(buffer.getvalue()))
+        self.assertIs(writer.escaped("Noticias"), writer.escaped("Noticias"))
+
+    def test_invalid_programs_are_skipped(self):
+        """Descarta programas con marcas de tiempo inválidas"""
+        invalid = dict(PROGRAMS[0], start="20240231080000")
+        writer = write_xmltv(io.BytesIO(), CHANNELS, [invalid, dict(PROGRAMS[1])])
+        self.assertEqual((writer.valid_programs, writer.invalid_programs), (1, 1))
+
+class TestCheckpointJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.path = os.path.join(self.tmp_dir, "checkpoint.jsonl")
+
+    def test_resume_after_crash(self):
+        """Reanuda los días registrados aunque la última línea quedara a medias"""
+        journal = CheckpointJournal(self.path)
+        journal.start("2024-08-05")
+        journal.record("Canal6.cr", date(2024, 8, 5), PROGRAMS[:1])
+        journal.record("Canal6.cr", date(2024, 8, 6), [])
+        journal.close()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('{"channel": "HBO2.lat", "da')
+
+        journal = CheckpointJournal(self.path)
+        completed = journal.start("2024-08-05", resume=True)
+        self.assertEqual(list(completed), [("Canal6.cr", "2024-08-05")])
+        self.assertEqual(completed[("Canal6.cr", "2024-08-05")][0]["title"], "Noticias")
+
+        journal.record("HBO2.lat", date(2024, 8, 5), PROGRAMS[2:])
+        journal.close()
+        self.assertEqual(len(CheckpointJournal(self.path).read("2024-08-05")), 2)
+
+    def test_corrupt_header_discards_journal(self):
+        """Con la cabecera dañada no se reutiliza ninguna línea del diario y se empieza uno nuevo"""
+        journal = CheckpointJournal(self.path)
+        journal.start("2024-08-05")
+        journal.record("Canal6.cr", date(2024, 8, 5), PROGRAMS[:1])
+        journal.close()
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        for header in ('{"version": 1, "ru\n', '[1, "2024-08-05"]\n', '{"version": 99, "run": "2024-08-05"}\n'):
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.writelines([header] + lines[1:])
+            with self.subTest(header=header):
+                self.assertEqual(CheckpointJournal(self.path).read("2024-08-05"), {})
+
+        journal = CheckpointJournal(self.path)
+        self.assertEqual(journal.start("2024-08-05", resume=True), {})
+        journal.close()
+        self.assertEqual(CheckpointJournal(self.path).read("2024-08-05"), {})
+
+    def test_other_run_is_discarded_and_completed_run_removed(self):
+        """Un diario de otra ejecución no se reutiliza; al terminar bien se elimina"""
+        journal = CheckpointJournal(self.path)
+        journal.start("2024-08-04")
+        journal.record("Canal6.cr", date(2024, 8, 4), PROGRAMS[:1])
+        journal.close()
+
+        journal = CheckpointJournal(self.path)
+        self.assertEqual(journal.start("2024-08-05", resume=True), {})
+        journal.close(completed=True)
+        self.assertFalse(os.path.exists(self.path))
+
+class FixedTodayScraper:
+    """Scraper mínimo para planificar: solo necesita la fecha local de hoy"""
+
+    def get_local_today(self, channel_config):
+        return date(2024, 8, 5)
+
+class TestScheduler(unittest.TestCase):
+    def test_orders_by_weight_proximity_and_staleness(self):
+        """Hoy antes que mañana, favoritos antes que el resto y huecos antes que refrescos"""
+        scraper = FixedTodayScraper()
+        favorito = {"id": "HBO2.lat", "nombre": "HBO 2", "priority": 3}
+        normal = {"id": "Canal6.cr", "nombre": "Canal 6"}
+        jobs = [FetchJob(ch, scraper, date(2024, 8, d)) for ch in (normal, favorito) for d in (5, 6, 7)]
+
+        ordered = schedule_jobs(jobs, build_store())
+        keys = [(job.channel["id"], job.fecha.day) for job in ordered]
+        self.assertEqual(keys[:3], [("HBO2.lat", 5), ("HBO2.lat", 6), ("HBO2.lat", 7)])
+        self.assertEqual(keys[3:], [("Canal6.cr", 5), ("Canal6.cr", 6), ("Canal6.cr", 7)])
+        # Canal 6 ya tiene datos para hoy: pesa menos que un día sin datos
+        self.assertLess(ordered[3].priority, 1.0)
+        self.assertAlmostEqual(ordered[0].priority, 3 * (1 - 0.5 * 2 / 24))
+
+    def test_day_coverage(self):
+        """Calcula la fracción del día cubierta por programas"""
+        programs = build_store().get_programs("Canal6.cr")
+        self.assertAlmostEqual(day_coverage(programs, date(2024, 8, 5)), 1 / 24)
+        self.assertEqual(day_coverage(programs, date(2024, 8, 7)), 0.0)
+
+class PlanningScraper(FixedTodayScraper):
+    """Tres días a partir de hoy, con URL por día"""
+
+    def get_dates_to_scrape(self, channel_config):
+        return [date(2024, 8, 5), date(2024, 8, 6), date(2024, 8, 7)]
+
+    def get_day_url(self, channel_config, fecha):
+        return f"https://example.com/{channel_config['id']}/{fecha.isoformat()}"
+
+class TestPlanner(unittest.TestCase):
+    def test_plan_marks_hits_and_estimates(self):
+        """Separa días de la guía previa, del diario y derivados, y estima el coste"""
+        channels = [
+            {"id": "Canal6.cr", "nombre": "Canal 6", "scraper": "gatotv"},
+            {"id": "HBO2.lat", "nombre": "HBO 2", "scraper": "gatotv"},
+            {"id": "HBO2-1h.lat", "nombre": "HBO 2 -1 h", "derived_from": "HBO2.lat", "offset_hours": 1}
+        ]
+        store = build_store()
+        completed = {("HBO2.lat", "2024-08-06"): []}
+        plan = plan_jobs(channels, {"gatotv": PlanningScraper()}, store, seeded=True, completed_days=completed)
+
+        # Canal 6 ya tiene el día 6; hoy (día 5) siempre se refresca
+        self.assertEqual([(ch["id"], d.day) for ch, d in plan.seed_hits], [("Canal6.cr", 6)])
+        self.assertEqual([(ch["id"], d.day) for ch, d, _ in plan.restored], [("HBO2.lat", 6)])
+        self.assertEqual([ch["id"] for ch in plan.derived], ["HBO2-1h.lat"])
+        self.assertEqual(len(plan.jobs), 4)
+
+        history = [{"scrapers": {"gatotv": {"requests": 10, "errors": 0, "bytes": 1000000, "seconds": 20.0}}}]
+        jobs = schedule_jobs(plan.jobs, store)
+        report = plan_report(plan, jobs, cost_model(history), budget_minutes=0.1)
+        estimate = report["estimate"]
+        self.assertEqual(estimate["requests"], 4)
+        self.assertEqual(estimate["bytes"], 400000)
+        self.assertAlmostEqual(estimate["wall_seconds"], 8.0)
+        self.assertEqual(report["jobs"][0]["url"], "https://example.com/Canal6.cr/2024-08-05")
+        self.assertEqual([entry["within_budget"] for entry in report["jobs"]], [True, True, True, False])
+
+        async_report = plan_report(plan, jobs, cost_model(history), engine="async", max_connections=4)
+        self.assertAlmostEqual(async_report["estimate"]["wall_seconds"], 2.0)
+
+class TestXMLTVImport(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def test_round_trip_own_guide(self):
+        """Importa una guía generada por nosotros sin perder datos"""
+        path = os.path.join(self.tmp_dir, "epg.xml.gz")
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(generate_xml_structure(*build_store().slice()))
+
+        store = ProgramStore()
+        stats = import_xmltv(path, store)
+        self.assertEqual(stats["programs"], 3)
+        self.assertEqual(store.channels["Canal6.cr"]["logo"], "https://example.com/6.png")
+        self.assertEqual(store.get_programs("HBO2.lat")[0]["title"], "Película & Estreno")
+        self.assertEqual(store.get_programs("Canal6.cr")[0]["description"], "Edición matutina")
+
+    def test_third_party_guide(self):
+        """Normaliza desplazamientos horarios y filtra canales"""
+        path = os.path.join(self.tmp_dir, "externa.xml")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('''<?xml version="1.0" encoding="UTF-8"?>
+<tv>
+  <channel id="Otro.mx"><display-name>Otro</display-name></channel>
+  <channel id="Ext.us"><display-name>Externo</display-name><icon src="http://x/l.png"/></channel>
+  <programme start="20240805080000 -0500" stop="20240805090000 -0500" channel="Ext.us">
+    <title lang="en">News</title>
+  </programme>
+  <programme start="bad" stop="20240805090000" channel="Ext.us"><title>Roto</title></programme>
+  <programme start="20240805080000" stop="20240805090000" channel="Otro.mx"><title>X</title></programme>
+</tv>''')
+
+        store = ProgramStore()
+        stats = import_xmltv(path, store, channel_ids=["Ext.us"], offset_hours=6)
+        self.assertEqual(list(store.channels), ["Ext.us"])
+        self.assertEqual(stats["invalid"], 1)
+        # 08:00 en UTC-5 son las 07:00 en la hora local de la guía (UTC-6)
+        self.assertEqual(store.get_programs("Ext.us")[0]["start"], "20240805070000")
+
+    def test_fresh_data_replaces_seeded_span(self):
+        """Los programas nuevos sustituyen a los importados que se solapan"""
+        store = build_store()
+        store.replace_span("Canal6.cr", [
+            {"start": "20240805073000", "stop": "20240805100000", "title": "Especial"}
+        ])
+        self.assertEqual([p["title"] for p in store.get_programs("Canal6.cr")], ["Especial", "Noticias"])
+        self.assertEqual(store.covered_dates("Canal6.cr"), {"20240805", "20240806"})
+
+class TestGuideDiff(unittest.TestCase):
+    def test_added_removed_changed(self):
+        """Detecta programas añadidos, eliminados y modificados por canal"""
+        old = build_store()
+        new = build_store()
+        new.programs["Canal6.cr"][0] = dict(new.programs["Canal6.cr"][0], title="Noticias Extra")
+        new.programs["Canal6.cr"].pop()
+        new.add_programs("HBO2.lat", [{"start": "20240805220000", "stop": "20240805230000", "title": "Serie"}])
+
+        diff = diff_guides(old, new)
+        summary = diff.summary()
+        self.assertEqual((summary["added"], summary["removed"], summary["changed"]), (1, 1, 1))
+        self.assertEqual(summary["channels_changed"], 2)
+        self.assertTrue(diff_guides(old, build_store()).is_empty())
+
+    def test_expired_programs_are_not_removals(self):
+        """Los programas que terminaron antes de la ventana de la guía nueva no se reportan como eliminados"""
+        old = build_store()
+        new = build_store()
+        new.prune("20240806000000")
+        summary = diff_guides(old, new).summary()
+        self.assertEqual((summary["removed"], summary["channels_changed"]), (0, 0))
+
+    def test_diff_against_snapshot_and_delta(self):
+        """Compara contra una instantánea y escribe solo los cambios"""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        snapshot_path = os.path.join(tmp_dir, "prev.bin")
+        build_store().save(snapshot_path)
+
+        new = build_store()
+        new.add_channel({"id": "Nuevo.cr", "nombre": "Nuevo"})
+        new.add_programs("Nuevo.cr", [{"start": "20240805100000", "stop": "20240805110000", "title": "Estreno"}])
+        with Snapshot(snapshot_path) as previous:
+            diff = diff_guides(previous, new)
+        self.assertEqual(diff.added_channels, ["Nuevo.cr"])
+
+        delta_path = os.path.join(tmp_dir, "delta.xml.gz")
+        write_delta(delta_path, diff, "base")
+        with gzip.open(delta_path, "rt", encoding="utf-8") as f:
+            content = f.read()
+        self.assertEqual(content.count("<programme "), 1)
+        self.assertIn('action="add"', content)
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.path = os.path.join(tmp_dir, "snapshot.bin")
+        build_store().save(self.path)
+
+    def test_query_without_full_load(self):
+        """Consulta la instantánea mapeada sin deserializarla completa"""
+        with Snapshot(self.path) as snap:
+            self.assertEqual(snap.channel_ids(), ["Canal6.cr", "HBO2.lat"])
+            self.assertEqual(snap.program_count(), 3)
+            self.assertEqual(snap.channel("Canal6.cr")["logo"], "https://example.com/6.png")
+
+            current = snap.at("Canal6.cr", xmltv_to_epoch("20240806083000"))
+            self.assertEqual(current["start"], "20240806080000")
+            self.assertIsNone(snap.at("Canal6.cr", xmltv_to_epoch("20240806100000")))
+
+            day = snap.window("Canal6.cr", xmltv_to_epoch("20240805000000"), xmltv_to_epoch("20240806000000"))
+            self.assertEqual([p["start"] for p in day], ["20240805080000"])
+
+    def test_strings_are_interned(self):
+        """Los textos repetidos se guardan una sola vez"""
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read().count("Edición matutina".encode("utf-8")), 1)
+
+    def test_corrupted_file(self):
+        """Una instantánea dañada o truncada solo lanza SnapshotError (se recurre al XML)"""
+        import random
+        with open(self.path, "rb") as f:
+            original = f.read()
+        rng = random.Random(7)
+        damaged = [original[:size] for size in range(40, len(original), 7)]
+        for _ in range(200):
+            data = bytearray(original)
+            for pos in rng.sample(range(40, len(data)), 3):
+                data[pos] = rng.randrange(256)
+            damaged.append(bytes(data))
+        for data in damaged:
+            with open(self.path, "wb") as f:
+                f.write(data)
+            try:
+                ProgramStore.load(self.path)
+            except SnapshotError:
+                pass
+
+    def test_invalid_file(self):
+        """Rechaza archivos que no son instantáneas"""
+        with open(self.path, "wb") as f:
+            f.write(b"no es una instantanea" * 4)
+        with self.assertRaises(SnapshotError):
+            Snapshot(self.path)
+
+class TestProgramIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = ProgramIndex(build_store())
+
+    def test_cli_errors_exit_cleanly(self):
+        """Un --at mal formado o un almacén ausente o dañado terminan con un error de una línea, sin traza"""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        with open(os.path.join(tmp_dir, "config.json"), "w", encoding="utf-8") as f:
+            json.dump({"settings": {"timezone_offset_hours": 6}, "channels": []}, f)
+        main_py = os.path.join(ROOT_DIR, "main.py")
+
+        def query(*extra):
+            return subprocess.run([sys.executable, main_py, "--query", "now", *extra], cwd=tmp_dir,
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+
+        missing = query()
+        with open(os.path.join(tmp_dir, "epg_store.bin"), "wb") as f:
+            f.write(b"no es una instantanea" * 4)
+        corrupt = query()
+        bad_at = query("--at", "mañana")
+        for result in (missing, corrupt, bad_at):
+            self.assertEqual(result.returncode, 1)
+            self.assertNotIn(b"Traceback", result.stderr)
+            self.assertEqual(len(result.stderr.decode("utf-8").strip().splitlines()), 1)
+        self.assertIn("mañana", bad_at.stderr.decode("utf-8"))
+
+        build_store().save(os.path.join(tmp_dir, "epg_store.bin"))
+        ok = query("--at", "202408050830")
+        self.assertEqual(ok.returncode, 0, ok.stderr)
+        self.assertIn("Noticias", ok.stdout.decode("utf-8"))
+
+    def test_now_next(self):
+        """Resuelve el programa actual y el siguiente por canal"""
+        at = xmltv_to_epoch("20240805083000")
+        result = self.index.now_next(at)
+        current, following = result["Canal6.cr"]
+        self.assertEqual(current["start"], "20240805080000")
+        self.assertEqual(following["start"], "20240806080000")
+        self.assertEqual(result["HBO2.lat"][0], None)
+        self.assertEqual(result["HBO2.lat"][1]["title"], "Película & Estreno")
+
+    def test_window(self):
+        """Devuelve los programas que se solapan con la ventana"""
+        start = xmltv_to_epoch("20240805084500")
+        grid = self.index.window(start, start + 12 * 3600)
+        self.assertEqual([p["start"] for p in grid["Canal6.cr"]], ["20240805080000"])
+        self.assertEqual(len(grid["HBO2.lat"]), 1)
+
+        grid = self.index.window(start, start + 60, channel_ids=["HBO2.lat"])
+        self.assertEqual(grid, {"HBO2.lat": []})
+
+    def test_timezone_offset(self):
+        """Respeta el desplazamiento XMLTV al convertir a epoch"""
+        self.assertEqual(xmltv_to_epoch("20240805080000 -0600"), xmltv_to_epoch("20240805140000"))
+
+class TestGuideServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.guide_path = os.path.join(cls.tmp_dir, "epgpersonal.xml.gz")
+        cls.store_path = os.path.join(cls.tmp_dir, "store.bin")
+
+        store = build_store()
+        store.save(cls.store_path)
+        cls.xml = generate_xml_structure(*store.slice()).encode("utf-8")
+        with gzip.open(cls.guide_path, "wb") as f:
+            f.write(cls.xml)
+
+        cls.server = GuideServer(("127.0.0.1", 0), cls.guide_path, cls.store_path,
+                                 cache_dir=os.path.join(cls.tmp_dir, "cache"))
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.tmp_dir)
+
+    def request(self, path, headers=None, method="GET"):
+        conn = http.client.HTTPConnection("127.0.0.1", self.server.server_address[1], timeout=5)
+        self.addCleanup(conn.close)
+        conn.request(method, path, headers=headers or {})
+        response = conn.getresponse()
+        return response, response.read()
+
+    def test_gzip_negotiation(self):
+        """Sirve gzip solo si el cliente lo acepta"""
+        response, body = self.request("/", {"Accept-Encoding": "gzip"})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+        self.assertEqual(gzip.decompress(body), self.xml)
+
+        response, body = self.request("/", {"Accept-Encoding": "identity"})
+        self.assertEqual(response.status, 200)
+        self.assertIsNone(response.getheader("Content-Encoding"))
+        self.assertEqual(body, self.xml)
+
+    def test_etag_not_modified(self):
+        """Devuelve 304 cuando el ETag coincide"""
+        response, _ = self.request("/epgpersonal.xml.gz")
+        etag = response.getheader("ETag")
+        self.assertTrue(etag)
+        response, body = self.request("/epgpersonal.xml.gz", {"If-None-Match": etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(body, b"")
+
+    def test_byte_range(self):
+        """Sirve rangos de bytes y rechaza los no satisfacibles"""
+        response, body = self.request("/guide.xml", {"Range": "bytes=0-4"})
+        self.assertEqual(response.status, 206)
+        self.assertEqual(body, self.xml[:5])
+        self.assertEqual(response.getheader("Content-Range"), f"bytes 0-4/{len(self.xml)}")
+
+        response, _ = self.request("/guide.xml", {"Range": f"bytes={len(self.xml) + 10}-"})
+        self.assertEqual(response.status, 416)
+
+    def test_slices(self):
+        """Sirve recortes por canal y por fecha desde el almacén"""
+        response, body = self.request("/channel/HBO2.lat.xml")
+        self.assertEqual(response.status, 200)
+        self.assertIn(b"Pel\xc3\xadcula &amp; Estreno", body)
+        self.assertNotIn(b"Noticias", body)
+
+        response, body = self.request("/date/2024-08-06.xml")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body.count(b"<programme "), 1)
+
+        response, _ = self.request("/channel/NoExiste.xml")
+        self.assertEqual(response.status, 404)
+
+    def test_slow_slice_does_not_block_others(self):
+        """Generar un recorte lento no frena a los demás y el mismo recorte pedido a la vez se genera una vez"""
+        import Guide.server as server_module
+        release = threading.Event()
+        built = []
+
+        def slow_write(stream, channels, programs, **kwargs):
+            built.append([channel["id"] for channel in channels])
+            if built[-1] == ["Canal6.cr"]:
+                release.wait(5)
+            write_xmltv(stream, channels, programs, **kwargs)
+
+        with patch.object(server_module, "write_xmltv", slow_write):
+            slow = [threading.Thread(target=self.server.slice_files, args=("channel", "Canal6.cr"))
+                    for _ in range(3)]
+            for thread in slow:
+                thread.start()
+            while not built:
+                time.sleep(0.01)
+            # Con el recorte de Canal 6 a medias se sirven otros recortes y la guía completa
+            started = time.monotonic()
+            self.assertIsNotNone(self.server.slice_files("date", "2024-08-05"))
+            response, body = self.request("/guide.xml")
+            self.assertEqual((response.status, body), (200, self.xml))
+            self.assertLess(time.monotonic() - started, 2)
+            release.set()
+            for thread in slow:
+                thread.join(5)
+
+        self.assertEqual(built.count(["Canal6.cr"]), 1)
+        self.assertTrue(os.path.exists(self.server.slice_files("channel", "Canal6.cr")[1]))
+
+    def test_header_helpers(self):
+        """Verifica el análisis de Range y Accept-Encoding"""
+        self.assertEqual(parse_range("bytes=-10", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=10-", 100), (10, 99))
+        self.assertIsNone(parse_range("bytes=0-1,5-6", 100))
+        self.assertTrue(accepts_gzip("deflate, gzip;q=0.5"))
+        self.assertFalse(accepts_gzip("gzip;q=0"))
+
+class TestAssetCache(unittest.TestCase):
+    """Copia local de imágenes contra un servidor HTTP local"""
+
+    PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+    BASE_URL = "http://epg.local/assets/"
+
+    @classmethod
+    def setUpClass(cls):
+        png = cls.PNG
+        cls.requests_seen = requests_seen = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                requests_seen.append((self.path, self.headers.get("If-None-Match")))
+                if self.path == "/roto.png":
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if self.headers.get("If-None-Match") == '"v1"':
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("ETag", '"v1"')
+                self.send_header("Content-Length", str(len(png)))
+                self.end_headers()
+                self.wfile.write(png)
+
+            def log_message(self, *args):
+                pass
+
+        cls.server = HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.requests_seen.clear()
+
+    def test_mirror_dedup_and_rewrite(self):
+        """Misma imagen desde dos URLs: un solo archivo; las rotas se omiten de la guía"""
+        channels = [{"id": "A", "nombre": "A", "logo": f"{self.base}/a.png"},
+                    {"id": "B", "nombre": "B", "logo": f"{self.base}/roto.png"}]
+        programs = [{"channel_id": "A", "start": "20240805080000", "stop": "20240805090000",
+                     "title": "Noticias", "description": "", "image": f"{self.base}/b.png"}]
+
+        cache = AssetCache(self.tmp_dir, base_url="http://epg.local/assets/", max_size=0)
+        icon_map = cache.mirror(asset_urls(channels, programs))
+        self.assertEqual(icon_map[f"{self.base}/a.png"], icon_map[f"{self.base}/b.png"])
+        self.assertEqual(icon_map[f"{self.base}/roto.png"], "")
+        name = icon_map[f"{self.base}/a.png"].rsplit("/", 1)[1]
+        with open(os.path.join(self.tmp_dir, name), "rb") as f:
+            self.assertEqual(f.read(), self.PNG)
+
+        buffer = io.BytesIO()
+        write_xmltv(buffer, channels, programs, icon_map=icon_map)
+        xml = buffer.getvalue().decode("utf-8")
+        self.assertEqual(xml.count(f'<icon src="http://epg.local/assets/{name}"/>'), 2)
+        self.assertNotIn("roto.png", xml)
+
+    def test_ttl_and_revalidation(self):
+        """Dentro del TTL no hay peticiones; al expirar se revalida con If-None-Match"""
+        url = f"{self.base}/a.png"
+        AssetCache(self.tmp_dir, self.BASE_URL).mirror([url])
+        AssetCache(self.tmp_dir, self.BASE_URL).mirror([url])
+        self.assertEqual(len(self.requests_seen), 1)
+
+        cache = AssetCache(self.tmp_dir, self.BASE_URL, ttl_hours=0)
+        cache.mirror([url])
+        self.assertEqual(self.requests_seen[-1], ("/a.png", '"v1"'))
+        self.assertEqual(cache.stats["revalidated"], 1)
+        self.assertIn(url, cache.url_map())
+        self.assertEqual(load_url_map(self.tmp_dir, self.BASE_URL), cache.url_map())
+
+    def test_prune_removes_unused_files(self):
+        """Borra los archivos que ninguna URL en uso referencia"""
+        cache = AssetCache(self.tmp_dir, self.BASE_URL, ttl_hours=0)
+        cache.mirror([f"{self.base}/a.png"])
+        self.assertEqual(cache.prune([]), 1)
+        self.assertEqual(cache.url_map(), {})
+
+    def test_base_url_must_be_absolute(self):
+        """Un <icon src> relativo no sirve en una guía descargada: base_url debe ser absoluta"""
+        with self.assertRaises(ValueError):
+            AssetCache(self.tmp_dir, "/assets/")
+        with self.assertRaises(ConfigError) as ctx:
+            compile_config({"settings": {"timezone_offset_hours": 6,
+                                         "assets": {"enabled": True, "base_url": "/assets/"}},
+                            "channels": []})
+        self.assertIn("base_url", str(ctx.exception))
+
+class TestRuntimeConfig(unittest.TestCase):
+    RAW = {
+        "settings": {"timezone_offset_hours": 6, "engine": "sync"},
+        "channels": [
+            {"id": "Canal6.cr", "nombre": "Canal 6", "scraper": "gatotv",
+             "url": "https://www.gatotv.com/canal/6_de_costa_rica", "timezone_override": 5, "priority": 3},
+            {"id": "Canal6-1h.cr", "nombre": "Canal 6 -1 h", "derived_from": "Canal6.cr", "offset_hours": 1},
+            {"id": "SinUrl", "nombre": "Sin URL", "scraper": "gatotv"},
+            {"id": "Otro", "nombre": "Otro", "scraper": "desconocido", "url": "https://example.com/x"},
+            {"id": "Canal6.cr", "nombre": "Duplicado", "scraper": "gatotv", "url": "https://example.com/y"}
+        ]
+    }
+
+    def test_compile_resolves_channels(self):
+        """Resuelve zona horaria y prioridad y separa los canales inválidos"""
+        config = compile_config(self.RAW, known_scrapers=("gatotv", "ontvtonight"))
+        self.assertEqual([ch.id for ch in config.channels], ["Canal6.cr", "Canal6-1h.cr"])
+        channel = config.channel("Canal6.cr")
+        self.assertEqual(channel.timezone_offset_hours, 5)
+        self.assertEqual(channel["priority"], 3.0)
+        self.assertEqual(config.channel("Canal6-1h.cr").get("timezone_offset_hours"), 6)
+        reasons = [reason for _, _, reason in config.invalid_channels]
+        self.assertEqual(len(reasons), 3)
+        self.assertIn("scraper desconocido 'desconocido'", reasons)
+        with self.assertRaises(AttributeError):
+            channel.nombre = "Otro"
+        with self.assertRaises(TypeError):
+            config.settings["engine"] = "async"
+
+    def test_invalid_settings_raise(self):
+        """Los ajustes globales inválidos se reportan todos juntos"""
+        raw = {"settings": {"timezone_offset_hours": "seis", "engine": "turbo"}, "channels": []}
+        with self.assertRaises(ConfigError) as ctx:
+            compile_config(raw)
+        self.assertEqual(len(ctx.exception.errors), 2)
+        with self.assertRaises(ConfigError):
+            compile_config({"settings": {}})
+
+    def test_cached_by_mtime(self):
+        """Reutiliza la compilación mientras el archivo no cambie"""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, "config.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.RAW, f)
+        first = load_runtime_config(path)
+        self.assertIs(load_runtime_config(path), first)
+
+        raw = dict(self.RAW, channels=self.RAW["channels"][:1])
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(raw, f)
+        os.utime(path, ns=(0, 0))
+        self.assertEqual(len(load_runtime_config(path).channels), 1)
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("{")
+        with self.assertRaises(ConfigError):
+            load_runtime_config(path)
+
+class TestRunProfiler(unittest.TestCase):
+    class Scraper:
+        def parse_title(self, row):
+            return sum(range(2000)) + row
+
+    def test_profile_writes_files_and_restores(self):
+        """Cronometra los métodos, escribe los perfiles y restaura la clase"""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        original = self.Scraper.__dict__["parse_title"]
+
+        for mode in ("sample", "cprofile"):
+            profiler = RunProfiler(tmp_dir, mode, interval=0.001)
+            profiler.instrument(self.Scraper)
+            with profiler:
+                scraper = self.Scraper()
+                deadline = time.perf_counter() + 0.05
+                while time.perf_counter() < deadline:
+                    scraper.parse_title(1)
+            self.assertIs(self.Scraper.__dict__["parse_title"], original)
+            self.assertGreater(profiler.timings["Scraper.parse_title"][0], 0)
+            with open(profiler.paths["folded"], encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            self.assertTrue(lines)
+            self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in lines))
+        self.assertIn("prof", profiler.paths)
+
+class TestLoggingSetup(unittest.TestCase):
+    def test_json_queue_with_sampling(self):
+        """Registros JSON por la cola, con muestreo por etapa sin perder avisos"""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        root_logger = logging.getLogger()
+        self.addCleanup(root_logger.setLevel, root_logger.level)
+        self.addCleanup(stop_logging)
+        log_file = os.path.join(tmp_dir, "epg.log")
+
+        setup_logging({"file": log_file, "format": "json", "console": False,
+                       "sampling": {"GatoTV": 0.25}})
+        for i in range(8):
+            logging.info("[GatoTV] Procesados %d programas para %s", i, "2024-08-02")
+        logging.warning("[GatoTV] No se encontró elemento time en %s", "fin")
+        logging.info("[MiTV] Usando caché para %s", "http://x")
+        stop_logging()
+
+        with open(log_file, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f]
+        gatotv = [e for e in entries if e["stage"] == "GatoTV" and e["level"] == "INFO"]
+        self.assertEqual(len(gatotv), 2)
+        self.assertEqual(gatotv[0]["msg"], "[GatoTV] Procesados 0 programas para 2024-08-02")
+        self.assertTrue(any(e["level"] == "WARNING" for e in entries))
+        self.assertTrue(any(e["stage"] == "MiTV" for e in entries))
+
+    def test_sampling_without_queue(self):
+        """Sin cola, archivo y consola conservan los mismos mensajes muestreados"""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        root_logger = logging.getLogger()
+        self.addCleanup(root_logger.setLevel, root_logger.level)
+        self.addCleanup(stop_logging)
+        log_file = os.path.join(tmp_dir, "epg.log")
+
+        console = io.StringIO()
+        with patch.object(sys, "stdout", console):
+            setup_logging({"file": log_file, "queue": False, "sampling": {"GatoTV": 0.5}})
+            for i in range(6):
+                logging.info("[GatoTV] Página %d", i)
+            stop_logging()
+
+        with open(log_file, encoding="utf-8") as f:
+            file_lines = [line for line in f if "[GatoTV]" in line]
+        console_lines = [line for line in console.getvalue().splitlines() if "[GatoTV]" in line]
+        self.assertEqual(len(file_lines), 3)
+        self.assertEqual(len(console_lines), 3)
+
+class TestMemoryBudget(unittest.TestCase):
+    def test_spilled_channels_read_back(self):
+        """Los canales volcados a disco se leen igual y vuelven a memoria al reemplazarse"""
+        store = build_store()
+        expected_channels, expected_programs = store.slice()
+        store.enable_spill(tempfile.gettempdir())
+        self.addCleanup(store.close_spill)
+
+        self.assertEqual(store.spill(["Canal6.cr"]), 2)
+        self.assertTrue(store.programs.is_spilled("Canal6.cr"))
+        self.assertEqual(store.slice(), (expected_channels, expected_programs))
+        self.assertEqual(len(store), len(expected_programs))
+
+        store.replace_span("Canal6.cr", [{"start": "20240807060000", "stop": "20240807070000",
+                                          "title": "Nuevo", "channel_id": "Canal6.cr"}])
+        self.assertFalse(store.programs.is_spilled("Canal6.cr"))
+        self.assertEqual(len(store.get_programs("Canal6.cr")), 3)
+
+    def test_spill_releases_pooled_text(self):
+        """Volcar un canal saca sus textos del pool y libera su memoria"""
+        import tracemalloc
+        store = ProgramStore()
+        store.add_programs("Canal6.cr", [{"start": "20240806060000", "stop": "20240806070000",
+                                          "title": "Noticias", "channel_id": "Canal6.cr"}])
+        store.enable_spill(tempfile.gettempdir())
+        self.addCleanup(store.close_spill)
+
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        store.add_programs("Canal7.cr", [
+            {"start": f"202408060{i % 10}{i // 10:02d}00", "stop": f"202408060{i % 10}{i // 10:02d}59",
+             "title": "Noticias", "description": f"Descripción {i} " + "x" * 2000, "channel_id": "Canal7.cr"}
+            for i in range(100)
+        ])
+        loaded = tracemalloc.get_traced_memory()[0]
+        self.assertEqual(store.spill(["Canal7.cr"]), 100)
+        freed = loaded - tracemalloc.get_traced_memory()[0]
+
+        self.assertGreater(freed, 100 * 2000)
+        self.assertEqual(len(store.pool), 1)
+        self.assertEqual(store.get_programs("Canal7.cr")[0]["title"], "Noticias")
+        self.assertIs(store.get_programs("Canal7.cr")[0]["title"], store.get_programs("Canal6.cr")[0]["title"])
+        self.assertEqual(len(store.pool), 1)
+
+    def test_spill_releases_text_when_last_channel_leaves(self):
+        """Un texto compartido sigue en el pool hasta que se vuelca el último canal en memoria que lo usa"""
+        store = ProgramStore()
+        store.enable_spill(tempfile.gettempdir())
+        self.addCleanup(store.close_spill)
+        for channel_id in ("Canal6.cr", "Canal7.cr"):
+            store.add_programs(channel_id, [{"start": "20240806060000", "stop": "20240806070000",
+                                             "title": "Noticias", "description": "Edición matutina"}])
+
+        store.spill(["Canal6.cr"])
+        self.assertIs(store.pool.shared("Edición matutina"), store.get_programs("Canal7.cr")[0]["description"])
+        self.assertEqual(len(store.pool), 2)
+        store.spill(["Canal7.cr"])
+        self.assertEqual(len(store.pool), 0)
+
+    def test_lru_cache_is_bounded(self):
+        """El caché descarta la entrada menos usada al superar su tamaño"""
+        cache = LRUCache(2)
+        cache["a"], cache["b"] = 1, 2
+        cache["a"]
+        cache["c"] = 3
+        self.assertNotIn("b", cache)
+        self.assertEqual((cache["a"], cache["c"], len(cache)), (1, 3, 2))
+
+class TestSharding(unittest.TestCase):
+    def test_partition_is_complete_and_stable(self):
+        """Cada canal va a un único shard y los derivados acompañan a su canal base"""
+        channels = [{"id": f"Canal{i}.cr", "nombre": f"Canal {i}"} for i in range(40)]
+        channels.append({"id": "Canal1_1h.cr", "nombre": "Canal 1 -1 h", "derived_from": "Canal1.cr"})
+        shards = [select_shard(channels, (i, 4)) for i in range(1, 5)]
+
+        self.assertEqual(sorted(ch["id"] for shard in shards for ch in shard), sorted(ch["id"] for ch in channels))
+        self.assertTrue(all(shards))
+        base_shard = next(i for i, shard in enumerate(shards) if channels[1] in shard)
+        self.assertIn(channels[-1], shards[base_shard])
+        self.assertEqual(select_shard(channels, (2, 4)), shards[1])
+
+        self.assertEqual(parse_shard("2/4"), (2, 4))
+        for spec in ("0/4", "5/4", "2-4", ""):
+            with self.assertRaises(ValueError):
+                parse_shard(spec)
+
+    def test_merge_partial_stores(self):
+        """Los almacenes parciales reemplazan los canales de la guía previa; un shard faltante no la borra"""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        store_file = os.path.join(tmp_dir, "epg_store.bin")
+        partial = ProgramStore()
+        partial.add_channel(CHANNELS[0])
+        partial.add_programs("Canal6.cr", [{"start": "20240807060000", "stop": "20240807070000",
+                                           "title": "Nuevo", "channel_id": "Canal6.cr"}])
+        partial.save(shard_path(store_file, (1, 2)))
+
+        store = build_store()
+        merged, missing = merge_shard_stores(store, store_file, 2, ProgramStore.load)
+
+        self.assertEqual((len(merged), missing), (1, [2]))
+        self.assertEqual([p["title"] for p in store.get_programs("Canal6.cr")], ["Nuevo"])
+        self.assertTrue(store.get_programs("HBO2.lat"))
+        self.assertEqual(store.get_programs("HBO2.lat"), build_store().get_programs("HBO2.lat"))
+
+    def test_shard_processes_against_local_server(self):
+        """N procesos 'main.py --shard i/N' contra un servidor local y '--merge N' dan la guía completa"""
+        page = open(os.path.join(ROOT_DIR, "tests", "fixtures", "gatotv", "canal6_2024-08-05.html"), "rb").read()
+        paths_seen = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                paths_seen.append(self.path)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(page)))
+                self.end_headers()
+                self.wfile.write(page)
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        base = f"http://127.0.0.1:{server.server_port}"
+        channels = [{"id": f"Canal{i}.cr", "nombre": f"Canal {i}", "scraper": "gatotv",
+                     "url": f"{base}/canal/canal_{i}", "site_id": f"canal_{i}"} for i in range(8)]
+        config = {
+            "settings": {"timezone_offset_hours": 6, "days_to_scrape": 1, "seed_from_previous": False,
+                         "retry_attempts": 0, "timeout": 5, "channel_health": False,
+                         "logging": {"level": "WARNING", "console": False, "queue": False}},
+            "channels": channels
+        }
+        with open(os.path.join(tmp_dir, "config.json"), "w", encoding="utf-8") as f:
+            json.dump(config, f)
+
+        main_py = os.path.join(ROOT_DIR, "main.py")
+        shards = [subprocess.Popen([sys.executable, main_py, "--shard", f"{i}/3"], cwd=tmp_dir,
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT) for i in range(1, 4)]
+        for process in shards:
+            output, _ = process.communicate(timeout=120)
+            self.assertEqual(process.returncode, 0, output.decode("utf-8", "replace"))
+        merge = subprocess.run([sys.executable, main_py, "--merge", "3"], cwd=tmp_dir,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=120)
+        self.assertEqual(merge.returncode, 0, merge.stdout.decode("utf-8", "replace"))
+
+        # Cada página se descargó una sola vez, en un único shard, y la guía combinada tiene todos los canales
+        self.assertEqual(len(paths_seen), len(set(paths_seen)))
+        self.assertEqual({path.rsplit("/", 2)[1] for path in paths_seen}, {ch["site_id"] for ch in channels})
+        self.assertFalse([name for name in os.listdir(tmp_dir) if name.startswith("epg_store.shard-")])
+        store = ProgramStore.load(os.path.join(tmp_dir, "epg_store.bin"))
+        self.assertEqual(sorted(store.channels), sorted(ch["id"] for ch in channels))
+        self.assertTrue(all(store.get_programs(ch["id"]) for ch in channels))
+        with gzip.open(os.path.join(tmp_dir, "epgpersonal.xml.gz"), "rt", encoding="utf-8") as f:
+            guide = f.read()
+        self.assertTrue(all(f'channel="{ch["id"]}"' in guide for ch in channels))
+
+class TestChannelHealth(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.path = os.path.join(tmp_dir, "epg_health.json")
+
+    def test_backoff_and_recovery(self):
+        """Tras fallos seguidos el canal espera cada vez más; un éxito lo restablece"""
+        from datetime import datetime, timedelta
+        now = datetime(2024, 8, 5, 6, 0)
+        health = ChannelHealth(self.path)
+        health.record("Canal6.cr", False, pages=1, seconds=0.5, error="HTTP 404", now=now)
+        self.assertEqual(health.status("Canal6.cr", now), HEALTHY)
+
+        entry = health.record("Canal6.cr", False, pages=1, seconds=0.5, error="HTTP 404", now=now)
+        self.assertEqual(entry["retry_at"], (now + timedelta(hours=backoff_hours(2))).isoformat())
+        self.assertEqual(health.status("Canal6.cr", now), SKIP)
+        self.assertEqual(health.status("Canal6.cr", now + timedelta(hours=backoff_hours(2))), PROBE)
+        self.assertGreater(backoff_hours(3), backoff_hours(2))
+        self.assertEqual(backoff_hours(50), 168)
+
+        health.record("Canal6.cr", True, pages=2, seconds=0.2, now=now)
+        health.save()
+        reloaded = ChannelHealth(self.path)
+        self.assertEqual(reloaded.status("Canal6.cr", now), HEALTHY)
+        self.assertEqual(reloaded.channels["Canal6.cr"]["last_error"], "HTTP 404")
+        self.assertAlmostEqual(reloaded.success_rate("Canal6.cr"), 1 / 3)
+
+    def test_plan_skips_and_probes(self):
+        """Los canales en espera no generan trabajos y los que salen de ella sondean un solo día"""
+        channels = [
+            {"id": "Canal6.cr", "nombre": "Canal 6", "scraper": "gatotv"},
+            {"id": "HBO2.lat", "nombre": "HBO 2", "scraper": "gatotv"}
+        ]
+        health = ChannelHealth(self.path)
+        health.channels["Canal6.cr"] = {"consecutive_failures": 3, "retry_at": "2999-01-01T00:00:00"}
+        health.channels["HBO2.lat"] = {"consecutive_failures": 3, "retry_at": "2000-01-01T00:00:00"}
+        plan = plan_jobs(channels, {"gatotv": PlanningScraper()}, ProgramStore(), health=health)
+
+        self.assertEqual([ch["id"] for ch in plan.skipped], ["Canal6.cr"])
+        self.assertEqual([(job.channel["id"], job.fecha.day) for job in plan.jobs], [("HBO2.lat", 5)])
+        self.assertEqual([job.fecha.day for job in plan.probes["HBO2.lat"]], [6, 7])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,9 @@ import json
 from datetime import datetime
 from unittest.mock import patch, Mock
 import logging
+import asyncio
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
 
 # Configurar logging básico para tests
 logging.basicConfig(level=logging.WARNING)
@@ -14,6 +17,13 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from Scrapers.gatotv_scraper import GatoTVScraper
 from Scrapers.ontvtonight_scraper import OnTVTonightScraper
+from Scrapers.selector_plan import SelectorPlan, has_text
+from Scrapers.listing import ListingCache
+from Scrapers.async_http import async_available
+from Scrapers.channel_catalog import ChannelCatalog, parse_channel_list, split_timeshift, as_derived_channels
+from Scrapers.time_parsing import parse_clock_24h, parse_clock_12h, format_xmltv
+from bs4 import BeautifulSoup
+from tests import golden
 
 class TestScrapers(unittest.TestCase):
     @classmethod
@@ -105,5 +115,281 @@ class TestScrapers(unittest.TestCase):
         except Exception as e:
             self.fail(f"Error en test_gatotv_fetch_programs: {e}")
 
+class TestGatoTVStreaming(unittest.TestCase):
+    PAGE = '''<html><head><script>var fila = "<tr>";</script></head><body>
+        <div class="publicidad">Anuncio</div>
+        <table class="tbl_EPG">
+            <tr class="tbl_EPG_header"><th>Hora</th></tr>
+            <tr class="tbl_EPG_row">
+                <td></td>
+                <td><time datetime="22:00">22:00</time></td>
+                <td><time datetime="23:30">23:30</time></td>
+                <td><div><div><a href="#"><span>Noticias &amp; Más</span></a></div>
+                    <div class="hidden-xs">Edición estelar</div></div></td>
+            </tr>
+            <tr class="tbl_EPG_rowAlternate">
+                <td></td>
+                <td><time datetime="23:30">23:30</time></td>
+                <td><time datetime="01:00">01:00</time></td>
+                <td><div><div><a href="#"><span>Película</span></a></div></div></td>
+            </tr>
+        </table></body></html>'''
+
+    def test_streaming_matches_full_parse(self):
+        """El parseo en streaming produce los mismos programas que el parseo completo"""
+        scraper = GatoTVScraper({"streaming_parse": True})
+        fecha = datetime(2024, 8, 5).date()
+        data = self.PAGE.encode("utf-8")
+
+        response = Mock()
+        response.headers = {"Content-Type": "text/html; charset=utf-8"}
+        response.encoding = "utf-8"
+        response.iter_content.return_value = [data[i:i + 50] for i in range(0, len(data), 50)]
+
+        streamed = scraper.parse_day_stream(response, fecha, "https://www.gatotv.com/canal/test")
+        full = scraper.parse_day(self.PAGE, fecha, "https://www.gatotv.com/canal/test")
+
+        self.assertEqual(streamed, full)
+        self.assertEqual([p["title"] for p in streamed], ["Noticias & Más", "Película"])
+        self.assertEqual(streamed[1]["stop"], "20240806010000")
+
+@unittest.skipUnless(async_available(), "aiohttp no instalado")
+class TestAsyncEngine(unittest.TestCase):
+    """afetch_programs contra un servidor HTTP local que sirve la página de ejemplo"""
+
+    @classmethod
+    def setUpClass(cls):
+        page = TestGatoTVStreaming.PAGE.encode("utf-8")
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(page)))
+                self.end_headers()
+                self.wfile.write(page)
+
+            def log_message(self, *args):
+                pass
+
+        cls.server = HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.channel = {"url": f"http://127.0.0.1:{cls.server.server_port}/canal/test"}
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_async_matches_sync(self):
+        """El motor async reutiliza el parseo y produce los mismos programas"""
+        scraper = GatoTVScraper({})
+        dates = [datetime(2024, 8, 5).date(), datetime(2024, 8, 6).date()]
+        expected = scraper.fetch_programs(self.channel, dates=dates)
+        result = asyncio.run(scraper.afetch_programs(self.channel, dates=dates))
+        self.assertEqual(result, expected)
+        self.assertEqual(len(result), 4)
+
+class TestChannelCatalog(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "channel_list.txt")
+        cls.catalog = ChannelCatalog(parse_channel_list(path))
+
+    def test_fuzzy_search(self):
+        """Encuentra canales con errores de escritura y sin acentos"""
+        self.assertEqual(self.catalog.search("azteca uno")[0][1]["id"], "azteca_uno.cr")
+        self.assertIn("azteca", self.catalog.search("azteka", limit=3)[0][1]["id"])
+        self.assertEqual(self.catalog.search("6 costa rica")[0][1]["nombre"], "6 de Costa Rica")
+
+    def test_near_duplicates(self):
+        """Detecta variantes con desfase horario pero no canales con otro número"""
+        azteca = self.catalog.search("azteca uno")[0][1]
+        names = {ch["nombre"] for ch in self.catalog.near_duplicates(azteca)}
+        self.assertEqual(names, {"Azteca Uno -1 h", "Azteca Uno -2 h"})
+        seis = self.catalog.search("6 de costa rica")[0][1]
+        self.assertEqual(self.catalog.near_duplicates(seis), [])
+
+    def test_timeshift_variants_become_derived(self):
+        """Las variantes con desfase se derivan del canal base si está disponible"""
+        channels = [ch for ch in self.catalog.channels if ch["nombre"].startswith("Azteca Uno")]
+        result = {ch["nombre"]: ch for ch in as_derived_channels(channels)}
+        self.assertNotIn("derived_from", result["Azteca Uno"])
+        self.assertEqual(result["Azteca Uno -2 h"]["derived_from"], "azteca_uno.cr")
+        self.assertEqual(result["Azteca Uno -2 h"]["offset_hours"], 2)
+        # Sin el canal base no hay de dónde derivar
+        alone = as_derived_channels([ch for ch in channels if ch["nombre"] == "Azteca Uno -1 h"])
+        self.assertNotIn("derived_from", alone[0])
+
+    def test_split_timeshift(self):
+        self.assertEqual(split_timeshift("Azteca Uno -1 h"), ("Azteca Uno", -1))
+        self.assertEqual(split_timeshift("las Estrellas -2 Horas"), ("las Estrellas", -2))
+        self.assertEqual(split_timeshift("Canal 5"), ("Canal 5", 0))
+
+class TestSelectorPlan(unittest.TestCase):
+    def test_active_variant_first_and_page_drift(self):
+        """La variante activa se prueba primero y el cambio se registra por página, no por fila"""
+        plan = SelectorPlan("Test", "título", ["div.nuevo span", "div.viejo span"], accept=has_text)
+        old_row = BeautifulSoup('<div class="viejo"><span>Viejo</span></div>', 'html.parser')
+        new_row = BeautifulSoup('<div class="nuevo"><span>Nuevo</span></div>', 'html.parser')
+        both = BeautifulSoup('<div class="viejo"><span>Viejo</span></div>'
+                             '<div class="nuevo"><span>Nuevo</span></div>', 'html.parser')
+
+        # Página con filas alternas: la preferida coincide en alguna, sin eventos
+        for row in (new_row, old_row, new_row, old_row):
+            plan.select_one(row)
+        self.assertEqual(plan.select_one(both).get_text(), "Nuevo")
+        plan.end_page("pagina-1")
+        self.assertEqual(plan.drift_events, [])
+        self.assertEqual(plan.active_selector, "div.nuevo span")
+
+        # La preferida deja de coincidir en toda la página: un solo evento
+        for _ in range(3):
+            self.assertEqual(plan.select_one(old_row).get_text(), "Viejo")
+        plan.end_page("pagina-2")
+        self.assertEqual(len(plan.drift_events), 1)
+        self.assertEqual((plan.drift_events[0]["from"], plan.drift_events[0]["context"]),
+                         ("div.nuevo span", "pagina-2"))
+
+        # Tras el cambio el respaldo va primero; sigue igual en la siguiente página: sin evento nuevo; vacía: tampoco
+        self.assertEqual(plan.active_selector, "div.viejo span")
+        self.assertEqual(plan.select_one(both).get_text(), "Viejo")
+        plan.end_page("pagina-3")
+        empty_row = BeautifulSoup('<div class="nuevo"><span></span></div>', 'html.parser')
+        self.assertIsNone(plan.select_one(empty_row))
+        plan.end_page("pagina-4")
+        self.assertEqual(len(plan.drift_events), 1)
+
+        # La preferida vuelve a coincidir: se vuelve a ella con un evento
+        plan.select_one(new_row)
+        plan.end_page("pagina-5")
+        self.assertEqual((len(plan.drift_events), plan.active_selector), (2, "div.nuevo span"))
+
+class TestTimeParsing(unittest.TestCase):
+    def test_parse_clock_24h(self):
+        """Horas de 24 h válidas y rechazo de formatos o rangos inválidos"""
+        self.assertEqual(parse_clock_24h("08:30"), (8, 30))
+        self.assertEqual(parse_clock_24h(" 23:59:00 "), (23, 59))
+        for invalid in ("24:00", "12:60", "8h30", "", "12:3a"):
+            self.assertIsNone(parse_clock_24h(invalid))
+
+    def test_parse_clock_12h(self):
+        """Horas AM/PM, incluidas las 12, y rechazo de formatos inválidos"""
+        self.assertEqual(parse_clock_12h("8:00 PM"), (20, 0))
+        self.assertEqual(parse_clock_12h("12:15 AM"), (0, 15))
+        self.assertEqual(parse_clock_12h("12:45pm"), (12, 45))
+        for invalid in ("13:00 PM", "8:00", "0:30 AM", "8:5 PM"):
+            self.assertIsNone(parse_clock_12h(invalid))
+
+    def test_format_xmltv_matches_strftime(self):
+        """format_xmltv produce lo mismo que strftime"""
+        dt = datetime(2024, 2, 29, 7, 5, 9)
+        self.assertEqual(format_xmltv(dt), dt.strftime("%Y%m%d%H%M%S"))
+
+class TestScraperFixtures(unittest.TestCase):
+    """Páginas guardadas de las tres fuentes contra su salida esperada y su coste (tests/golden.py)"""
+
+    def test_output_matches_expected(self):
+        """parse_day (y el parseo en streaming) reproducen exactamente la salida esperada"""
+        for case in golden.load_cases():
+            with self.subTest(case=case["name"]):
+                programs, _, _ = golden.run_case(case, measure=False)
+                self.assertEqual(programs, golden.load_expected(case))
+                if case.get("stream"):
+                    self.assertEqual(golden.run_stream_case(case), programs)
+
+    @unittest.skipIf(os.environ.get("EPG_PERF_CHECK") == "0", "EPG_PERF_CHECK=0")
+    def test_no_performance_regression(self):
+        """Memoria asignada (y con EPG_PERF_CHECK=1 el tiempo de parseo) dentro de la tolerancia de la línea base"""
+        # El tiempo absoluto varía entre máquinas y runners compartidos: solo bajo demanda
+        check_time = os.environ.get("EPG_PERF_CHECK") == "1"
+        baseline = golden.load_baseline()
+        for case in golden.load_cases():
+            with self.subTest(case=case["name"]):
+                self.assertIn(case["name"], baseline, "Caso sin línea base: python -m tests.golden --update")
+                _, seconds, peak = golden.run_case(case)
+                self.assertEqual(golden.perf_regressions(case["name"], seconds, peak, baseline, check_time), [])
+
+class TestListingFetch(unittest.TestCase):
+    """Canales con listing_url: un listado de varios días en una petición, día a día como respaldo"""
+
+    LISTING = """
+    <html><body>
+      <div class="schedule" data-date="2024-08-05">
+        <div class="schedule-entry"><span class="schedule-time">8:00 PM</span>
+          <span class="duration">60 min</span><h4 class="show-title">Noticias</h4></div>
+      </div>
+      <div class="schedule" data-date="2024-08-06">
+        <div class="schedule-entry"><span class="schedule-time">11:30 PM</span>
+          <span class="duration">90 min</span><h4 class="show-title">Película</h4></div>
+      </div>
+    </body></html>
+    """
+    DAY = """<div class="schedule-grid"><div class="schedule-entry"><span class="schedule-time">6:00 AM</span>
+      <span class="duration">30 min</span><h4 class="show-title">Día suelto</h4></div></div>"""
+
+    def test_listing_splits_days_and_falls_back(self):
+        """Los días del listado no generan peticiones; el que falta se descarga por su página"""
+        scraper = OnTVTonightScraper({})
+        channel = {"id": "HBO.us", "url": "https://www.ontvtonight.com/guide/listings/channel/hbo",
+                   "listing_url": "https://www.ontvtonight.com/guide/listings/channel/hbo/semana"}
+        dates = [datetime(2024, 8, d).date() for d in (5, 6, 7)]
+
+        def fake_get(url, **kwargs):
+            response = Mock(text=self.LISTING if url.endswith("/semana") else self.DAY, content=b"x")
+            response.raise_for_status = Mock()
+            return response
+
+        with patch.object(scraper, "get_dates_to_scrape", return_value=dates), \
+             patch.object(scraper.session, "get", side_effect=fake_get) as mock_get:
+            programs = [scraper.fetch_programs(channel, dates=[fecha]) for fecha in dates]
+
+        # Listado + página del día 7, que no venía en el listado
+        self.assertEqual([call.args[0].rsplit("/", 1)[1] for call in mock_get.call_args_list],
+                         ["semana", "2024-08-07"])
+        self.assertEqual([[p["title"] for p in day] for day in programs],
+                         [["Noticias"], ["Película"], ["Día suelto"]])
+        self.assertEqual(programs[1][0]["stop"], "20240807010000")
+        self.assertEqual(scraper.stats.cache_hits, 2)
+
+    def test_concurrent_days_share_one_download(self):
+        """Con el motor async los días de un canal esperan al mismo listado y cada día se entrega una vez"""
+        cache = ListingCache()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0)
+            return {"lunes": ["a"], "martes": ["b"]}
+
+        async def day(fecha):
+            await cache.aload("HBO.us", fetch)
+            return cache.take("HBO.us", fecha)
+
+        async def run():
+            return await asyncio.gather(day("lunes"), day("martes"), day("lunes"))
+
+        self.assertEqual(asyncio.run(run()), [["a"], ["b"], None])
+        self.assertEqual(len(calls), 1)
+
+    def test_interleaved_channels_download_once(self):
+        """Con los días de muchos canales intercalados cada listado se descarga una sola vez"""
+        cache = ListingCache()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return {day: [day] for day in range(7)}
+
+        served = []
+        for day in range(7):
+            for channel in range(100):
+                cache.load(f"Canal{channel}", fetch)
+                served.append(cache.take(f"Canal{channel}", day))
+
+        self.assertEqual(len(calls), 100)
+        self.assertEqual(served.count(None), 0)
+        self.assertEqual(cache.take("Canal0", 0), None)
+
 if __name__ == '__main__':
     unittest.main()